@@ -0,0 +1,96 @@
+"""add attendance_daily_summary
+
+Revision ID: 3a35a8197553
+Revises: be4c008c9294
+Create Date: 2026-10-19 09:12:41.208113
+
+"""
+from datetime import time
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a35a8197553'
+down_revision: Union[str, None] = 'be4c008c9294'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen at this revision: arrivals after 09:00 count as late.
+WORK_START = time(9, 0)
+
+attendance = sa.table(
+    'attendance',
+    sa.column('user_id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('status', sa.String),
+    sa.column('time_in', sa.Time),
+)
+users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('department', sa.String),
+)
+attendance_daily_summary = sa.table(
+    'attendance_daily_summary',
+    sa.column('date', sa.Date),
+    sa.column('department', sa.String),
+    sa.column('present_count', sa.Integer),
+    sa.column('absent_count', sa.Integer),
+    sa.column('on_time_count', sa.Integer),
+    sa.column('late_count', sa.Integer),
+    sa.column('arrival_seconds', sa.BigInteger),
+)
+
+
+def _rebuild_daily_summary(bind) -> None:
+    """Recompute attendance_daily_summary from attendance, in one INSERT ... SELECT."""
+    time_in = attendance.c.time_in
+    if bind.dialect.name == 'postgresql':
+        seconds = sa.func.floor(sa.extract('epoch', time_in))
+    else:
+        seconds = sa.extract('hour', time_in) * 3600 + sa.extract('minute', time_in) * 60 + sa.extract('second', time_in)
+    present = attendance.c.status == 'present'
+    arrived = present & time_in.isnot(None)
+    department = sa.func.coalesce(sa.func.nullif(users.c.department, ''), 'Unassigned')
+    source = (
+        sa.select(
+            attendance.c.date,
+            department,
+            sa.func.sum(sa.case((present, 1), else_=0)),
+            sa.func.sum(sa.case((attendance.c.status == 'absent', 1), else_=0)),
+            sa.func.sum(sa.case((arrived & (time_in <= WORK_START), 1), else_=0)),
+            sa.func.sum(sa.case((arrived & (time_in > WORK_START), 1), else_=0)),
+            sa.func.coalesce(sa.func.sum(sa.case((arrived, seconds), else_=0)), 0),
+        )
+        .select_from(attendance.join(users, users.c.id == attendance.c.user_id))
+        .group_by(attendance.c.date, department)
+    )
+    bind.execute(attendance_daily_summary.delete())
+    bind.execute(attendance_daily_summary.insert().from_select(
+        ['date', 'department', 'present_count', 'absent_count', 'on_time_count', 'late_count', 'arrival_seconds'],
+        source,
+    ))
+
+
+
+def upgrade() -> None:
+    op.create_table('attendance_daily_summary',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('department', sa.String(), nullable=False),
+    sa.Column('present_count', sa.Integer(), nullable=False),
+    sa.Column('absent_count', sa.Integer(), nullable=False),
+    sa.Column('on_time_count', sa.Integer(), nullable=False),
+    sa.Column('late_count', sa.Integer(), nullable=False),
+    sa.Column('arrival_seconds', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('date', 'department')
+    )
+
+    # Backfill from existing attendance so dashboards are correct immediately.
+    _rebuild_daily_summary(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_table('attendance_daily_summary')
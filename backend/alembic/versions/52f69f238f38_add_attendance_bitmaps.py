@@ -0,0 +1,87 @@
+"""add attendance_bitmaps
+
+Revision ID: 52f69f238f38
+Revises: 3a35a8197553
+Create Date: 2026-10-19 14:03:27.511942
+
+"""
+from collections import defaultdict
+from datetime import time
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '52f69f238f38'
+down_revision: Union[str, None] = '3a35a8197553'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH = 5000
+# Frozen at this revision: arrivals after 09:00 count as late.
+WORK_START = time(9, 0)
+
+attendance = sa.table(
+    'attendance',
+    sa.column('user_id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('status', sa.String),
+    sa.column('time_in', sa.Time),
+)
+attendance_bitmaps = sa.table(
+    'attendance_bitmaps',
+    sa.column('user_id', sa.Integer),
+    sa.column('year', sa.Integer),
+    sa.column('present', sa.LargeBinary),
+    sa.column('absent', sa.LargeBinary),
+    sa.column('late', sa.LargeBinary),
+)
+
+
+def _rebuild_attendance_bitmaps(bind) -> None:
+    """Recompute attendance_bitmaps: per user and year, bit day_of_year - 1 of 46 little-endian bytes."""
+    built = defaultdict(lambda: [0, 0, 0])  # (user_id, year) -> [present, absent, late]
+    rows = bind.execute(
+        sa.select(attendance.c.user_id, attendance.c.date, attendance.c.status, attendance.c.time_in)
+        .execution_options(yield_per=BATCH)
+    )
+    for user_id, day, status, time_in in rows:
+        bit = 1 << (day.timetuple().tm_yday - 1)
+        acc = built[(user_id, day.year)]
+        if status == 'present':
+            acc[0] |= bit
+            if time_in is not None and time_in > WORK_START:
+                acc[2] |= bit
+        elif status == 'absent':
+            acc[1] |= bit
+
+    bind.execute(attendance_bitmaps.delete())
+    values = [
+        {'user_id': user_id, 'year': year,
+         **{name: bits.to_bytes(46, 'little') for name, bits in zip(('present', 'absent', 'late'), acc)}}
+        for (user_id, year), acc in built.items()
+    ]
+    for i in range(0, len(values), BATCH):
+        bind.execute(attendance_bitmaps.insert(), values[i:i + BATCH])
+
+
+
+def upgrade() -> None:
+    op.create_table('attendance_bitmaps',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('present', sa.LargeBinary(), nullable=False),
+    sa.Column('absent', sa.LargeBinary(), nullable=False),
+    sa.Column('late', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'year')
+    )
+
+    # Backfill from existing attendance so per-user stats are correct immediately.
+    _rebuild_attendance_bitmaps(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_table('attendance_bitmaps')
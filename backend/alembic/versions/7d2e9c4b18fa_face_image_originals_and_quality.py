@@ -0,0 +1,33 @@
+"""add face_images.original_sha256 and quality_details
+
+Revision ID: 7d2e9c4b18fa
+Revises: e0b7f3a91c24
+Create Date: 2026-10-19 20:11:45.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e9c4b18fa'
+down_revision: Union[str, None] = 'e0b7f3a91c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing images were stored as uploaded; only new enrollments are normalized.
+    with op.batch_alter_table('face_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('original_sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('quality_details', sa.JSON(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_face_images_original_sha256'), ['original_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('face_images', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_face_images_original_sha256'))
+        batch_op.drop_column('quality_details')
+        batch_op.drop_column('original_sha256')
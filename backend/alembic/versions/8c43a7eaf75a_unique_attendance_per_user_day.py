@@ -0,0 +1,143 @@
+"""unique attendance per user and day, index attendance.date
+
+Revision ID: 8c43a7eaf75a
+Revises: 52f69f238f38
+Create Date: 2026-10-19 15:21:08.734410
+
+"""
+from collections import defaultdict
+from datetime import time
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c43a7eaf75a'
+down_revision: Union[str, None] = '52f69f238f38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH = 5000
+# Frozen at this revision: arrivals after 09:00 count as late.
+WORK_START = time(9, 0)
+
+attendance = sa.table(
+    'attendance',
+    sa.column('user_id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('status', sa.String),
+    sa.column('time_in', sa.Time),
+)
+users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('department', sa.String),
+)
+attendance_daily_summary = sa.table(
+    'attendance_daily_summary',
+    sa.column('date', sa.Date),
+    sa.column('department', sa.String),
+    sa.column('present_count', sa.Integer),
+    sa.column('absent_count', sa.Integer),
+    sa.column('on_time_count', sa.Integer),
+    sa.column('late_count', sa.Integer),
+    sa.column('arrival_seconds', sa.BigInteger),
+)
+attendance_bitmaps = sa.table(
+    'attendance_bitmaps',
+    sa.column('user_id', sa.Integer),
+    sa.column('year', sa.Integer),
+    sa.column('present', sa.LargeBinary),
+    sa.column('absent', sa.LargeBinary),
+    sa.column('late', sa.LargeBinary),
+)
+
+
+def _rebuild_daily_summary(bind) -> None:
+    """Recompute attendance_daily_summary from attendance, in one INSERT ... SELECT."""
+    time_in = attendance.c.time_in
+    if bind.dialect.name == 'postgresql':
+        seconds = sa.func.floor(sa.extract('epoch', time_in))
+    else:
+        seconds = sa.extract('hour', time_in) * 3600 + sa.extract('minute', time_in) * 60 + sa.extract('second', time_in)
+    present = attendance.c.status == 'present'
+    arrived = present & time_in.isnot(None)
+    department = sa.func.coalesce(sa.func.nullif(users.c.department, ''), 'Unassigned')
+    source = (
+        sa.select(
+            attendance.c.date,
+            department,
+            sa.func.sum(sa.case((present, 1), else_=0)),
+            sa.func.sum(sa.case((attendance.c.status == 'absent', 1), else_=0)),
+            sa.func.sum(sa.case((arrived & (time_in <= WORK_START), 1), else_=0)),
+            sa.func.sum(sa.case((arrived & (time_in > WORK_START), 1), else_=0)),
+            sa.func.coalesce(sa.func.sum(sa.case((arrived, seconds), else_=0)), 0),
+        )
+        .select_from(attendance.join(users, users.c.id == attendance.c.user_id))
+        .group_by(attendance.c.date, department)
+    )
+    bind.execute(attendance_daily_summary.delete())
+    bind.execute(attendance_daily_summary.insert().from_select(
+        ['date', 'department', 'present_count', 'absent_count', 'on_time_count', 'late_count', 'arrival_seconds'],
+        source,
+    ))
+
+
+def _rebuild_attendance_bitmaps(bind) -> None:
+    """Recompute attendance_bitmaps: per user and year, bit day_of_year - 1 of 46 little-endian bytes."""
+    built = defaultdict(lambda: [0, 0, 0])  # (user_id, year) -> [present, absent, late]
+    rows = bind.execute(
+        sa.select(attendance.c.user_id, attendance.c.date, attendance.c.status, attendance.c.time_in)
+        .execution_options(yield_per=BATCH)
+    )
+    for user_id, day, status, time_in in rows:
+        bit = 1 << (day.timetuple().tm_yday - 1)
+        acc = built[(user_id, day.year)]
+        if status == 'present':
+            acc[0] |= bit
+            if time_in is not None and time_in > WORK_START:
+                acc[2] |= bit
+        elif status == 'absent':
+            acc[1] |= bit
+
+    bind.execute(attendance_bitmaps.delete())
+    values = [
+        {'user_id': user_id, 'year': year,
+         **{name: bits.to_bytes(46, 'little') for name, bits in zip(('present', 'absent', 'late'), acc)}}
+        for (user_id, year), acc in built.items()
+    ]
+    for i in range(0, len(values), BATCH):
+        bind.execute(attendance_bitmaps.insert(), values[i:i + BATCH])
+
+
+
+def upgrade() -> None:
+    # Marking was SELECT-then-INSERT, so races may have left duplicate rows.
+    # Keep one per (user_id, date): a present row over an absent one, then the oldest.
+    bind = op.get_bind()
+    removed = bind.execute(sa.text("""
+        DELETE FROM attendance WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY user_id, date
+                    ORDER BY CASE WHEN status = 'present' THEN 0 ELSE 1 END, id
+                ) AS rn
+                FROM attendance
+            ) ranked
+            WHERE rn > 1
+        )
+    """)).rowcount
+    if removed:
+        # The summary and bitmaps counted the removed rows: recompute them.
+        _rebuild_daily_summary(bind)
+        _rebuild_attendance_bitmaps(bind)
+
+    op.create_index('ix_attendance_user_id_date', 'attendance', ['user_id', 'date'], unique=True)
+    op.create_index(op.f('ix_attendance_date'), 'attendance', ['date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_attendance_date'), table_name='attendance')
+    op.drop_index('ix_attendance_user_id_date', table_name='attendance')
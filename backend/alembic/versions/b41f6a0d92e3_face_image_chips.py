@@ -0,0 +1,31 @@
+"""add face_images.chip_sha256
+
+Revision ID: b41f6a0d92e3
+Revises: 7d2e9c4b18fa
+Create Date: 2026-10-19 21:03:12.338902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41f6a0d92e3'
+down_revision: Union[str, None] = '7d2e9c4b18fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Chips for existing images: python -m scripts.reencode_faces --backfill
+    with op.batch_alter_table('face_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('chip_sha256', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_face_images_chip_sha256'), ['chip_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('face_images', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_face_images_chip_sha256'))
+        batch_op.drop_column('chip_sha256')
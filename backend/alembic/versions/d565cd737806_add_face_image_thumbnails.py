@@ -0,0 +1,27 @@
+"""add face_images.thumbnail_data
+
+Revision ID: d565cd737806
+Revises: 8c43a7eaf75a
+Create Date: 2026-10-19 17:40:52.120384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd565cd737806'
+down_revision: Union[str, None] = '8c43a7eaf75a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing images get their thumbnail on first request (GET /face/images/{id}?size=thumb).
+    op.add_column('face_images', sa.Column('thumbnail_data', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('face_images', 'thumbnail_data')
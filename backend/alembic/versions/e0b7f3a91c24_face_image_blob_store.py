@@ -0,0 +1,142 @@
+"""move face image bytes to a content-addressed blob store
+
+Revision ID: e0b7f3a91c24
+Revises: d565cd737806
+Create Date: 2026-10-19 19:02:37.511846
+
+"""
+import hashlib
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0b7f3a91c24'
+down_revision: Union[str, None] = 'd565cd737806'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH = 200
+
+face_images = sa.table(
+    'face_images',
+    sa.column('id', sa.Integer),
+    sa.column('image_data', sa.LargeBinary),
+    sa.column('thumbnail_data', sa.LargeBinary),
+    sa.column('sha256', sa.String),
+    sa.column('size', sa.Integer),
+    sa.column('thumbnail_sha256', sa.String),
+)
+face_image_blobs = sa.table(
+    'face_image_blobs',
+    sa.column('sha256', sa.String),
+    sa.column('data', sa.LargeBinary),
+    sa.column('size', sa.Integer),
+    sa.column('created_at', sa.DateTime),
+)
+
+
+def _batches(bind, *columns):
+    """``face_images`` rows in id order, BATCH rows (and their blobs) at a time."""
+    last = 0
+    while True:
+        rows = bind.execute(
+            sa.select(face_images.c.id, *columns)
+            .where(face_images.c.id > last)
+            .order_by(face_images.c.id)
+            .limit(BATCH)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1].id
+
+
+def upgrade() -> None:
+    op.create_table('face_image_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    with op.batch_alter_table('face_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('size', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('thumbnail_sha256', sa.String(length=64), nullable=True))
+
+    # Move the bytes into the "database" image store; scripts/migrate_image_store.py
+    # can then move them to the filesystem store.
+    bind = op.get_bind()
+    stored = set()
+    for rows in _batches(bind, face_images.c.image_data, face_images.c.thumbnail_data):
+        blobs, updates = {}, []
+        for row in rows:
+            keys = []
+            for data in (row.image_data, row.thumbnail_data):
+                key = hashlib.sha256(data).hexdigest() if data is not None else None
+                if key is not None and key not in stored:
+                    blobs[key] = data
+                keys.append(key)
+            updates.append({'b_id': row.id, 'b_sha256': keys[0], 'b_size': len(row.image_data), 'b_thumb': keys[1]})
+        if blobs:
+            now = datetime.utcnow()
+            bind.execute(face_image_blobs.insert(), [
+                {'sha256': key, 'data': data, 'size': len(data), 'created_at': now} for key, data in blobs.items()
+            ])
+            stored.update(blobs)
+        bind.execute(
+            face_images.update()
+            .where(face_images.c.id == sa.bindparam('b_id'))
+            .values(sha256=sa.bindparam('b_sha256'), size=sa.bindparam('b_size'),
+                    thumbnail_sha256=sa.bindparam('b_thumb')),
+            updates,
+        )
+
+    with op.batch_alter_table('face_images', schema=None) as batch_op:
+        batch_op.alter_column('sha256', existing_type=sa.String(length=64), nullable=False)
+        batch_op.alter_column('size', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_face_images_sha256'), ['sha256'], unique=False)
+        batch_op.create_index(batch_op.f('ix_face_images_thumbnail_sha256'), ['thumbnail_sha256'], unique=False)
+        batch_op.drop_column('thumbnail_data')
+        batch_op.drop_column('image_data')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('face_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_data', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('thumbnail_data', sa.LargeBinary(), nullable=True))
+
+    # Only blobs in the database store can be copied back; move filesystem-stored
+    # images first (scripts/migrate_image_store.py --to database).
+    bind = op.get_bind()
+    for rows in _batches(bind, face_images.c.sha256, face_images.c.thumbnail_sha256):
+        keys = {key for row in rows for key in (row.sha256, row.thumbnail_sha256) if key}
+        blobs = dict(bind.execute(
+            sa.select(face_image_blobs.c.sha256, face_image_blobs.c.data).where(face_image_blobs.c.sha256.in_(keys))
+        ).all())
+        missing = [row.id for row in rows if row.sha256 not in blobs]
+        if missing:
+            raise RuntimeError(
+                f"face_images {missing[:5]}... have no bytes in face_image_blobs; "
+                "run scripts/migrate_image_store.py --to database before downgrading"
+            )
+        bind.execute(
+            face_images.update()
+            .where(face_images.c.id == sa.bindparam('b_id'))
+            .values(image_data=sa.bindparam('b_data'), thumbnail_data=sa.bindparam('b_thumb')),
+            [{'b_id': row.id, 'b_data': blobs[row.sha256], 'b_thumb': blobs.get(row.thumbnail_sha256)} for row in rows],
+        )
+
+    with op.batch_alter_table('face_images', schema=None) as batch_op:
+        batch_op.alter_column('image_data', existing_type=sa.LargeBinary(), nullable=False)
+        batch_op.drop_index(batch_op.f('ix_face_images_thumbnail_sha256'))
+        batch_op.drop_index(batch_op.f('ix_face_images_sha256'))
+        batch_op.drop_column('thumbnail_sha256')
+        batch_op.drop_column('size')
+        batch_op.drop_column('sha256')
+
+    op.drop_table('face_image_blobs')
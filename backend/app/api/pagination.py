@@ -0,0 +1,77 @@
+"""
+Keyset (cursor) pagination and opt-in totals for admin list endpoints.
+
+A page is ``limit`` rows after an opaque ``cursor`` (the sort key of the
+last row served, base64url-encoded JSON), so a deep page is an index seek
+like the first one rather than an OFFSET scan. The cursor for the next page
+is sent in ``X-Next-Cursor`` and omitted on the last page.
+
+Totals are opt-in with ``count``: ``exact`` (COUNT(*)), ``estimated``
+(planner statistics on PostgreSQL, exact elsewhere) or ``none``, the
+default. A computed total is sent in ``X-Total-Count``.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from app.db.sql import estimated_count
+
+COUNT_MODES = ("exact", "estimated", "none")
+COUNT_PATTERN = "^(" + "|".join(COUNT_MODES) + ")$"
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, date) else v for v in key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: Callable[[Any], Any]) -> Tuple:
+    """The key in ``cursor``, each part converted by ``types`` (400 if malformed)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def total_count(db: Session, stmt: Select, mode: str, table=None) -> Optional[int]:
+    """Rows matched by ``stmt`` under count ``mode``; pass ``table`` when ``stmt`` is unfiltered."""
+    if mode == "none":
+        return None
+    stmt = stmt.order_by(None)
+    if mode == "estimated":
+        estimate = estimated_count(db, stmt, table)
+        if estimate is not None:
+            return estimate
+    return db.scalar(select(func.count()).select_from(stmt.subquery()))
+
+
+def fetch_page(
+    db: Session, stmt: Select, limit: Optional[int], key: Callable[[Any], Sequence[Any]], scalars: bool = True,
+) -> Tuple[List[Any], Optional[str]]:
+    """Up to ``limit`` rows of ``stmt`` (already ordered and seeked) and the next page's cursor."""
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    result = db.scalars(stmt) if scalars else db.execute(stmt)
+    rows = result.all()
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def set_page_headers(response: Response, total: Optional[int], next_cursor: Optional[str]) -> None:
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
@@ -2,89 +2,119 @@
 
 import logging
 import os
-import base64
-from datetime import datetime
+from datetime import date as datetime_date, datetime
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Response, UploadFile
-from sqlalchemy import func
+from sqlalchemy import delete, func, select, tuple_, update
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.api.routers.face import face_image_filename, face_image_urls
+from app.api.pagination import COUNT_PATTERN, decode_cursor, fetch_page, set_page_headers, total_count
 from app.core.config import settings
 from app.core.time_utils import now_local, today_local
 from app.db.session import get_db
-from app.models import Attendance, User
+from app.models import Attendance, AttendanceBitmap, User
 from app.schemas import AttendanceResponse, UserResponse
+from app.services.analytics_cache import mark_changed
+from app.services.attendance_writes import (
+    AttendanceChange,
+    mark_absent,
+    record_change,
+    record_changes,
+    upsert_attendance,
+)
+from app.services import image_store
 from app.services.face_recognition import face_service
 
 logger = logging.getLogger("smart_attendance.admin")
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+# Ids per IN (...) list in bulk endpoints; keeps statements under bind-parameter limits.
+BULK_CHUNK = 500
+
 
 @router.get("/users")
 async def get_all_users(
     response: Response,
     limit: int = Query(None, ge=1, le=500),
+    cursor: str = None,
     offset: int = Query(0, ge=0),
+    count: str = Query("none", pattern=COUNT_PATTERN),
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_admin_user),
 ):
-    """List users. Supports optional pagination via limit/offset; the total
-    count is returned in the X-Total-Count header."""
-    query = db.query(User)
-    total = query.count()
-    query = query.order_by(User.id)
-    if limit is not None:
-        query = query.offset(offset).limit(limit)
+    """List users by id. Paginate with ``limit`` and the ``X-Next-Cursor`` of the
+    previous page as ``cursor`` (``offset`` still works but scans); ``count``
+    adds X-Total-Count (see app.api.pagination)."""
+    stmt = select(User).order_by(User.id)
+    total = total_count(db, stmt, count, table=User.__table__)
+    if cursor:
+        (after_id,) = decode_cursor(cursor, int)
+        stmt = stmt.where(User.id > after_id)
     elif offset:
-        query = query.offset(offset)
-    users = query.all()
-    response.headers["X-Total-Count"] = str(total)
+        stmt = stmt.offset(offset)
+    users, next_cursor = fetch_page(db, stmt, limit, key=lambda u: (u.id,))
+    set_page_headers(response, total, next_cursor)
     return [UserResponse.model_validate(user) for user in users]
 
 
+# /admin/attendance selects just these columns (one joined query) and builds
+# the JSON from row tuples; "user" matches UserResponse field for field.
+_ATTENDANCE_COLUMNS = (Attendance.id, Attendance.date, Attendance.time_in, Attendance.status, Attendance.created_at)
+_USER_FIELDS = tuple(UserResponse.model_fields)
+_USER_COLUMNS = tuple(getattr(User, name).label(f"user_{name}") for name in _USER_FIELDS)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _attendance_record(row) -> dict:
+    record_id, day, time_in, status, created_at, *user = row
+    return {
+        "id": record_id,
+        "user": {name: _iso(v) if name == "created_at" else v for name, v in zip(_USER_FIELDS, user)},
+        "date": day.isoformat(),
+        "time_in": _iso(time_in),
+        "status": status,
+        "created_at": _iso(created_at),
+    }
+
+
 @router.get("/attendance")
 async def get_attendance_records(
     response: Response,
     date: str = None,
     user_id: str = None,
     limit: int = Query(None, ge=1, le=500),
+    cursor: str = None,
     offset: int = Query(0, ge=0),
+    count: str = Query("none", pattern=COUNT_PATTERN),
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_admin_user),
 ):
-    """List attendance records with optional date/user filters and pagination.
-    Total count is returned in the X-Total-Count header."""
-    query = db.query(Attendance).join(User)
+    """List attendance records, newest (date, id) first, with optional date/user
+    filters. Paginate with ``limit`` and ``cursor``; ``count`` adds X-Total-Count."""
+    stmt = select(*_ATTENDANCE_COLUMNS, *_USER_COLUMNS).join(User, User.id == Attendance.user_id)
     if date:
-        query = query.filter(Attendance.date == datetime.strptime(date, "%Y-%m-%d").date())
+        stmt = stmt.where(Attendance.date == datetime.strptime(date, "%Y-%m-%d").date())
     if user_id:
-        user = db.query(User).filter(User.unique_id == user_id).first()
-        if user:
-            query = query.filter(Attendance.user_id == user.id)
-
-    total = query.count()
-    query = query.order_by(Attendance.id.desc())
-    if limit is not None:
-        query = query.offset(offset).limit(limit)
+        stmt = stmt.where(User.unique_id == user_id)
+
+    filtered = bool(date or user_id)
+    total = total_count(db, stmt, count, table=None if filtered else Attendance.__table__)
+    stmt = stmt.order_by(Attendance.date.desc(), Attendance.id.desc())
+    if cursor:
+        after = decode_cursor(cursor, datetime_date.fromisoformat, int)
+        stmt = stmt.where(tuple_(Attendance.date, Attendance.id) < tuple_(*after))
     elif offset:
-        query = query.offset(offset)
-
-    records = query.all()
-    users_by_id = {u.id: u for u in db.query(User).all()}
-    result = []
-    for record in records:
-        user = users_by_id.get(record.user_id)
-        result.append({
-            "id": record.id,
-            "user": UserResponse.model_validate(user),
-            "date": record.date.isoformat(),
-            "time_in": record.time_in.isoformat() if record.time_in else None,
-            "status": record.status,
-            "created_at": record.created_at.isoformat(),
-        })
-    response.headers["X-Total-Count"] = str(total)
+        stmt = stmt.offset(offset)
+    rows, next_cursor = fetch_page(db, stmt, limit, key=lambda r: (r.date, r.id), scalars=False)
+
+    result = [_attendance_record(row) for row in rows]
+    set_page_headers(response, total, next_cursor)
     return result
 
 
@@ -94,15 +124,7 @@ async def mark_absent_users(
     current_user: User = Depends(deps.get_current_admin_user),
 ):
     today = today_local()
-    all_users = db.query(User).filter(User.is_active == True).all()  # noqa: E712
-    attended_user_ids = db.query(Attendance.user_id).filter(Attendance.date == today).all()
-    attended_user_ids = [uid[0] for uid in attended_user_ids]
-
-    absent_count = 0
-    for user in all_users:
-        if user.id not in attended_user_ids:
-            db.add(Attendance(user_id=user.id, date=today, status="absent"))
-            absent_count += 1
+    absent_count = mark_absent(db, today)
     db.commit()
     return {"message": f"Marked {absent_count} users as absent for {today}"}
 
@@ -118,6 +140,8 @@ async def update_attendance_record(
     attendance = db.query(Attendance).filter(Attendance.id == attendance_id).first()
     if not attendance:
         raise HTTPException(status_code=404, detail="Attendance record not found")
+    user = db.query(User).filter(User.id == attendance.user_id).first()
+    old_status, old_time = attendance.status, attendance.time_in
 
     attendance.status = status
     if status == "present" and time_in:
@@ -128,9 +152,9 @@ async def update_attendance_record(
     elif status == "absent":
         attendance.time_in = None
 
+    record_change(db, user, attendance.date, old_status, old_time, attendance.status, attendance.time_in)
     db.commit()
     db.refresh(attendance)
-    user = db.query(User).filter(User.id == attendance.user_id).first()
     return {
         "message": f"Updated attendance for {user.full_name}",
         "attendance": {
@@ -152,19 +176,38 @@ async def bulk_update_attendance(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_admin_user),
 ):
-    updated_count = 0
-    for record_id in record_ids:
-        attendance = db.query(Attendance).filter(Attendance.id == record_id).first()
-        if attendance:
-            attendance.status = status
-            if status == "present" and time_in:
-                try:
-                    attendance.time_in = datetime.strptime(time_in, "%H:%M").time()
-                except ValueError:
-                    continue
-            elif status == "absent":
-                attendance.time_in = None
-            updated_count += 1
+    values = {"status": status}
+    if status == "present" and time_in:
+        try:
+            values["time_in"] = datetime.strptime(time_in, "%H:%M").time()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid time format. Use HH:MM")
+    elif status == "absent":
+        values["time_in"] = None
+
+    # Two statements per chunk (read old values for the bookkeeping, then
+    # UPDATE ... WHERE id IN), however many ids are given.
+    ids = list(dict.fromkeys(record_ids))
+    changes = []
+    for i in range(0, len(ids), BULK_CHUNK):
+        chunk = ids[i:i + BULK_CHUNK]
+        rows = db.execute(
+            select(Attendance.date, Attendance.user_id, User.department, Attendance.status, Attendance.time_in)
+            .join(User, User.id == Attendance.user_id)
+            .where(Attendance.id.in_(chunk))
+        ).all()
+        if not rows:
+            continue
+        db.execute(
+            update(Attendance).where(Attendance.id.in_(chunk)).values(**values),
+            execution_options={"synchronize_session": False},
+        )
+        changes.extend(
+            AttendanceChange(day, user_id, department, old_status, old_time, status, values.get("time_in", old_time))
+            for day, user_id, department, old_status, old_time in rows
+        )
+    updated_count = len(changes)
+    record_changes(db, changes)
     db.commit()
     return {"message": f"Updated {updated_count} attendance records"}
 
@@ -180,13 +223,6 @@ async def mark_user_present(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    today = today_local()
-    attendance = (
-        db.query(Attendance)
-        .filter(Attendance.user_id == user.id, Attendance.date == today)
-        .first()
-    )
-
     if time_in:
         try:
             time_obj = datetime.strptime(time_in, "%H:%M").time()
@@ -195,19 +231,22 @@ async def mark_user_present(
     else:
         time_obj = now_local().time()
 
-    if attendance:
-        attendance.status = "present"
-        attendance.time_in = time_obj
-    else:
-        attendance = Attendance(user_id=user.id, date=today, time_in=time_obj, status="present")
-        db.add(attendance)
-
-    db.commit()
-    db.refresh(attendance)
-    return {
+    today = today_local()
+    # Prior values feed the summary/bitmap deltas; the upsert itself is race-free.
+    previous = db.execute(
+        select(Attendance.status, Attendance.time_in)
+        .where(Attendance.user_id == user.id, Attendance.date == today)
+        .with_for_update()
+    ).first()
+    attendance, inserted = upsert_attendance(db, user.id, today, "present", time_obj)
+    old_status, old_time = (None, None) if inserted or previous is None else previous
+    record_change(db, user, today, old_status, old_time, "present", time_obj)
+    response = {
         "message": f"Marked {user.full_name} as present",
         "attendance": AttendanceResponse.model_validate(attendance),
     }
+    db.commit()
+    return response
 
 
 @router.delete("/user/{user_id}")
@@ -220,9 +259,20 @@ async def delete_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    removed = db.query(Attendance.date, Attendance.status, Attendance.time_in).filter(
+        Attendance.user_id == user.id
+    ).all()
+    record_changes(db, [
+        AttendanceChange(day, user.id, user.department, status, time_in, None, None)
+        for day, status, time_in in removed
+    ])
     db.query(Attendance).filter(Attendance.user_id == user.id).delete()
+    db.query(AttendanceBitmap).filter(AttendanceBitmap.user_id == user.id).delete()
+    images = image_store.referenced_keys(db, [user.id])
     db.delete(user)  # cascades to face_embeddings / face_images
+    mark_changed(db)
     db.commit()
+    image_store.discard(db, images)
     return {"message": f"User {user.full_name} deleted successfully"}
 
 
@@ -234,8 +284,13 @@ async def get_users_face_status(
     from app.models import FaceEmbedding, FaceImage
 
     users = db.query(User).all()
-    # Pre-fetch enrollment data for all users.
-    embeddings = {fe.user_id: fe for fe in db.query(FaceEmbedding).all()}
+    # Pre-fetch enrollment metadata for all users (scalar columns only, never the blobs).
+    embeddings = {
+        fe.user_id: fe
+        for fe in db.query(
+            FaceEmbedding.user_id, FaceEmbedding.created_at, FaceEmbedding.count, FaceEmbedding.model
+        )
+    }
     image_counts = dict(
         db.query(FaceImage.user_id, func.count(FaceImage.id)).group_by(FaceImage.user_id).all()
     )
@@ -280,14 +335,16 @@ async def delete_user_face_data(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    has_data = db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user.id).first()
+    has_data = db.query(FaceEmbedding.id).filter(FaceEmbedding.user_id == user.id).first()
     if not has_data:
         raise HTTPException(status_code=404, detail="No face data found for this user")
 
+    images = image_store.referenced_keys(db, [user.id])
     db.query(FaceImage).filter(FaceImage.user_id == user.id).delete()
     db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user.id).delete()
     user.face_registered = False
     db.commit()
+    image_store.discard(db, images)
     return {
         "message": f"Face data deleted successfully for {user.full_name}",
         "user_id": user_id,
@@ -371,8 +428,9 @@ async def get_user_face_images_admin(
 
     face_images = [
         {
-            "filename": f"face_{img.position}.jpg",
-            "data": f"data:{img.content_type};base64,{base64.b64encode(img.image_data).decode('utf-8')}",
+            "id": img.id,
+            "filename": face_image_filename(img.position, img.content_type),
+            **face_image_urls(img.id),
             "registered_date": img.created_at.isoformat() if img.created_at else None,
         }
         for img in images
@@ -411,7 +469,11 @@ async def get_user_face_details(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    fe = db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user.id).first()
+    fe = (
+        db.query(FaceEmbedding.created_at, FaceEmbedding.model, FaceEmbedding.count)
+        .filter(FaceEmbedding.user_id == user.id)
+        .first()
+    )
     if fe is None:
         return {
             "user": UserResponse.model_validate(user),
@@ -420,18 +482,18 @@ async def get_user_face_details(
         }
 
     images = (
-        db.query(FaceImage)
+        db.query(FaceImage.position, FaceImage.content_type, FaceImage.size, FaceImage.created_at)
         .filter(FaceImage.user_id == user.id)
         .order_by(FaceImage.position)
         .all()
     )
     face_images = [
         {
-            "filename": f"face_{img.position}.jpg",
-            "size": len(img.image_data),
-            "created": img.created_at.isoformat() if img.created_at else None,
+            "filename": face_image_filename(position, content_type),
+            "size": size,
+            "created": created_at.isoformat() if created_at else None,
         }
-        for img in images
+        for position, content_type, size, created_at in images
     ]
 
     return {
@@ -457,25 +519,43 @@ async def bulk_delete_face_data(
 ):
     from app.models import FaceEmbedding, FaceImage
 
-    deleted_count = 0
+    # Five statements per chunk of ids, however many are given.
+    unique_ids = list(dict.fromkeys(user_ids))
     errors = []
-    for user_id in user_ids:
-        try:
-            user = db.query(User).filter(User.unique_id == user_id).first()
-            if not user:
+    deleted_count = 0
+    images = set()
+    for i in range(0, len(unique_ids), BULK_CHUNK):
+        chunk = unique_ids[i:i + BULK_CHUNK]
+        found = dict(db.execute(
+            select(User.unique_id, FaceEmbedding.id)
+            .outerjoin(FaceEmbedding, FaceEmbedding.user_id == User.id)
+            .where(User.unique_id.in_(chunk))
+        ).all())
+        for user_id in chunk:
+            if user_id not in found:
                 errors.append(f"User {user_id} not found")
-                continue
-            fe = db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user.id).first()
-            if fe is None:
+            elif found[user_id] is None:
                 errors.append(f"No face data for user {user_id}")
-                continue
-            db.query(FaceImage).filter(FaceImage.user_id == user.id).delete()
-            db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user.id).delete()
-            user.face_registered = False
-            deleted_count += 1
-        except Exception as e:
-            errors.append(f"Error deleting {user_id}: {str(e)}")
+        enrolled = [uid for uid in chunk if found.get(uid) is not None]
+        if not enrolled:
+            continue
+        targets = select(User.id).where(User.unique_id.in_(enrolled))
+        images |= image_store.referenced_keys(db, targets)
+        db.execute(
+            delete(FaceImage).where(FaceImage.user_id.in_(targets)),
+            execution_options={"synchronize_session": False},
+        )
+        db.execute(
+            delete(FaceEmbedding).where(FaceEmbedding.user_id.in_(targets)),
+            execution_options={"synchronize_session": False},
+        )
+        db.execute(
+            update(User).where(User.unique_id.in_(enrolled)).values(face_registered=False),
+            execution_options={"synchronize_session": False},
+        )
+        deleted_count += len(enrolled)
     db.commit()
+    image_store.discard(db, images)
     return {
         "message": f"Deleted face data for {deleted_count} users",
         "deleted_count": deleted_count,
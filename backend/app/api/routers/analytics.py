@@ -1,16 +1,21 @@
 """Admin analytics, reporting, and anomaly endpoints (real data only)."""
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import cache
+from typing import Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.api import deps
-from app.core.time_utils import now_local
+from app.core.time_utils import now_local, today_local
 from app.db.session import get_db
-from app.models import Attendance, User
-from app.services import analytics as svc
+from app.models import User
+from app.services import analytics_columnar as columnar
+from app.services import analytics_queries as queries
+from app.services import attendance_export
+from app.services.analytics_cache import cached_response
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
@@ -25,132 +30,254 @@ def _period_start(period: str, today: datetime) -> datetime:
     return today - timedelta(days=7)  # default: week
 
 
-def _build_dashboard(period: str, db: Session) -> dict:
+def _json(data: dict):
+    """A ``cached_response`` build result whose ETag ignores ``generatedAt`` (new on every rebuild)."""
+    stable = {key: value for key, value in data.items() if key != "generatedAt"}
+    return JSONResponse(data).body, "application/json", {}, JSONResponse(stable).body
+
+
+SECTIONS = ("liveStats", "departments", "dailyTrends", "weeklyStats", "userStats", "anomalies")
+
+
+def _parse_sections(sections: Optional[str]) -> Tuple[str, ...]:
+    if not sections:
+        return SECTIONS
+    requested = tuple(dict.fromkeys(s.strip() for s in sections.split(",") if s.strip()))
+    unknown = [s for s in requested if s not in SECTIONS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sections: {', '.join(unknown)}. Choose from: {', '.join(SECTIONS)}",
+        )
+    return requested
+
+
+def _parse_date(value: str, name: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}. Use YYYY-MM-DD")
+
+
+def _parse_range(start: Optional[str], end: Optional[str], granularity: str):
+    """Validated (start, end, granularity); start is None when the period applies."""
+    if granularity not in queries.GRANULARITIES:
+        raise HTTPException(
+            status_code=400, detail=f"granularity must be one of: {', '.join(queries.GRANULARITIES)}",
+        )
+    start_date = _parse_date(start, "start") if start else None
+    end_date = _parse_date(end, "end") if end else None
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    return start_date, end_date, granularity
+
+
+def _build_dashboard(
+    period: str,
+    db: Session,
+    sections: Tuple[str, ...] = SECTIONS,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = "day",
+) -> dict:
+    """The requested dashboard sections; inputs are loaded only if a section needs them.
+
+    ``start``/``end`` replace the rolling ``period`` window when given.
+    """
     today = now_local()
-    start_date = _period_start(period, today).date()
-    end_date = today.date()
-
-    records = db.query(Attendance).filter(Attendance.date >= start_date).all()
-    users = db.query(User).all()
-    total_users = len(users)
-
-    return {
-        "liveStats": svc.live_stats(users, records),
-        "departments": svc.department_breakdown(users, records),
-        "dailyTrends": svc.daily_trends(records, start_date, end_date, total_users),
-        "weeklyStats": svc.weekly_patterns(records, start_date, end_date, total_users),
-        "userStats": svc.user_performance(users, records),
-        "anomalies": svc.detect_anomalies(records, users),
-        "period": period,
-        "generatedAt": today.isoformat(),
+    start_date = start or _period_start(period, today).date()
+    end_date = end or today.date()
+
+    @cache
+    def total_users():
+        return queries.user_count(db)
+
+    builders = {
+        "liveStats": lambda: queries.live_stats(db),
+        "departments": lambda: queries.department_breakdown(db),
+        "dailyTrends": lambda: queries.trends(db, start_date, end_date, total_users(), granularity),
+        "weeklyStats": lambda: queries.weekly_patterns(db, start_date, end_date, total_users()),
+        "userStats": lambda: queries.user_performance(db, start_date, end_date),
+        "anomalies": lambda: queries.detect_anomalies(db, start_date, end_date),
     }
+    data = {name: builders[name]() for name in sections}
+    data["period"] = period if start is None else "custom"
+    data["range"] = {"start": start_date.isoformat(), "end": end_date.isoformat(), "granularity": granularity}
+    data["generatedAt"] = today.isoformat()
+    return data
 
 
 @router.get("/dashboard")
 async def get_analytics_dashboard(
+    request: Request,
     period: str = "week",
+    sections: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    granularity: str = "day",
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_admin_user),
 ):
+    wanted = _parse_sections(sections)
+    start_date, end_date, granularity = _parse_range(start, end, granularity)
     try:
-        return _build_dashboard(period, db)
+        key = ("dashboard", period, wanted, start_date, end_date, granularity, today_local())
+        return cached_response(
+            request, key,
+            lambda: _json(_build_dashboard(period, db, wanted, start_date, end_date, granularity)),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analytics calculation failed: {str(e)}")
 
 
 @router.get("/export")
 async def export_analytics_data(
+    request: Request,
     format: str = "csv",
     period: str = "week",
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_admin_user),
 ):
-    try:
-        data = _build_dashboard(period, db)
+    def build():
+        if format.lower() != "csv":
+            return _json(_build_dashboard(period, db))
+
+        data = _build_dashboard(period, db, sections=("liveStats",))
         live = data["liveStats"]
+        rows = [
+            ("metric", "value"),
+            ("period", period),
+            ("generated_at", data["generatedAt"]),
+            ("total_employees", live["totalEmployees"]),
+            ("currently_present", live["currentlyPresent"]),
+            ("attendance_rate_percent", live["attendanceRate"]),
+            ("on_time_today", live["onTimeToday"]),
+            ("late_today", live["lateToday"]),
+            ("absent_today", live["absentToday"]),
+            ("punctuality_rate_percent", live["punctualityRate"]),
+            ("average_arrival", live["averageArrival"]),
+        ]
+        csv_content = "\n".join(f"{k},{v}" for k, v in rows)
+        return (
+            csv_content.encode(),
+            "text/csv",
+            {"Content-Disposition": f"attachment; filename=analytics-{period}.csv"},
+            "\n".join(f"{k},{v}" for k, v in rows if k != "generated_at").encode(),
+        )
 
-        if format.lower() == "csv":
-            rows = [
-                ("metric", "value"),
-                ("period", period),
-                ("generated_at", data["generatedAt"]),
-                ("total_employees", live["totalEmployees"]),
-                ("currently_present", live["currentlyPresent"]),
-                ("attendance_rate_percent", live["attendanceRate"]),
-                ("on_time_today", live["onTimeToday"]),
-                ("late_today", live["lateToday"]),
-                ("absent_today", live["absentToday"]),
-                ("punctuality_rate_percent", live["punctualityRate"]),
-                ("average_arrival", live["averageArrival"]),
-            ]
-            csv_content = "\n".join(f"{k},{v}" for k, v in rows)
-            return Response(
-                content=csv_content,
-                media_type="text/csv",
-                headers={"Content-Disposition": f"attachment; filename=analytics-{period}.csv"},
-            )
-
-        return data
+    try:
+        return cached_response(request, ("export", format.lower(), period, today_local()), build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
+@router.get("/export/records")
+async def export_attendance_records(
+    start_date: str,
+    end_date: Optional[str] = None,
+    format: str = "csv",
+    compress: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_admin_user),
+):
+    """Every attendance row in the range, streamed.
+
+    ``format``: ``csv`` (``compress=gzip`` for .csv.gz), ``parquet``, ``arrow``,
+    ``npz``, or ``columnar`` for the best columnar format installed.
+    """
+    start = _parse_date(start_date, "start_date")
+    end = _parse_date(end_date, "end_date") if end_date else today_local()
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    fmt = format.lower()
+    if fmt == "columnar":
+        fmt = attendance_export.best_columnar_format()
+    available = ["csv", *attendance_export.available_formats()]
+    if fmt not in available:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Available: {', '.join(available)}")
+    if compress not in (None, "gzip") or (compress and fmt != "csv"):
+        raise HTTPException(status_code=400, detail="compress=gzip is only supported for csv")
+
+    filename = f"attendance-{start.isoformat()}-{end.isoformat()}"
+    batches = attendance_export.record_batches(db, start, end)
+    if fmt != "csv":
+        media_type, extension = attendance_export.COLUMNAR_FORMATS[fmt]
+        return StreamingResponse(
+            attendance_export.columnar_stream(batches, fmt),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}.{extension}"},
+        )
+    if compress:
+        return StreamingResponse(
+            attendance_export.csv_stream(batches, compress=True),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f"attachment; filename={filename}.csv.gz"},
+        )
+    return StreamingResponse(
+        attendance_export.csv_stream(batches),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}.csv"},
+    )
+
+
 @router.get("/reports/automated")
 async def generate_automated_report(
+    request: Request,
     report_type: str = "weekly",
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_admin_user),
 ):
-    try:
+    def build():
         today = now_local()
         period_map = {"daily": "day", "monthly": "month"}
         period = period_map.get(report_type, "week")
         title = {"daily": "Daily", "monthly": "Monthly"}.get(report_type, "Weekly") + " Attendance Report"
 
         start_date = _period_start(period, today).date()
-        records = db.query(Attendance).filter(Attendance.date >= start_date).all()
-        users = db.query(User).all()
+        frame = columnar.AttendanceFrame.load(db, start_date)
+        attendance_rate = round(frame.present_users() / max(frame.total_users, 1) * 100, 1)
 
-        present_user_ids = {r.user_id for r in records if r.status == "present"}
-        attendance_rate = round(len(present_user_ids) / max(len(users), 1) * 100, 1)
-
-        return {
+        return _json({
             "title": title,
             "period": report_type,
             "generatedAt": today.isoformat(),
             "summary": {
-                "totalEmployees": len(users),
-                "totalRecords": len(records),
+                "totalEmployees": frame.total_users,
+                "totalRecords": len(frame),
                 "attendanceRate": attendance_rate,
             },
-            "recommendations": svc.recommendations(records, users),
-            "topPerformers": svc.user_performance(users, records)[:3],
-        }
+            "recommendations": columnar.recommendations(frame),
+            "topPerformers": queries.user_performance(db, start_date, today.date(), limit=3),
+        })
+
+    try:
+        return cached_response(request, ("report", report_type, today_local()), build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Report generation failed: {str(e)}")
 
 
 @router.get("/anomalies")
 async def get_attendance_anomalies(
+    request: Request,
     days: int = 7,
     severity: str = "all",
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_admin_user),
 ):
-    try:
-        start_date = now_local() - timedelta(days=days)
-        records = db.query(Attendance).filter(Attendance.date >= start_date.date()).all()
-        users = db.query(User).all()
-
-        anomalies = svc.detect_anomalies(records, users)
+    def build():
+        today = now_local()
+        anomalies = queries.detect_anomalies(db, (today - timedelta(days=days)).date(), today.date())
         if severity != "all":
             anomalies = [a for a in anomalies if a["severity"] == severity]
 
-        return {
+        return _json({
             "anomalies": anomalies,
             "total": len(anomalies),
             "period": f"Last {days} days",
             "severityFilter": severity,
-        }
+        })
+
+    try:
+        return cached_response(request, ("anomalies", days, severity, today_local()), build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Anomaly detection failed: {str(e)}")
@@ -8,6 +8,7 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
 from sqlalchemy.orm import Session
 
+from app.core import metrics, timing
 from app.core.config import settings
 from app.core.limiter import limiter
 from app.core.time_utils import now_local, today_local
@@ -15,12 +16,20 @@ from app.api.deps import get_optional_current_user
 from app.db.session import get_db
 from app.models import Attendance, User
 from app.schemas import AttendanceResponse, UserResponse
+from app.services.admission import Overloaded, admission
+from app.services.attendance_writes import record_change, upsert_attendance
 from app.services.face_recognition import face_service
 
 logger = logging.getLogger("smart_attendance.attendance")
 
 router = APIRouter(prefix="/attendance", tags=["attendance"])
 
+# Per-request outcome; frames with no detectable face are counted per frame in
+# face_recognition_frames_total{result="no_face"}.
+OUTCOMES = metrics.counter(
+    "attendance_recognition_outcomes_total", "Attendance mark attempts by outcome.", ["outcome"]
+)
+
 
 @router.post("/mark")
 @limiter.limit(settings.RATE_LIMIT_ATTENDANCE)
@@ -44,7 +53,13 @@ async def mark_attendance(
     restricted to that account: showing another person's face is rejected so a
     user cannot mark attendance for someone else. When unauthenticated (kiosk
     mode), any registered user can be recognized.
+
+    Recognition goes through admission control: when the inference queue
+    cannot finish this request within its deadline it is rejected with 503
+    and a ``Retry-After`` header instead of queueing.
     """
+    # Everything before the handler body: multipart parsing and dependencies.
+    timing.mark("parse")
     temp_paths: List[str] = []
     try:
         if not liveness_verified:
@@ -58,16 +73,35 @@ async def mark_attendance(
         if not uploads:
             raise HTTPException(status_code=422, detail="No image frame provided.")
 
-        for i, upload in enumerate(uploads):
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-            path = os.path.join(settings.UPLOAD_DIR, f"temp_{timestamp}_{i}.jpg")
-            with open(path, "wb") as buffer:
-                buffer.write(await upload.read())
-            temp_paths.append(path)
+        with timing.stage("write"):
+            for i, upload in enumerate(uploads):
+                timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+                path = os.path.join(settings.UPLOAD_DIR, f"temp_{timestamp}_{i}.jpg")
+                with open(path, "wb") as buffer:
+                    buffer.write(await upload.read())
+                temp_paths.append(path)
         logger.info(f"Attendance frames received: {len(temp_paths)}")
 
-        recognition = face_service.recognize_frames(temp_paths, db)
-        if not recognition:
+        try:
+            recognition = await admission.run(
+                face_service.recognize_frames, temp_paths, db, cost=len(temp_paths)
+            )
+        except Overloaded as e:
+            OUTCOMES.inc(outcome="shed")
+            logger.warning(f"Recognition shed ({e.reason}); retry after {e.retry_after}s")
+            raise HTTPException(
+                status_code=503,
+                detail="The recognition service is busy. Please try again shortly.",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        if recognition["reason"] == "no_face":
+            OUTCOMES.inc(outcome="no_face")
+            raise HTTPException(
+                status_code=404,
+                detail="No face detected. Please ensure your face is clearly visible to the camera.",
+            )
+        if recognition["user_id"] is None:
+            OUTCOMES.inc(outcome="unrecognized")
             raise HTTPException(
                 status_code=404,
                 detail="Face not recognized. Please ensure your face is clearly visible and that you have registered.",
@@ -84,6 +118,7 @@ async def mark_attendance(
                 f"Face mismatch: recognized {recognized_user_id} but logged in as "
                 f"{current_user.unique_id}"
             )
+            OUTCOMES.inc(outcome="mismatch")
             raise HTTPException(
                 status_code=403,
                 detail="This face does not belong to the logged-in account.",
@@ -92,6 +127,7 @@ async def mark_attendance(
         # Confidence band: matched, but not confident enough → ask to retry.
         if confidence < settings.FACE_ATTENDANCE_MIN_CONFIDENCE:
             logger.info(f"Low-confidence match {recognized_user_id} ({confidence}%) — retry requested")
+            OUTCOMES.inc(outcome="low_confidence")
             raise HTTPException(
                 status_code=422,
                 detail=f"Low confidence ({confidence:.0f}%). Move closer, face the camera directly, and try again.",
@@ -102,57 +138,48 @@ async def mark_attendance(
             f"{recognition.get('frames_agreed')}/{recognition.get('frames_total')} frames)"
         )
 
-        user = db.query(User).filter(User.unique_id == recognized_user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found in database")
-
-        today = today_local()
-        existing_attendance = (
-            db.query(Attendance)
-            .filter(Attendance.user_id == user.id, Attendance.date == today)
-            .first()
-        )
+        with timing.stage("db"):
+            user = db.query(User).filter(User.unique_id == recognized_user_id).first()
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found in database")
 
-        if existing_attendance:
-            if existing_attendance.status == "absent":
-                existing_attendance.status = "present"
-                existing_attendance.time_in = now_local().time()
-                db.commit()
-                db.refresh(existing_attendance)
-                return {
-                    "message": f"Attendance updated for {user.full_name} - status changed from absent to present",
-                    "user": UserResponse.model_validate(user),
-                    "attendance": AttendanceResponse.model_validate(existing_attendance),
-                    "confidence": confidence,
-                }
-            time_str = (
-                existing_attendance.time_in.strftime("%I:%M %p")
-                if existing_attendance.time_in
-                else existing_attendance.status
+            today = today_local()
+            attendance, inserted = upsert_attendance(
+                db, user.id, today, "present", now_local().time(), replace_status="absent",
             )
-            raise HTTPException(
-                status_code=400,
-                detail=f"Attendance already marked for {user.full_name} today as {existing_attendance.status}"
-                + (f" at {time_str}" if existing_attendance.time_in else ""),
-            )
-
-        attendance = Attendance(
-            user_id=user.id,
-            date=today,
-            time_in=now_local().time(),
-            status="present",
-        )
-        db.add(attendance)
-        db.commit()
-        db.refresh(attendance)
-        logger.info(f"Attendance marked for {user.full_name} ({user.unique_id})")
-
-        return {
-            "message": f"Attendance marked successfully for {user.full_name}",
-            "user": UserResponse.model_validate(user),
-            "attendance": AttendanceResponse.model_validate(attendance),
-            "confidence": confidence,
-        }
+            if attendance is None:
+                existing_attendance = (
+                    db.query(Attendance)
+                    .filter(Attendance.user_id == user.id, Attendance.date == today)
+                    .first()
+                )
+                time_str = (
+                    existing_attendance.time_in.strftime("%I:%M %p")
+                    if existing_attendance.time_in
+                    else existing_attendance.status
+                )
+                OUTCOMES.inc(outcome="already_marked")
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Attendance already marked for {user.full_name} today as {existing_attendance.status}"
+                    + (f" at {time_str}" if existing_attendance.time_in else ""),
+                )
+
+            record_change(db, user, today, None if inserted else "absent", None, "present", attendance.time_in)
+            response = {
+                "message": (
+                    f"Attendance marked successfully for {user.full_name}" if inserted
+                    else f"Attendance updated for {user.full_name} - status changed from absent to present"
+                ),
+                "user": UserResponse.model_validate(user),
+                "attendance": AttendanceResponse.model_validate(attendance),
+                "confidence": confidence,
+            }
+            db.commit()
+            if inserted:
+                logger.info(f"Attendance marked for {user.full_name} ({user.unique_id})")
+            OUTCOMES.inc(outcome="recognized")
+            return response
     except HTTPException:
         raise
     except Exception as e:
@@ -17,6 +17,7 @@ from app.core.security import (
 from app.db.session import get_db
 from app.models import User
 from app.schemas import LoginRequest, UserCreate, UserResponse
+from app.services.analytics_cache import mark_changed
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -50,6 +51,7 @@ async def register(request: Request, user_data: UserCreate, db: Session = Depend
     )
 
     db.add(db_user)
+    mark_changed(db)
     db.commit()
     db.refresh(db_user)
 
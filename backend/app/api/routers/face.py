@@ -1,17 +1,21 @@
-"""Face quality, liveness, and enrollment endpoints for the current user."""
+"""Face quality, liveness, enrollment and stored-image endpoints."""
 
 import logging
+import mimetypes
 import os
 from datetime import datetime
+from typing import Dict, Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 from app.api import deps
 from app.core.config import settings
 from app.db.session import get_db
-from app.models import User
-from app.services.face_recognition import face_service
+from app.models import FaceImage, User
+from app.services import image_store
+from app.services.face_recognition import face_service, make_thumbnail
 
 logger = logging.getLogger("smart_attendance.face")
 
@@ -128,3 +132,71 @@ async def register_face(
                 except OSError:
                     pass
 
+
+def face_image_filename(position: int, content_type: Optional[str]) -> str:
+    return f"face_{position}{mimetypes.guess_extension(content_type or 'image/jpeg') or '.jpg'}"
+
+
+def face_image_urls(image_id: int) -> Dict[str, str]:
+    """API-relative URLs of a stored face image, for gallery listings."""
+    return {
+        "image_url": f"/face/images/{image_id}?size=full",
+        "thumbnail_url": f"/face/images/{image_id}?size=thumb",
+    }
+
+
+# Image ids can be reused (SQLite hands out a deleted row's id again), so a
+# URL does not pin its bytes: clients must revalidate each use. The ETag is
+# the content key, which makes that a cheap 304.
+_IMAGE_CACHE_CONTROL = "private, no-cache"
+
+
+@router.get("/images/{image_id}")
+async def get_face_image(
+    image_id: int,
+    request: Request,
+    size: str = Query("full", pattern="^(thumb|full)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user),
+):
+    """One stored face image (own images, or any for admins) as image bytes.
+
+    The ETag is the image's content key, so a revalidation (If-None-Match)
+    is answered from the ``face_images`` row without reading the bytes.
+    """
+    row = (
+        db.query(FaceImage.user_id, FaceImage.content_type, FaceImage.sha256, FaceImage.thumbnail_sha256)
+        .filter(FaceImage.id == image_id)
+        .first()
+    )
+    if row is None or (row.user_id != current_user.id and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Face image not found")
+    store = image_store.get_store()
+    key = row.thumbnail_sha256 if size == "thumb" else row.sha256
+    data = None
+
+    if key is None:  # enrolled before thumbnails were stored: make it once
+        full = store.get(db, row.sha256)
+        if full is None:
+            logger.error(f"Face image {image_id}: blob {row.sha256} missing from the {store.name} store")
+            raise HTTPException(status_code=404, detail="Face image not found")
+        data = make_thumbnail(full)
+        key = store.put(db, data)
+        db.execute(
+            update(FaceImage).where(FaceImage.id == image_id).values(thumbnail_sha256=key),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": _IMAGE_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")} or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    if data is None:
+        data = store.get(db, key)
+        if data is None:
+            logger.error(f"Face image {image_id}: blob {key} missing from the {store.name} store")
+            raise HTTPException(status_code=404, detail="Face image not found")
+    media_type = "image/jpeg" if size == "thumb" else row.content_type or "image/jpeg"
+    return Response(content=data, media_type=media_type, headers=headers)
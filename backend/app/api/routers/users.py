@@ -1,17 +1,18 @@
 """Current-user (self-service) endpoints."""
 
-import base64
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import extract
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.api.routers.face import face_image_filename, face_image_urls
 from app.core.security import get_password_hash, validate_password_strength, verify_password
 from app.db.session import get_db
 from app.models import Attendance, FaceImage, User
 from app.schemas import UserChangePassword, UserResponse, UserUpdateProfile
+from app.services import attendance_bitmaps as bitmaps
+from app.services.analytics_cache import mark_changed
 
 router = APIRouter(prefix="/user", tags=["user"])
 
@@ -34,6 +35,7 @@ async def update_user_profile(
     if profile_data.department is not None:
         current_user.department = profile_data.department
 
+    mark_changed(db)
     db.commit()
     db.refresh(current_user)
     return {"message": "Profile updated successfully", "user": UserResponse.model_validate(current_user)}
@@ -91,25 +93,38 @@ async def get_user_attendance_stats(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user),
 ):
-    query = db.query(Attendance).filter(Attendance.user_id == current_user.id)
-    if year:
-        query = query.filter(extract("year", Attendance.date) == year)
-    if month:
-        query = query.filter(extract("month", Attendance.date) == month)
-
-    total_days = query.count()
-    present_days = query.filter(Attendance.status == "present").count()
-    absent_days = query.filter(Attendance.status == "absent").count()
-    attendance_percentage = (present_days / total_days * 100) if total_days > 0 else 0
+    """Counts come from the user's attendance bitmaps (popcounts), not attendance rows."""
+    if month is not None and not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="month must be between 1 and 12")
+
+    years = bitmaps.load(db, current_user.id)
+    selected = [years[year]] if year in years else [] if year else list(years.values())
+    counts = bitmaps.period_counts(selected, month)
+    total_days = counts["total"]
+    attendance_percentage = (counts["present"] / total_days * 100) if total_days > 0 else 0
+
+    stats = {
+        "total_days": total_days,
+        "present_days": counts["present"],
+        "absent_days": counts["absent"],
+        "late_days": counts["late"],
+        "attendance_percentage": round(attendance_percentage, 2),
+        "current_streak": bitmaps.current_streak({y: b.present for y, b in years.items()}),
+    }
+    if year and not month:
+        stats["monthly"] = [
+            {
+                "month": m["month"],
+                "total_days": m["total"],
+                "present_days": m["present"],
+                "attendance_percentage": round(m["present"] / m["total"] * 100, 2) if m["total"] else 0,
+            }
+            for m in bitmaps.monthly_counts(years.get(year, bitmaps.YearBitmap(year, 0, 0, 0)))
+        ]
 
     return {
         "user": UserResponse.model_validate(current_user),
-        "stats": {
-            "total_days": total_days,
-            "present_days": present_days,
-            "absent_days": absent_days,
-            "attendance_percentage": round(attendance_percentage, 2),
-        },
+        "stats": stats,
         "period": {"month": month, "year": year},
     }
 
@@ -119,7 +134,8 @@ async def get_user_registered_faces(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user),
 ):
-    """Get the current user's registered face images (stored in the database)."""
+    """The current user's registered face images: metadata plus URLs of the
+    bytes (``/face/images/{id}``), not inlined payloads."""
     images = (
         db.query(FaceImage)
         .filter(FaceImage.user_id == current_user.id)
@@ -131,11 +147,12 @@ async def get_user_registered_faces(
 
     face_images = [
         {
-            "filename": f"face_{img.position}.jpg",
-            "image_data": f"data:{img.content_type};base64,{base64.b64encode(img.image_data).decode('utf-8')}",
+            "id": img.id,
+            "filename": face_image_filename(img.position, img.content_type),
+            **face_image_urls(img.id),
             "created_at": img.created_at.isoformat() if img.created_at else None,
             "quality_score": img.quality_score,
-            "quality_details": None,
+            "quality_details": img.quality_details,
         }
         for img in images
     ]
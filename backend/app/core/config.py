@@ -37,6 +37,12 @@ class Settings(BaseSettings):
     # what users see in the browser. Override via the APP_TIMEZONE env var.
     APP_TIMEZONE: str = "Asia/Kolkata"
 
+    # Per-stage timing of the recognition path: Server-Timing header, stage
+    # histograms and one structured log line per timed request.
+    STAGE_TIMING_ENABLED: bool = True
+    # Serve in-process metrics in Prometheus text format at /metrics.
+    METRICS_ENABLED: bool = True
+
     # ----- Security -----
     SECRET_KEY: str = "change-me-in-production"
     ALGORITHM: str = "HS256"
@@ -50,6 +56,25 @@ class Settings(BaseSettings):
     RATE_LIMIT_REGISTER: str = "10/hour"
     RATE_LIMIT_ATTENDANCE: str = "20/minute"
 
+    # ----- Inference admission control -----
+    # Recognition jobs allowed to wait for an inference slot, and the
+    # per-request deadline: requests whose estimated wait would exceed it are
+    # shed with 503 + Retry-After instead of queueing past client timeouts.
+    INFERENCE_MAX_QUEUE: int = 16
+    INFERENCE_DEADLINE_SECONDS: float = 10.0
+
+    # ----- Analytics cache -----
+    # Rendered analytics responses are reused until attendance/user data
+    # changes in this process; the TTL bounds staleness from writes handled
+    # by other workers (0 disables caching).
+    ANALYTICS_CACHE_TTL_SECONDS: float = 30.0
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 256
+
+    # ----- Scheduled jobs -----
+    # Local time (HH:MM, APP_TIMEZONE) at which each API process marks every
+    # active user without a record today as absent. Empty disables the job.
+    MARK_ABSENT_AT: str = ""
+
     # ----- CORS (comma-separated origins) -----
     BACKEND_CORS_ORIGINS: str = "http://localhost:3000"
 
@@ -60,6 +85,11 @@ class Settings(BaseSettings):
     # ----- Storage (absolute paths so behaviour is independent of CWD) -----
     DATASET_DIR: str = str(BASE_DIR / "dataset")
     UPLOAD_DIR: str = str(BASE_DIR / "uploads")
+    # Where face image bytes live: "database" (the face_image_blobs table) or
+    # "filesystem" (FACE_IMAGE_DIR, content-addressed by SHA-256). Move
+    # existing images between them with scripts/migrate_image_store.py.
+    FACE_IMAGE_STORE: str = "database"
+    FACE_IMAGE_DIR: str = str(BASE_DIR / "face_images")
 
     # ----- Face recognition -----
     FACE_MODEL_PACK: str = "buffalo_l"
@@ -75,6 +105,26 @@ class Settings(BaseSettings):
     # Minimum confidence (%) required to accept an attendance mark.
     # Matches below this (but above the match threshold) prompt a retry.
     FACE_ATTENDANCE_MIN_CONFIDENCE: float = 50.0
+    # Longest side (px) of the gallery thumbnails stored with each face image.
+    FACE_THUMBNAIL_SIZE: int = 160
+    # Enrollment images are stored normalized: a crop centred on the face (its
+    # box grown by FACE_IMAGE_MARGIN of the box size on every side), longest
+    # side at most FACE_IMAGE_MAX_SIDE px, re-encoded as FACE_IMAGE_FORMAT
+    # ("jpeg" or "webp") at FACE_IMAGE_QUALITY. FACE_STORE_ORIGINAL also keeps
+    # each upload exactly as sent.
+    FACE_IMAGE_MARGIN: float = 0.5
+    FACE_IMAGE_MAX_SIDE: int = 480
+    FACE_IMAGE_FORMAT: str = "jpeg"
+    FACE_IMAGE_QUALITY: int = 90
+    FACE_STORE_ORIGINAL: bool = False
+    # Where the ONNX models run: "inprocess" (inside each API worker) or
+    # "process" (a local pool of FACE_INFERENCE_WORKERS inference processes,
+    # so API and inference capacity scale independently).
+    FACE_INFERENCE_BACKEND: str = "inprocess"
+    FACE_INFERENCE_WORKERS: int = 1
+    # Shared-memory slots for handing frames to "process" workers without
+    # pickling them (0 = pickle frames over the pool's pipes instead).
+    FACE_INFERENCE_SHM_SLOTS: int = 4
 
     @property
     def cors_origins(self) -> List[str]:
@@ -0,0 +1,170 @@
+"""
+Minimal in-process metrics (counters, gauges, histograms).
+
+No external service or client library: metrics live in this process, are
+registered in ``REGISTRY`` under Prometheus-style names and labels, and are
+rendered in the Prometheus text exposition format by ``render()`` (served at
+``/metrics``).
+"""
+
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Default latency buckets (seconds): 5 ms .. 30 s.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[str, ...]
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        # Unlabelled series are exported as 0 from the start.
+        self._values: Dict[LabelKey, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[LabelKey, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts (+Inf last), sum, count)
+        self._values: Dict[LabelKey, List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self) -> List[Tuple[LabelKey, List]]:
+        with self._lock:
+            return [(k, [list(v[0]), v[1], v[2]]) for k, v in self._values.items()]
+
+
+REGISTRY: Dict[str, _Metric] = {}
+
+
+def _register(metric: _Metric) -> _Metric:
+    existing = REGISTRY.get(metric.name)
+    if existing is not None:
+        return existing
+    REGISTRY[metric.name] = metric
+    return metric
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge(name, help, labelnames))
+
+
+def histogram(
+    name: str,
+    help: str,
+    labelnames: Sequence[str] = (),
+    buckets: Iterable[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+# ── Prometheus text exposition ──────────────────────────────────────────────
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text format (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if isinstance(metric, Histogram):
+            for key, (counts, total, count) in metric.samples():
+                cumulative = 0
+                for bound, n in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = 'le="' + _number(bound) + '"'
+                    lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, key, le)} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(metric.labelnames, key)} {_number(total)}")
+                lines.append(f"{metric.name}_count{_labels(metric.labelnames, key)} {count}")
+        else:
+            for key, value in metric.samples():
+                lines.append(f"{metric.name}{_labels(metric.labelnames, key)} {_number(value)}")
+    return "\n".join(lines) + "\n"
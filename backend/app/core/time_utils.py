@@ -10,7 +10,7 @@ The DB columns for attendance are naive ``Date``/``Time``, so these helpers
 return naive values already shifted to the configured timezone.
 """
 
-from datetime import date, datetime, time
+from datetime import date, datetime, time, timedelta, timezone
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from app.core.config import settings
@@ -38,3 +38,13 @@ def today_local() -> date:
 def time_local() -> time:
     """Current time-of-day in the configured timezone."""
     return now_local().time()
+
+
+def seconds_until(at: time) -> float:
+    """Seconds from now until the next local wall-clock ``at`` (DST-aware)."""
+    tz = _tz()
+    now = datetime.now(tz)
+    target = datetime.combine(now.date(), at, tzinfo=tz)
+    if target <= now:
+        target = datetime.combine(now.date() + timedelta(days=1), at, tzinfo=tz)
+    return (target.astimezone(timezone.utc) - now.astimezone(timezone.utc)).total_seconds()
@@ -0,0 +1,91 @@
+"""
+Per-request stage timing.
+
+A ``StageTimer`` is bound to the current request through a context variable
+(set by the timing middleware in ``app.main``), so deep code such as
+``FaceRecognitionService`` can time its stages without threading a timer
+through every call::
+
+    with timing.stage("detect"):
+        ...
+
+The context is copied into threadpool jobs, so stages recorded there land on
+the request's timer. With no active timer (timing disabled, or code running
+outside a request) ``stage()`` returns a shared no-op context manager.
+"""
+
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from app.core import metrics
+
+STAGE_SECONDS = metrics.histogram(
+    "request_stage_seconds", "Time spent per request stage.", ["route", "stage"]
+)
+
+_current: ContextVar[Optional["StageTimer"]] = ContextVar("stage_timer", default=None)
+_NOOP = nullcontext()
+
+
+class StageTimer:
+    __slots__ = ("started", "stages")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}  # stage -> seconds (accumulated)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total: float) -> str:
+        """Render as a ``Server-Timing`` header value (durations in ms)."""
+        parts = [f"{name};dur={secs * 1000:.1f}" for name, secs in self.stages.items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def start() -> StageTimer:
+    """Bind a fresh timer to the current context."""
+    timer = StageTimer()
+    _current.set(timer)
+    return timer
+
+
+def current() -> Optional[StageTimer]:
+    return _current.get()
+
+
+@contextmanager
+def _timed(timer: StageTimer, name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - started)
+
+
+def stage(name: str):
+    """Time the enclosed block as ``name`` on the current request's timer."""
+    timer = _current.get()
+    if timer is None:
+        return _NOOP
+    return _timed(timer, name)
+
+
+def record(name: str, seconds: float) -> None:
+    """Add an already-measured duration to the current request's timer."""
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+
+def mark(name: str) -> None:
+    """Record the time since the request started as stage ``name``."""
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, timer.elapsed())
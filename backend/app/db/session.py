@@ -1,8 +1,9 @@
 """Database engine and session management (SQLite locally, PostgreSQL in prod)."""
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
+from app.core import metrics
 from app.core.config import settings
 from app.db.base import Base
 
@@ -18,6 +19,20 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+POOL_CHECKOUTS = metrics.counter("db_pool_checkouts_total", "Connections checked out of the DB pool.")
+POOL_CHECKED_OUT = metrics.gauge("db_pool_checked_out", "DB pool connections currently in use.")
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKOUTS.inc()
+    POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    POOL_CHECKED_OUT.dec()
+
 
 def get_db():
     """FastAPI dependency that yields a database session."""
@@ -0,0 +1,93 @@
+"""
+Portable SQL expressions for the two supported backends (SQLite locally,
+PostgreSQL in production). Dialect-specific SQL lives here and nowhere else.
+"""
+
+from typing import Optional
+
+from sqlalchemy import Boolean, Date, Integer, String, cast, extract, func, literal, literal_column, text, type_coerce
+
+
+def dialect_name(bind) -> str:
+    """Dialect of a Session, Connection or Engine ("sqlite" / "postgresql")."""
+    if hasattr(bind, "get_bind"):
+        bind = bind.get_bind()
+    return bind.dialect.name
+
+
+def time_seconds(bind, column):
+    """Whole seconds since midnight for a TIME column (truncates like ``t.second``)."""
+    if dialect_name(bind) == "postgresql":
+        return func.floor(extract("epoch", column))
+    return (
+        extract("hour", column) * 3600
+        + extract("minute", column) * 60
+        + extract("second", column)
+    )
+
+
+def insert_for(bind):
+    """The dialect's INSERT construct (supports ``on_conflict_do_update``)."""
+    if dialect_name(bind) == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def upsert_inserted(bind):
+    """RETURNING column telling an ``ON CONFLICT DO UPDATE`` insert from an update.
+
+    PostgreSQL only (a freshly inserted row version has ``xmax = 0``); None
+    on SQLite, which has no equivalent.
+    """
+    if dialect_name(bind) == "postgresql":
+        return literal_column("xmax = 0", Boolean).label("inserted")
+    return None
+
+
+def day_number(bind, column):
+    """Integer day count for a DATE column (consecutive dates differ by 1)."""
+    if dialect_name(bind) == "postgresql":
+        return type_coerce(column - literal_column("DATE '1970-01-01'"), Integer)
+    return cast(func.julianday(column), Integer)
+
+
+def weekday(bind, column):
+    """Monday=0 weekday of a DATE column."""
+    if dialect_name(bind) == "postgresql":
+        return cast(extract("isodow", column), Integer) - 1
+    return (cast(func.strftime("%w", column), Integer) + 6) % 7
+
+
+def date_bucket(bind, column, granularity: str):
+    """First day of the "day", "week" (ISO, Monday) or "month" holding a DATE column."""
+    if granularity == "day":
+        return column
+    if granularity not in ("week", "month"):
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if dialect_name(bind) == "postgresql":
+        return cast(func.date_trunc(granularity, column), Date)
+    if granularity == "month":
+        return type_coerce(func.date(column, "start of month"), Date)
+    back = literal("-") + cast(weekday(bind, column), String) + literal(" days")
+    return type_coerce(func.date(column, back), Date)
+
+
+def estimated_count(db, stmt, table=None) -> Optional[int]:
+    """Planner row estimate for ``stmt``, or None where the backend has none (SQLite).
+
+    PostgreSQL: ``pg_class.reltuples`` for ``table`` (pass it only when
+    ``stmt`` is unfiltered), otherwise the top plan node's row estimate.
+    Both are -1/None until the table has been analyzed.
+    """
+    if dialect_name(db) != "postgresql":
+        return None
+    if table is not None:
+        reltuples = db.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = CAST(:name AS regclass)"), {"name": table.name}
+        ).scalar()
+        return int(reltuples) if reltuples is not None and reltuples >= 0 else None
+    compiled = stmt.compile(dialect=db.get_bind().dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
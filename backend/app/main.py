@@ -1,17 +1,24 @@
 """FastAPI application factory and entrypoint."""
 
+import asyncio
+import json
 import os
+import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
+from app.core import metrics, timing
 from app.core.config import settings, validate_security
 from app.core.limiter import limiter
 from app.core.logging import configure_logging, get_logger
 from app.db.session import run_migrations
+from app.services import absence_job
+from app.services.face_recognition import face_service
 from app.api.routers import (
     admin,
     analytics,
@@ -23,6 +30,25 @@ from app.api.routers import (
 
 configure_logging()
 logger = get_logger("smart_attendance")
+timing_logger = get_logger("smart_attendance.timing")
+
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "HTTP requests by route and status.", ["method", "route", "status"]
+)
+HTTP_LATENCY = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ["method", "route"]
+)
+
+
+async def warm_up_inference() -> None:
+    """Load the recognition models off the event loop, so the first scan is not slow."""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(face_service.backend.warmup)
+    except Exception:
+        logger.exception("Face inference warm-up failed; models will load on first use")
+        return
+    logger.info(f"Face inference backend ready in {time.perf_counter() - started:.1f}s")
 
 
 @asynccontextmanager
@@ -32,8 +58,14 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     os.makedirs(settings.DATASET_DIR, exist_ok=True)
     run_migrations()
+    job = absence_job.start(settings.MARK_ABSENT_AT)
+    warmup = asyncio.create_task(warm_up_inference())
     logger.info(f"{settings.PROJECT_NAME} v{settings.API_VERSION} started")
     yield
+    if job:
+        job.cancel()
+    warmup.cancel()
+    face_service.close()
 
 
 def create_app() -> FastAPI:
@@ -53,7 +85,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
-        expose_headers=["X-Total-Count"],
+        expose_headers=["X-Total-Count", "X-Next-Cursor", "Server-Timing", "ETag", "Last-Modified"],
     )
 
     @app.middleware("http")
@@ -67,6 +99,39 @@ def create_app() -> FastAPI:
             response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
         return response
 
+    @app.middleware("http")
+    async def request_metrics(request: Request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        # Label by route template (not raw path) to keep cardinality bounded.
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=str(response.status_code))
+        HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route)
+        return response
+
+    if settings.STAGE_TIMING_ENABLED:
+        @app.middleware("http")
+        async def stage_timing(request: Request, call_next):
+            # Routes and services record stages via app.core.timing; requests
+            # that record none (most of them) only pay for the timer object.
+            timer = timing.start()
+            response = await call_next(request)
+            if timer.stages:
+                total = timer.elapsed()
+                route = getattr(request.scope.get("route"), "path", request.url.path)
+                for name, secs in timer.stages.items():
+                    timing.STAGE_SECONDS.observe(secs, route=route, stage=name)
+                timing.STAGE_SECONDS.observe(total, route=route, stage="total")
+                response.headers["Server-Timing"] = timer.server_timing(total)
+                timing_logger.info(json.dumps({
+                    "method": request.method,
+                    "route": route,
+                    "status": response.status_code,
+                    "total_ms": round(total * 1000, 1),
+                    "stages_ms": {k: round(v * 1000, 1) for k, v in timer.stages.items()},
+                }))
+            return response
+
     @app.get("/", tags=["health"])
     async def root():
         return {"message": f"{settings.PROJECT_NAME} API", "version": settings.API_VERSION}
@@ -75,6 +140,11 @@ def create_app() -> FastAPI:
     async def health():
         return {"status": "ok"}
 
+    if settings.METRICS_ENABLED:
+        @app.get("/metrics", tags=["health"], include_in_schema=False)
+        async def prometheus_metrics():
+            return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
     for router in (auth.router, face.router, attendance.router, users.router, admin.router, analytics.router):
         app.include_router(router)
 
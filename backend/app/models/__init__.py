@@ -1,5 +1,7 @@
 from app.models.user import User
-from app.models.attendance import Attendance
-from app.models.face import FaceEmbedding, FaceImage
+from app.models.attendance import Attendance, AttendanceBitmap, AttendanceDailySummary
+from app.models.face import FaceEmbedding, FaceImage, FaceImageBlob
 
-__all__ = ["User", "Attendance", "FaceEmbedding", "FaceImage"]
+__all__ = [
+    "User", "Attendance", "AttendanceBitmap", "AttendanceDailySummary", "FaceEmbedding", "FaceImage", "FaceImageBlob",
+]
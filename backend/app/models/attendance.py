@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, String, Time
+from sqlalchemy import BigInteger, Column, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Time
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base
@@ -8,12 +8,57 @@ from app.db.base import Base
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        # One row per user per day; also the conflict target of the mark upserts.
+        Index("ix_attendance_user_id_date", "user_id", "date", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     time_in = Column(Time, nullable=True)
     status = Column(String, nullable=False)  # "present" or "absent"
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="attendances")
+
+
+class AttendanceDailySummary(Base):
+    """
+    Per (date, department) attendance counts, maintained in the same
+    transaction as every attendance write (app.services.attendance_writes) so
+    dashboard trends read O(days x departments) rows instead of raw attendance.
+
+    Department is the user's department at write time ("Unassigned" if empty);
+    ``scripts/rebuild_daily_summary.py`` recomputes the table from attendance.
+    """
+
+    __tablename__ = "attendance_daily_summary"
+
+    date = Column(Date, primary_key=True)
+    department = Column(String, primary_key=True)
+    present_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+    on_time_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    arrival_seconds = Column(BigInteger, nullable=False, default=0)  # sum over on-time + late arrivals
+
+
+class AttendanceBitmap(Base):
+    """
+    One user's attendance for one calendar year as 366-bit day bitmaps (bit
+    ``day_of_year - 1``, little-endian bytes; see app.services.attendance_bitmaps).
+
+    ``present`` / ``absent`` mirror the user's attendance rows and ``late``
+    marks present days with a time_in after WORK_START. Maintained with the
+    attendance rows by app.services.attendance_writes; rebuilt from attendance
+    by ``scripts/rebuild_attendance_bitmaps.py``.
+    """
+
+    __tablename__ = "attendance_bitmaps"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    present = Column(LargeBinary, nullable=False)
+    absent = Column(LargeBinary, nullable=False)
+    late = Column(LargeBinary, nullable=False)
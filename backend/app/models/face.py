@@ -6,10 +6,11 @@ from sqlalchemy import (
     Float,
     ForeignKey,
     Integer,
+    JSON,
     LargeBinary,
     String,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from app.db.base import Base
 
@@ -19,13 +20,16 @@ class FaceEmbedding(Base):
     One row per enrolled user holding all their ArcFace embeddings as a packed
     float32 matrix (count x dim). Stored in the DB so recognition data survives
     restarts/redeploys (stateless backend).
+
+    ``embeddings`` is deferred: querying the row for metadata (count, model,
+    dates) does not pull the matrix; loaders that need it ``undefer`` it.
     """
 
     __tablename__ = "face_embeddings"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False, index=True)
-    embeddings = Column(LargeBinary, nullable=False)  # np.float32 (count, dim).tobytes()
+    embeddings = deferred(Column(LargeBinary, nullable=False))  # np.float32 (count, dim).tobytes()
     count = Column(Integer, nullable=False)
     dim = Column(Integer, nullable=False, default=512)
     model = Column(String, nullable=False)
@@ -36,16 +40,47 @@ class FaceEmbedding(Base):
 
 
 class FaceImage(Base):
-    """A stored face image (JPEG bytes) used at enrollment, for the gallery."""
+    """A face image used at enrollment, shown in the gallery.
+
+    Only metadata lives here: the bytes are in the configured image store
+    (``app.services.image_store``), addressed by their SHA-256. The image
+    is the normalized face crop made at enrollment; the thumbnail is a small
+    JPEG of it (NULL for images enrolled before thumbnails existed; made on
+    first request), and the upload as sent is kept only with
+    ``FACE_STORE_ORIGINAL``. Clients fetch images from ``/face/images/{id}``.
+
+    ``chip_sha256`` is the aligned 112x112 recognition input for the image
+    (raw uint8 BGR bytes), so embeddings can be recomputed without
+    re-running detection (``FaceRecognitionService.reencode_all``).
+
+    ``quality_score`` / ``quality_details`` were measured on the upload,
+    before normalization.
+    """
 
     __tablename__ = "face_images"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     position = Column(Integer, nullable=False)  # 1..N
-    image_data = Column(LargeBinary, nullable=False)
+    sha256 = Column(String(64), nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    thumbnail_sha256 = Column(String(64), nullable=True, index=True)
+    original_sha256 = Column(String(64), nullable=True, index=True)
+    chip_sha256 = Column(String(64), nullable=True, index=True)
     content_type = Column(String, default="image/jpeg")
     quality_score = Column(Float, nullable=True)
+    quality_details = Column(JSON, nullable=True)  # check_image_quality metrics
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="face_images")
+
+
+class FaceImageBlob(Base):
+    """Image bytes for the "database" image store, one row per distinct SHA-256."""
+
+    __tablename__ = "face_image_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    data = deferred(Column(LargeBinary, nullable=False))
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)  # refreshed by every put (see image_store.PUT_GRACE)
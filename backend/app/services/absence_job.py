@@ -0,0 +1,68 @@
+"""
+End-of-day absence marking, run inside the API process.
+
+When ``settings.MARK_ABSENT_AT`` is set (local HH:MM), ``start`` schedules
+an asyncio task that sleeps until that time each day and runs
+``attendance_writes.mark_absent`` for today in a worker thread. Marking is
+idempotent (already-marked users are skipped in SQL), so it is safe for
+every API worker to run the job and for admins to still trigger
+``/admin/mark-absent`` by hand.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, time
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.time_utils import seconds_until, today_local
+from app.db.session import SessionLocal
+from app.services.attendance_writes import mark_absent
+
+logger = logging.getLogger("smart_attendance.jobs")
+
+
+def parse_time(value: str) -> time:
+    try:
+        return datetime.strptime(value.strip(), "%H:%M").time()
+    except ValueError:
+        raise ValueError(f"MARK_ABSENT_AT must be HH:MM, got {value!r}")
+
+
+def run_once(day: date, session_factory: Callable[[], Session] = SessionLocal) -> int:
+    """Mark ``day``'s absences in their own transaction; returns rows added."""
+    db = session_factory()
+    try:
+        count = mark_absent(db, day)
+        db.commit()
+        return count
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_daily(at: time) -> None:
+    last_run: Optional[date] = None
+    while True:
+        await asyncio.sleep(seconds_until(at))
+        day = today_local()
+        if day == last_run:  # woke a moment early; the next sleep reaches tomorrow
+            continue
+        last_run = day
+        try:
+            count = await asyncio.to_thread(run_once, day)
+            logger.info(f"Scheduled mark-absent: {count} user(s) marked absent for {day}")
+        except Exception:
+            logger.exception("Scheduled mark-absent failed")
+
+
+def start(mark_absent_at: str) -> Optional[asyncio.Task]:
+    """Schedule the daily job (None when ``mark_absent_at`` is empty)."""
+    if not mark_absent_at:
+        return None
+    at = parse_time(mark_absent_at)
+    logger.info(f"Marking absences daily at {at.strftime('%H:%M')}")
+    return asyncio.create_task(run_daily(at))
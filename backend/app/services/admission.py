@@ -0,0 +1,140 @@
+"""
+Cost-aware admission control for the recognition path.
+
+``RATE_LIMIT_ATTENDANCE`` bounds requests per client IP, but not how much
+inference work is queued. This controller sits in front of ``face_service``:
+
+  * at most ``concurrency`` recognition jobs run at once (one per inference
+    worker); the rest wait in a bounded queue;
+  * every job has a cost (number of frames) and the controller keeps an EWMA
+    of service time per frame, so it can estimate how long a new job would
+    wait behind the work already admitted;
+  * a job is shed immediately (``Overloaded`` -> 503 + ``Retry-After``) when
+    the queue is full or the estimated wait plus its own service time exceeds
+    the per-request deadline, and dropped at dequeue if it already waited past
+    the deadline.
+
+Jobs run in the threadpool so inference no longer blocks the event loop.
+"""
+
+import math
+import threading
+import time
+from typing import Callable, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core import metrics, timing
+from app.core.config import settings
+
+T = TypeVar("T")
+
+QUEUE_DEPTH = metrics.gauge(
+    "inference_queue_depth", "Recognition jobs admitted and waiting for an inference slot."
+)
+QUEUE_WAIT = metrics.histogram(
+    "inference_queue_wait_seconds", "Time admitted recognition jobs waited for an inference slot."
+)
+SERVICE_TIME = metrics.histogram(
+    "inference_service_seconds", "Time recognition jobs spent running on an inference slot."
+)
+REJECTIONS = metrics.counter(
+    "inference_rejections_total", "Recognition jobs shed by admission control.", ["reason"]
+)
+
+
+class Overloaded(Exception):
+    """Raised when a job is shed; ``retry_after`` is a whole number of seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        concurrency: int,
+        max_queue: int,
+        deadline_seconds: float,
+        initial_cost_seconds: float = 0.3,
+        ewma_alpha: float = 0.2,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.deadline_seconds = deadline_seconds
+        self.ewma_alpha = ewma_alpha
+        self.cost_per_unit = initial_cost_seconds  # EWMA seconds per frame
+
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self._admitted = 0       # jobs queued or running
+        self._running = 0
+        self._pending_cost = 0   # total cost of queued + running jobs
+
+    def estimated_wait(self) -> float:
+        """Seconds a job admitted now would wait for a slot."""
+        with self._lock:
+            return self._pending_cost * self.cost_per_unit / self.concurrency
+
+    def _publish_depth(self) -> None:
+        QUEUE_DEPTH.set(self._admitted - self._running)
+
+    def _admit(self, cost: int) -> None:
+        with self._lock:
+            wait = self._pending_cost * self.cost_per_unit / self.concurrency
+            if self._admitted >= self.concurrency + self.max_queue:
+                reason = "queue_full"
+            elif wait + cost * self.cost_per_unit > self.deadline_seconds:
+                reason = "deadline"
+            else:
+                self._admitted += 1
+                self._pending_cost += cost
+                self._publish_depth()
+                return
+        REJECTIONS.inc(reason=reason)
+        raise Overloaded(reason, max(1, math.ceil(wait)))
+
+    def _execute(self, fn: Callable[..., T], args: tuple, cost: int, enqueued_at: float) -> T:
+        try:
+            with self._slots:
+                waited = time.perf_counter() - enqueued_at
+                QUEUE_WAIT.observe(waited)
+                timing.record("queue", waited)
+                if waited > self.deadline_seconds:
+                    # The client has most likely given up already.
+                    REJECTIONS.inc(reason="expired")
+                    raise Overloaded("expired", max(1, math.ceil(self.estimated_wait())))
+
+                with self._lock:
+                    self._running += 1
+                    self._publish_depth()
+                started = time.perf_counter()
+                try:
+                    return fn(*args)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    SERVICE_TIME.observe(elapsed)
+                    with self._lock:
+                        self._running -= 1
+                        per_unit = elapsed / max(1, cost)
+                        self.cost_per_unit += self.ewma_alpha * (per_unit - self.cost_per_unit)
+        finally:
+            with self._lock:
+                self._admitted -= 1
+                self._pending_cost -= cost
+                self._publish_depth()
+
+    async def run(self, fn: Callable[..., T], *args, cost: int = 1) -> T:
+        """Admit (or shed) a job of ``cost`` units, then run ``fn(*args)`` in the threadpool."""
+        self._admit(cost)
+        return await run_in_threadpool(self._execute, fn, args, cost, time.perf_counter())
+
+
+# Module-level singleton guarding face_service on the recognition path.
+admission = AdmissionController(
+    concurrency=settings.FACE_INFERENCE_WORKERS,
+    max_queue=settings.INFERENCE_MAX_QUEUE,
+    deadline_seconds=settings.INFERENCE_DEADLINE_SECONDS,
+)
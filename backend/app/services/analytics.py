@@ -1,6 +1,10 @@
 """
 Attendance analytics computed strictly from real records.
 
+These are the reference implementations over ORM objects. The dashboard reads
+the same figures from the database via ``app.services.analytics_queries``;
+both must stay in agreement (see tests/test_analytics.py).
+
 Data model available: Attendance(user_id, date, time_in, status) and
 User(department). Every metric below is derived only from those facts — no
 simulated, random, or fabricated values.
@@ -20,11 +24,15 @@ from app.core.time_utils import now_local
 WORK_START = time(9, 0)
 
 
+def _format_seconds(secs: float) -> str:
+    """Seconds since midnight as HH:MM."""
+    return f"{int(secs // 3600):02d}:{int((secs % 3600) // 60):02d}"
+
+
 def _avg_arrival(times) -> str:
     if not times:
         return "N/A"
-    secs = sum(t.hour * 3600 + t.minute * 60 + t.second for t in times) / len(times)
-    return f"{int(secs // 3600):02d}:{int((secs % 3600) // 60):02d}"
+    return _format_seconds(sum(t.hour * 3600 + t.minute * 60 + t.second for t in times) / len(times))
 
 
 def _format_hour(hour: int) -> str:
@@ -0,0 +1,178 @@
+"""
+Response cache for the analytics endpoints.
+
+Entries are keyed by endpoint and parameters plus the current *data
+version*: a per-process counter bumped whenever a transaction that changed
+attendance or users commits. Write paths flag their session with
+``mark_changed`` (``attendance_writes.record_changes`` does so for every
+attendance write); the bump happens in an ``after_commit`` hook, so a
+rolled-back write never invalidates anything and a reader can never cache
+pre-commit data under the new version.
+
+The version is in-process: writes handled by another API worker are only
+picked up when entries expire, so ``ANALYTICS_CACHE_TTL_SECONDS`` bounds
+staleness across workers.
+
+Cached bodies are stored rendered, with a content ETag and Last-Modified,
+so polling dashboards can revalidate and get 304s. Builders pass the
+ETag's content separately when the body carries a generation timestamp,
+so a rebuild of unchanged data keeps its ETag.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core import metrics
+from app.core.config import settings
+
+_SESSION_FLAG = "analytics_changed"
+
+CACHE_REQUESTS = metrics.counter(
+    "analytics_cache_requests_total",
+    "Analytics cache lookups by result (hit, miss, not_modified).",
+    ["result"],
+)
+
+_version_lock = threading.Lock()
+_version = 0
+
+
+def data_version() -> int:
+    return _version
+
+
+def bump_version() -> None:
+    global _version
+    with _version_lock:
+        _version += 1
+
+
+def mark_changed(db: Session) -> None:
+    """Flag ``db``'s transaction as changing analytics inputs (applied on commit)."""
+    db.info[_SESSION_FLAG] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session: Session) -> None:
+    if session.info.pop(_SESSION_FLAG, False):
+        bump_version()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session: Session, previous_transaction) -> None:
+    if not previous_transaction.nested:
+        session.info.pop(_SESSION_FLAG, None)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+    headers: Dict[str, str]
+    etag: str
+    last_modified: float  # epoch seconds, whole
+    expires_at: float  # monotonic
+
+
+class ResultCache:
+    """Thread-safe TTL + LRU map of rendered responses."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(
+        self, key: Hashable, body: bytes, media_type: str, headers: Dict[str, str], tag: Optional[bytes] = None,
+    ) -> CachedResponse:
+        """Cache a rendered response; its ETag hashes ``tag`` (default: ``body``)."""
+        entry = CachedResponse(
+            body=body,
+            media_type=media_type,
+            headers=headers,
+            etag='"' + hashlib.sha1(body if tag is None else tag).hexdigest() + '"',
+            last_modified=float(int(time.time())),
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+cache = ResultCache(settings.ANALYTICS_CACHE_MAX_ENTRIES, settings.ANALYTICS_CACHE_TTL_SECONDS)
+
+
+def _not_modified(request: Request, entry: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= entry.last_modified
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cached_response(
+    request: Request,
+    key: Tuple,
+    build: Callable[[], tuple],
+) -> Response:
+    """Serve ``key`` from the cache (or ``build()`` it), honouring conditional headers.
+
+    ``build`` returns ``(body, media_type, extra_headers)``, optionally plus
+    the ETag content (``ResultCache.put``'s ``tag``). The data version
+    is read before building, so data committed mid-build is never cached
+    under the newer version.
+    """
+    full_key = key + (data_version(),)
+    entry = cache.get(full_key)
+    hit = entry is not None
+    if not hit:
+        entry = cache.put(full_key, *build())
+    not_modified = _not_modified(request, entry)
+    CACHE_REQUESTS.inc(result="not_modified" if not_modified else "hit" if hit else "miss")
+
+    validators = {
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+    if not_modified:
+        return Response(status_code=304, headers=validators)
+    return Response(content=entry.body, media_type=entry.media_type, headers={**entry.headers, **validators})
@@ -0,0 +1,354 @@
+"""
+Columnar (NumPy) implementations of the dashboard analytics.
+
+Same definitions and output as the reference implementations in
+``app.services.analytics``, but computed over an ``AttendanceFrame``: the
+period's attendance held as parallel arrays (user id, date ordinal, arrival
+time, status code) plus the user table. Every section is a handful of
+vectorized passes (``bincount``, ``unique``, run-length streaks) instead of
+Python loops, sets and Counters over ORM objects.
+
+Where the reference depends on record order (peak-hour ties, the order of
+users in performance / anomaly lists, the date an anomaly reports) the frame
+keeps records in the order given; ``AttendanceFrame.load`` uses id order.
+"""
+
+from datetime import date, time, timedelta
+from operator import attrgetter, itemgetter
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.time_utils import now_local
+from app.models import Attendance, User
+from app.services.analytics import WORK_START, _format_hour, _format_seconds
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+STATUS_ABSENT, STATUS_PRESENT, STATUS_OTHER = 0, 1, 2
+_STATUS_CODES = {"absent": STATUS_ABSENT, "present": STATUS_PRESENT}
+
+NO_TIME = -1  # arrival for records without a time_in
+_US = 1_000_000
+
+
+def _time_us(t) -> int:
+    """Microseconds since midnight (keeps the reference's sub-second comparisons exact)."""
+    if t is None:
+        return NO_TIME
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * _US + t.microsecond
+
+
+WORK_START_US = _time_us(WORK_START)
+LATE_CUTOFF_US = _time_us(time(9, 15))  # "punctuality issues" threshold in recommendations
+
+
+def _weekday(ordinals):
+    """Monday=0 weekday of date ordinals (ordinal 1, 0001-01-01, was a Monday)."""
+    return (ordinals - 1) % 7
+
+
+def _encode(values, convert, n: int):
+    """int64 array of ``convert(v)``, converting each distinct value only once.
+
+    Dates, times and statuses repeat heavily across a period, so a dict
+    lookup per row (done in C by ``map``) replaces a Python call per row.
+    """
+    codes = {v: convert(v) for v in set(values)}
+    return np.fromiter(map(codes.__getitem__, values), dtype=np.int64, count=n)
+
+
+def _distinct(values):
+    """Sorted distinct values (plain sort + neighbour compare, which beats np.unique here)."""
+    values = np.sort(values)
+    keep = np.ones(values.size, dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+
+class AttendanceFrame:
+    """Attendance records and users as parallel NumPy arrays.
+
+    Per record: ``uid`` (user id), ``day`` (date ordinal), ``arrival``
+    (microseconds since midnight, ``NO_TIME`` if none) and ``status``.
+    ``ucode`` maps each record to a dense index into ``codes`` (the distinct
+    user ids seen in records), ``first`` holds each code's first record and
+    ``user_pos`` its row in the user table, or -1 when the user no longer
+    exists.
+    """
+
+    def __init__(self, users, uid, day, time_in, status):
+        """``users``: (id, full_name, department) rows; the rest are per-record columns."""
+        users = sorted(users, key=lambda u: u[0])
+        self.user_ids = np.array([u[0] for u in users], dtype=np.int64)
+        self.names = [u[1] for u in users]
+        departments = np.array([u[2] or "Unassigned" for u in users], dtype=str)
+        self.dept_names, self.dept_index = np.unique(departments, return_inverse=True)
+
+        n = len(uid)
+        self.uid = np.fromiter(uid, dtype=np.int64, count=n)
+        self.day = _encode(day, date.toordinal, n)
+        self.arrival = _encode(time_in, _time_us, n)
+        self.status = _encode(status, lambda s: _STATUS_CODES.get(s, STATUS_OTHER), n).astype(np.int8)
+
+        self.codes, self.first, self.ucode = np.unique(self.uid, return_index=True, return_inverse=True)
+        self.ucode = self.ucode.reshape(-1)
+        pos = np.searchsorted(self.user_ids, self.codes)
+        known = np.zeros(self.codes.size, dtype=bool)
+        inside = pos < self.user_ids.size
+        known[inside] = self.user_ids[pos[inside]] == self.codes[inside]
+        self.user_pos = np.where(known, pos, -1)
+
+        self.present = self.status == STATUS_PRESENT
+        self.timed = self.present & (self.arrival != NO_TIME)
+
+    def __len__(self) -> int:
+        return self.uid.size
+
+    @property
+    def total_users(self) -> int:
+        return self.user_ids.size
+
+    @classmethod
+    def from_rows(cls, users, records) -> "AttendanceFrame":
+        """Build from (user_id, date, time_in, status) rows, split into columns."""
+        columns = [list(map(itemgetter(i), records)) for i in range(4)]
+        return cls(users, *columns)
+
+    @classmethod
+    def from_objects(cls, users: list, records: list) -> "AttendanceFrame":
+        """Build from ORM objects (or anything with the same attributes)."""
+        return cls(
+            list(map(attrgetter("id", "full_name", "department"), users)),
+            *(list(map(attrgetter(name), records)) for name in ("user_id", "date", "time_in", "status")),
+        )
+
+    @classmethod
+    def load(cls, db: Session, start_date, end_date=None) -> "AttendanceFrame":
+        """All users plus attendance from ``start_date`` (to ``end_date``), selecting only the needed columns."""
+        users = db.execute(select(User.id, User.full_name, User.department)).all()
+        stmt = select(Attendance.user_id, Attendance.date, Attendance.time_in, Attendance.status).where(
+            Attendance.date >= start_date
+        )
+        if end_date is not None:
+            stmt = stmt.where(Attendance.date <= end_date)
+        records = db.execute(stmt.order_by(Attendance.id)).all()
+        return cls.from_rows(users, records)
+
+    def present_users(self, mask=None) -> int:
+        """Distinct users with a present record (optionally within ``mask``)."""
+        rows = self.present if mask is None else self.present & mask
+        return _distinct(self.ucode[rows]).size
+
+    def last_index(self):
+        """Index of each user code's last record (``first`` holds the first)."""
+        _, from_end = np.unique(self.ucode[::-1], return_index=True)
+        return self.uid.size - 1 - from_end
+
+
+def live_stats(frame: AttendanceFrame) -> dict:
+    """Today's snapshot."""
+    today = frame.day == now_local().date().toordinal()
+    present = frame.present_users(today)
+    arrivals = frame.arrival[frame.timed & today]
+    on_time = int(np.count_nonzero(arrivals <= WORK_START_US))
+    late = arrivals.size - on_time
+    total = frame.total_users
+
+    secs = arrivals // _US
+    peak = "N/A"
+    if secs.size:
+        hours = secs // 3600
+        # Most common hour; ties go to the hour seen first (Counter.most_common).
+        seen, first = np.unique(hours, return_index=True)
+        counts = np.bincount(hours)[seen]
+        tied = counts == counts.max()
+        peak = _format_hour(int(seen[tied][np.argmin(first[tied])]))
+
+    return {
+        "totalEmployees": total,
+        "currentlyPresent": present,
+        "onTimeToday": on_time,
+        "lateToday": late,
+        "absentToday": max(0, total - present),
+        "attendanceRate": round(present / total * 100, 1) if total else 0,
+        "punctualityRate": round(on_time / present * 100, 1) if present else 0,
+        "averageArrival": _format_seconds(int(secs.sum()) / secs.size) if secs.size else "N/A",
+        "peakHour": peak,
+    }
+
+
+def department_breakdown(frame: AttendanceFrame) -> list:
+    """Per-department present/total for today."""
+    today = frame.present & (frame.day == now_local().date().toordinal())
+    user_present = np.isin(frame.user_ids, frame.uid[today])
+    k = frame.dept_names.size
+    totals = np.bincount(frame.dept_index, minlength=k)
+    present = np.bincount(frame.dept_index[user_present], minlength=k)
+
+    return [
+        {
+            "name": str(name),
+            "present": p,
+            "total": t,
+            "attendanceRate": round(p / t * 100, 1) if t else 0,
+        }
+        for name, p, t in zip(frame.dept_names, present.tolist(), totals.tolist())
+    ]
+
+
+def _present_pairs(frame: AttendanceFrame, mask):
+    """Date ordinals of the distinct (user, date) present pairs within ``mask``."""
+    width = max(frame.codes.size, 1)
+    rows = frame.present & mask
+    return _distinct(frame.day[rows] * width + frame.ucode[rows]) // width
+
+
+def daily_trends(frame: AttendanceFrame, start_date, end_date, total_users: int) -> list:
+    """Per-day attendance % and on-time % across the period."""
+    start, ndays = start_date.toordinal(), (end_date - start_date).days + 1
+    if ndays <= 0:
+        return []
+    in_range = (frame.day >= start) & (frame.day < start + ndays)
+    present = np.bincount(_present_pairs(frame, in_range) - start, minlength=ndays).tolist()
+    punctual = in_range & frame.timed & (frame.arrival <= WORK_START_US)
+    on_time = np.bincount(frame.day[punctual] - start, minlength=ndays).tolist()
+
+    out = []
+    for i in range(ndays):
+        out.append({
+            "date": (start_date + timedelta(days=i)).strftime("%b %d"),
+            "attendance": round(present[i] / total_users * 100, 1) if total_users else 0,
+            "onTime": round(on_time[i] / present[i] * 100, 1) if present[i] else 0,
+        })
+    return out
+
+
+def weekly_patterns(frame: AttendanceFrame, start_date, end_date, total_users: int) -> list:
+    """Average attendance % and late-arrival counts by weekday over the period."""
+    days = np.arange(start_date.toordinal(), end_date.toordinal() + 1)
+    occurrences = np.bincount(_weekday(days), minlength=7).tolist()
+
+    everything = np.ones(len(frame), dtype=bool)
+    present = np.bincount(_weekday(_present_pairs(frame, everything)), minlength=7).tolist()
+    late_rows = frame.timed & (frame.arrival > WORK_START_US)
+    late = np.bincount(_weekday(frame.day[late_rows]), minlength=7).tolist()
+
+    out = []
+    for i, name in enumerate(WEEKDAY_NAMES):
+        denom = total_users * occurrences[i]
+        out.append({
+            "name": name,
+            "attendance": round(present[i] / denom * 100, 1) if denom else 0,
+            "lateArrivals": late[i],
+        })
+    return out
+
+
+def _streaks(frame: AttendanceFrame):
+    """(present days, current streak) per user code, via run-length encoding.
+
+    Distinct present (user, day) pairs are sorted by user then day; a run
+    breaks where the user changes or days are not consecutive. A user's
+    current streak is the length of the run holding their last present day.
+    """
+    k = frame.codes.size
+    days = frame.day[frame.present]
+    if not days.size:
+        return np.zeros(k, dtype=np.int64), np.zeros(k, dtype=np.int64)
+
+    lo = int(days.min())
+    span = int(days.max()) - lo + 1
+    keys = _distinct(frame.ucode[frame.present] * span + (days - lo))
+    user, day = keys // span, keys % span
+
+    same_user = user[1:] == user[:-1]
+    breaks = np.ones(keys.size, dtype=bool)
+    breaks[1:] = ~same_user | (day[1:] - day[:-1] != 1)
+    run = np.cumsum(breaks) - 1
+    run_length = np.bincount(run)
+
+    last = np.ones(keys.size, dtype=bool)
+    last[:-1] = ~same_user
+    streak = np.zeros(k, dtype=np.int64)
+    streak[user[last]] = run_length[run[last]]
+    return np.bincount(user, minlength=k), streak
+
+
+def _rates(numerator, denominator):
+    """round(n / d * 100, 1) exactly as the reference computes it, per distinct pair."""
+    pairs, inverse = np.unique(np.stack([numerator, denominator]), axis=1, return_inverse=True)
+    rounded = np.array([round(n / d * 100, 1) for n, d in pairs.T.tolist()], dtype=float)
+    return rounded[inverse.reshape(-1)]
+
+
+def user_performance(frame: AttendanceFrame) -> list:
+    """Top users by attendance % over the period (with real current streak)."""
+    k = frame.codes.size
+    if not k:
+        return []
+    total = np.bincount(frame.ucode, minlength=k)
+    present_days, streak = _streaks(frame)
+    attendance = _rates(present_days, total)
+
+    # Highest attendance, then streak; ties keep first-seen order like the stable sort.
+    known = np.flatnonzero(frame.user_pos >= 0)
+    order = np.lexsort((frame.first[known], -streak[known], -attendance[known]))
+    out = []
+    for code in known[order[:5]].tolist():
+        pos = frame.user_pos[code]
+        out.append({
+            "name": frame.names[pos],
+            "department": str(frame.dept_names[frame.dept_index[pos]]),
+            "attendance": float(attendance[code]),
+            "presentDays": int(present_days[code]),
+            "streak": int(streak[code]),
+        })
+    return out
+
+
+def detect_anomalies(frame: AttendanceFrame) -> list:
+    """Flag users whose attendance rate over the period is below 60%."""
+    k = frame.codes.size
+    if not k:
+        return []
+    total = np.bincount(frame.ucode, minlength=k)
+    present = np.bincount(frame.ucode[frame.present], minlength=k)
+    last = frame.last_index()
+
+    flagged = np.flatnonzero((frame.user_pos >= 0) & (total > 5) & (present / total < 0.6))
+    out = []
+    for code in flagged[np.argsort(frame.first[flagged], kind="stable")].tolist():
+        out.append({
+            "type": "low_attendance",
+            "user": frame.names[frame.user_pos[code]],
+            "description": f"Attendance rate below 60% ({present[code]}/{total[code]} days)",
+            "severity": "high",
+            "date": date.fromordinal(int(frame.day[last[code]])).strftime("%b %d"),
+        })
+    return out
+
+
+def recommendations(frame: AttendanceFrame) -> list:
+    """Actionable recommendations derived from real attendance/punctuality."""
+    out = []
+    rate = frame.present_users() / max(frame.total_users, 1) * 100
+    if rate < 80:
+        out.append({
+            "type": "attendance",
+            "priority": "high",
+            "title": "Low Overall Attendance",
+            "description": f"Attendance rate is {rate:.1f}%. Consider attendance incentives.",
+        })
+
+    present = int(np.count_nonzero(frame.present))
+    late = int(np.count_nonzero(frame.timed & (frame.arrival > LATE_CUTOFF_US)))
+    if present and late > present * 0.3:
+        out.append({
+            "type": "punctuality",
+            "priority": "medium",
+            "title": "Punctuality Issues",
+            "description": f"{late} late arrivals detected. Consider flexible timing.",
+        })
+    return out
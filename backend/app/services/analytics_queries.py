@@ -0,0 +1,341 @@
+"""
+Dashboard aggregates computed in the database.
+
+Same definitions and output as the Python reference implementations in
+``app.services.analytics``, but every figure comes from GROUP BY queries that
+return only aggregates (one row per day / department), so request cost no
+longer grows with the number of attendance rows or users loaded into Python.
+
+Trends and weekday patterns read the incrementally maintained
+``attendance_daily_summary`` table rather than raw attendance, grouped into
+day / week / month buckets in SQL.
+
+Works on SQLite and PostgreSQL; dialect-specific SQL lives in ``app.db.sql``.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import Integer, and_, case, cast, distinct, extract, func, select
+from sqlalchemy.orm import Session
+
+from app.core.time_utils import now_local
+from app.db.sql import date_bucket, day_number, time_seconds, weekday
+from app.models import Attendance, AttendanceDailySummary, User
+from app.services.analytics import WORK_START, _format_hour, _format_seconds
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def _department_label():
+    return func.coalesce(func.nullif(User.department, ""), "Unassigned")
+
+
+def _present_on(day):
+    return (Attendance.date == day) & (Attendance.status == "present")
+
+
+def user_count(db: Session) -> int:
+    return db.scalar(select(func.count(User.id)))
+
+
+def live_stats(db: Session) -> dict:
+    """Today's snapshot, in a single aggregate query."""
+    today = now_local().date()
+
+    # Most common arrival hour; ties go to the hour seen first (lowest id),
+    # matching Counter.most_common over records in id order.
+    hour = cast(extract("hour", Attendance.time_in), Integer)
+    peak = (
+        select(hour)
+        .where(_present_on(today), Attendance.time_in.isnot(None))
+        .group_by(hour)
+        .order_by(func.count().desc(), func.min(Attendance.id))
+        .limit(1)
+        .correlate(None)
+        .scalar_subquery()
+    )
+    total_users = select(func.count(User.id)).scalar_subquery()
+
+    total, present, arrivals, on_time, late, arrival_secs, peak = db.execute(
+        select(
+            total_users,
+            func.count(distinct(Attendance.user_id)),
+            func.count(Attendance.time_in),
+            func.coalesce(func.sum(case((Attendance.time_in <= WORK_START, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Attendance.time_in > WORK_START, 1), else_=0)), 0),
+            func.sum(time_seconds(db, Attendance.time_in)),
+            peak,
+        ).where(_present_on(today))
+    ).one()
+
+    return {
+        "totalEmployees": total,
+        "currentlyPresent": present,
+        "onTimeToday": int(on_time),
+        "lateToday": int(late),
+        "absentToday": max(0, total - present),
+        "attendanceRate": round(present / total * 100, 1) if total else 0,
+        "punctualityRate": round(on_time / present * 100, 1) if present else 0,
+        "averageArrival": _format_seconds(float(arrival_secs) / arrivals) if arrivals else "N/A",
+        "peakHour": _format_hour(int(peak)) if peak is not None else "N/A",
+    }
+
+
+def department_breakdown(db: Session) -> list:
+    """Per-department present/total for today."""
+    today = now_local().date()
+    present_today = (
+        select(Attendance.user_id).where(_present_on(today)).distinct().subquery()
+    )
+    dept = _department_label()
+    rows = db.execute(
+        select(dept, func.count(User.id), func.count(present_today.c.user_id))
+        .select_from(User)
+        .outerjoin(present_today, present_today.c.user_id == User.id)
+        .group_by(dept)
+    ).all()
+
+    return [
+        {
+            "name": name,
+            "present": present,
+            "total": total,
+            "attendanceRate": round(present / total * 100, 1) if total else 0,
+        }
+        for name, total, present in sorted(rows)
+    ]
+
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def bucket_start(day, granularity: str):
+    """Python twin of ``app.db.sql.date_bucket``."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start, granularity: str):
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _bucket_label(start, granularity: str) -> str:
+    return start.strftime("%b %Y" if granularity == "month" else "%b %d")
+
+
+def trends(db: Session, start_date, end_date, total_users: int, granularity: str = "day") -> list:
+    """Attendance % and on-time % per day, week or month of [start_date, end_date].
+
+    Grouped in SQL over the daily summary, so both the query result and the
+    response have one row per bucket. A bucket's attendance % averages over
+    its days that fall inside the range.
+    """
+    summary = AttendanceDailySummary
+    bucket = date_bucket(db, summary.date, granularity)
+    rows = db.execute(
+        select(bucket, func.sum(summary.present_count), func.sum(summary.on_time_count))
+        .where(summary.date >= start_date, summary.date <= end_date)
+        .group_by(bucket)
+    ).all()
+    by_bucket = {start: (int(present), int(on_time)) for start, present, on_time in rows}
+
+    out = []
+    start = bucket_start(start_date, granularity)
+    while start <= end_date:
+        following = _next_bucket(start, granularity)
+        days = (min(following - timedelta(days=1), end_date) - max(start, start_date)).days + 1
+        present, on_time = by_bucket.get(start, (0, 0))
+        denom = total_users * days
+        out.append({
+            "date": _bucket_label(start, granularity),
+            "attendance": round(present / denom * 100, 1) if denom else 0,
+            "onTime": round(on_time / present * 100, 1) if present else 0,
+        })
+        start = following
+    return out
+
+
+def daily_trends(db: Session, start_date, end_date, total_users: int) -> list:
+    """Per-day attendance % and on-time % across the period."""
+    return trends(db, start_date, end_date, total_users, "day")
+
+
+def _weekday_occurrences(start_date, end_date) -> list:
+    """How many times each weekday (Monday=0) occurs in [start_date, end_date]."""
+    days = (end_date - start_date).days + 1
+    if days <= 0:
+        return [0] * 7
+    full_weeks, extra = divmod(days, 7)
+    first = start_date.weekday()
+    return [full_weeks + (1 if (i - first) % 7 < extra else 0) for i in range(7)]
+
+
+def weekly_patterns(db: Session, start_date, end_date, total_users: int) -> list:
+    """Average attendance % and late-arrival counts by weekday over the period."""
+    occurrences = _weekday_occurrences(start_date, end_date)
+
+    summary = AttendanceDailySummary
+    wd = weekday(db, summary.date)
+    rows = db.execute(
+        select(wd, func.sum(summary.present_count), func.sum(summary.late_count))
+        .where(summary.date >= start_date, summary.date <= end_date)
+        .group_by(wd)
+    ).all()
+    present_pairs = defaultdict(int)  # weekday -> distinct (user, date) pairs
+    late_counts = defaultdict(int)
+    for day, present, late in rows:
+        present_pairs[int(day)] = int(present)
+        late_counts[int(day)] = int(late)
+
+    out = []
+    for i, name in enumerate(WEEKDAY_NAMES):
+        denom = total_users * occurrences[i]
+        out.append({
+            "name": name,
+            "attendance": round(present_pairs[i] / denom * 100, 1) if denom else 0,
+            "lateArrivals": late_counts[i],
+        })
+    return out
+
+
+def _user_rates(db: Session, start_date, end_date):
+    """Per user: records, present rows, distinct present days, first and last record id."""
+    present = Attendance.status == "present"
+    return (
+        select(
+            Attendance.user_id,
+            func.count().label("total"),
+            func.sum(case((present, 1), else_=0)).label("present_rows"),
+            func.count(distinct(case((present, Attendance.date)))).label("present_days"),
+            func.min(Attendance.id).label("first_id"),
+            func.max(Attendance.id).label("last_id"),
+        )
+        .where(Attendance.date >= start_date, Attendance.date <= end_date)
+        .group_by(Attendance.user_id)
+        .subquery()
+    )
+
+
+def _current_streaks(db: Session, start_date, end_date):
+    """Per user, the length of the run of consecutive present days ending at their latest one.
+
+    Gaps and islands: over each user's distinct present days in date order,
+    ``day_number - row_number`` is constant within a run of consecutive
+    days and grows across gaps, so it labels the runs (islands); the latest
+    run is the one with the largest label.
+    """
+    days = (
+        select(Attendance.user_id, Attendance.date)
+        .where(
+            Attendance.status == "present",
+            Attendance.date >= start_date,
+            Attendance.date <= end_date,
+        )
+        .distinct()
+        .subquery()
+    )
+    islands = select(
+        days.c.user_id,
+        (
+            day_number(db, days.c.date)
+            - func.row_number().over(partition_by=days.c.user_id, order_by=days.c.date)
+        ).label("island"),
+    ).subquery()
+    runs = (
+        select(
+            islands.c.user_id,
+            func.count().label("length"),
+            func.row_number().over(
+                partition_by=islands.c.user_id, order_by=islands.c.island.desc()
+            ).label("recency"),
+        )
+        .group_by(islands.c.user_id, islands.c.island)
+        .subquery()
+    )
+    return select(runs.c.user_id, runs.c.length).where(runs.c.recency == 1).subquery()
+
+
+def _rounded_tenths(numerator, denominator):
+    """round(n / d * 100, 1) * 10 in integer SQL, rounding half to even.
+
+    Exact on the integers; Python's float round() can land the other way on
+    a few exact .x5 ties (e.g. 23/80), which only affects the order of such
+    ties, never the values returned.
+    """
+    scaled = numerator * 1000
+    floor = scaled // denominator
+    twice_rem = 2 * (scaled - floor * denominator)
+    return floor + case(
+        (twice_rem > denominator, 1),
+        (and_(twice_rem == denominator, floor % 2 == 1), 1),
+        else_=0,
+    )
+
+
+def user_performance(db: Session, start_date, end_date, limit: int = 5) -> list:
+    """Top users by attendance % over the period (with real current streak).
+
+    Ranked in SQL (attendance %, then streak, then first record) so only
+    ``limit`` rows come back.
+    """
+    rates = _user_rates(db, start_date, end_date)
+    streaks = _current_streaks(db, start_date, end_date)
+    streak = func.coalesce(streaks.c.length, 0)
+    rows = db.execute(
+        select(User.full_name, User.department, rates.c.total, rates.c.present_days, streak)
+        .join(rates, rates.c.user_id == User.id)
+        .outerjoin(streaks, streaks.c.user_id == User.id)
+        .order_by(
+            _rounded_tenths(rates.c.present_days, rates.c.total).desc(),
+            streak.desc(),
+            rates.c.first_id,
+        )
+        .limit(limit)
+    ).all()
+
+    return [
+        {
+            "name": name,
+            "department": department or "Unassigned",
+            "attendance": round(present / total * 100, 1) if total else 0,
+            "presentDays": present,
+            "streak": int(streak_days),
+        }
+        for name, department, total, present, streak_days in rows
+    ]
+
+
+def detect_anomalies(db: Session, start_date, end_date) -> list:
+    """Flag users whose attendance rate over the period is below 60%.
+
+    Filtered in SQL, so only flagged users are returned.
+    """
+    rates = _user_rates(db, start_date, end_date)
+    last = Attendance.__table__.alias("last_record")
+    present_rows = func.coalesce(rates.c.present_rows, 0)
+    rows = db.execute(
+        select(User.full_name, present_rows, rates.c.total, last.c.date)
+        .join(rates, rates.c.user_id == User.id)
+        .join(last, last.c.id == rates.c.last_id)
+        .where(rates.c.total > 5, present_rows * 5 < rates.c.total * 3)  # present / total < 0.6
+        .order_by(rates.c.first_id)
+    ).all()
+
+    return [
+        {
+            "type": "low_attendance",
+            "user": name,
+            "description": f"Attendance rate below 60% ({present}/{total} days)",
+            "severity": "high",
+            "date": day.strftime("%b %d"),
+        }
+        for name, present, total, day in rows
+    ]
@@ -0,0 +1,124 @@
+"""
+Per-user, per-year attendance bitmaps.
+
+A year is 366 bits (46 bytes, little-endian): bit ``day_of_year - 1`` is
+set when the user has a row for that day in the ``present`` / ``absent``
+bitmaps, and ``late`` flags present days with a time_in after WORK_START
+(non-leap years never use bit 365). Counts over a year or a month are a
+mask and a popcount; the current streak is a scan for the highest set bit
+and the nearest clear bit below it, so per-user stats never touch the
+attendance rows.
+
+Bitmaps are held as Python ints in memory and stored as bytes in
+``attendance_bitmaps`` (one row per user and year).
+"""
+
+import calendar
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import AttendanceBitmap
+
+YEAR_BITS = 366
+YEAR_BYTES = (YEAR_BITS + 7) // 8
+
+
+def day_bit(day: date) -> int:
+    return day.timetuple().tm_yday - 1
+
+
+def days_in_year(year: int) -> int:
+    return 366 if calendar.isleap(year) else 365
+
+
+def to_bytes(bits: int) -> bytes:
+    return bits.to_bytes(YEAR_BYTES, "little")
+
+
+def from_bytes(data: Optional[bytes]) -> int:
+    return int.from_bytes(data, "little") if data else 0
+
+
+def with_bit(bits: int, index: int, on: bool) -> int:
+    return bits | (1 << index) if on else bits & ~(1 << index)
+
+
+def month_mask(year: int, month: int) -> int:
+    first = day_bit(date(year, month, 1))
+    return ((1 << calendar.monthrange(year, month)[1]) - 1) << first
+
+
+class YearBitmap(NamedTuple):
+    year: int
+    present: int
+    absent: int
+    late: int
+
+    def counts(self, mask: int = -1) -> Dict[str, int]:
+        """Present / absent / late / total days under ``mask`` (default: the whole year)."""
+        present = (self.present & mask).bit_count()
+        absent = (self.absent & mask).bit_count()
+        return {
+            "present": present,
+            "absent": absent,
+            "late": (self.late & mask).bit_count(),
+            "total": ((self.present | self.absent) & mask).bit_count(),
+        }
+
+
+def load(db: Session, user_id: int, year: Optional[int] = None) -> Dict[int, YearBitmap]:
+    """``user_id``'s bitmaps by year (just ``year`` when given)."""
+    stmt = select(
+        AttendanceBitmap.year, AttendanceBitmap.present, AttendanceBitmap.absent, AttendanceBitmap.late
+    ).where(AttendanceBitmap.user_id == user_id)
+    if year is not None:
+        stmt = stmt.where(AttendanceBitmap.year == year)
+    return {
+        y: YearBitmap(y, from_bytes(present), from_bytes(absent), from_bytes(late))
+        for y, present, absent, late in db.execute(stmt)
+    }
+
+
+def period_counts(years: Iterable[YearBitmap], month: Optional[int] = None) -> Dict[str, int]:
+    """Summed ``YearBitmap.counts`` over ``years``, restricted to ``month`` in each when given."""
+    total = {"present": 0, "absent": 0, "late": 0, "total": 0}
+    for bitmap in years:
+        mask = month_mask(bitmap.year, month) if month else -1
+        for key, value in bitmap.counts(mask).items():
+            total[key] += value
+    return total
+
+
+def monthly_counts(bitmap: YearBitmap) -> List[Dict[str, int]]:
+    """``YearBitmap.counts`` for each month of the year, January first."""
+    return [{"month": m, **bitmap.counts(month_mask(bitmap.year, m))} for m in range(1, 13)]
+
+
+def _run_ending_at(bits: int, top: int) -> int:
+    """Length of the run of set bits ending at (and including) bit ``top``."""
+    gaps = ~bits & ((1 << (top + 1)) - 1)
+    return top - (gaps.bit_length() - 1)
+
+
+def current_streak(present_by_year: Dict[int, int]) -> int:
+    """Consecutive present days ending at the latest present day, across year boundaries."""
+    years = [y for y, bits in present_by_year.items() if bits]
+    if not years:
+        return 0
+    year = max(years)
+    bits = present_by_year[year]
+    top = bits.bit_length() - 1
+    streak = 0
+    while True:
+        run = _run_ending_at(bits, top)
+        streak += run
+        if run <= top:  # stopped at a clear bit inside this year
+            return streak
+        year -= 1
+        bits = present_by_year.get(year, 0)
+        top = days_in_year(year) - 1
+        if not (bits >> top) & 1:
+            return streak
@@ -0,0 +1,231 @@
+"""
+Raw attendance export, streamed.
+
+One query joins attendance with the user's name, unique_id and department
+for a date range and is read in fixed-size batches through a server-side
+cursor (``yield_per``), so memory stays flat however long the range is.
+Encoders turn the batch stream into response chunks; the first chunk (the
+CSV header) is sent before the query has returned anything.
+
+The stream reads through the request's ``get_db`` session, after the
+endpoint has returned. That relies on FastAPI (0.104, as pinned) closing
+yield dependencies only once the response has been sent; FastAPI 0.106
+closes them before, and the stream would then need a session of its own.
+
+Columnar formats (one row group / record batch / zip member set per query
+batch):
+
+  * ``parquet`` and ``arrow`` (Arrow IPC stream) need the optional
+    ``pyarrow`` package. Types: date32 ``date``, time64[us] ``time_in``
+    (null when absent), strings for the rest (``department`` nullable).
+  * ``npz`` is always available. Each batch *i* adds members
+    ``<column>/<i:05d>.npy``: ``date`` datetime64[D], ``time_in``
+    timedelta64[us] since midnight (NaT when absent) and unicode arrays for
+    the rest (``""`` for no department). ``read_npz`` concatenates them.
+"""
+
+import csv
+import io
+import zipfile
+import zlib
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Attendance, User
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: Parquet / Arrow IPC export
+    pa = pq = None
+
+BATCH_SIZE = 5000
+
+COLUMNS = ("date", "unique_id", "full_name", "department", "status", "time_in")
+
+Row = Tuple[date, str, str, str, str, object]
+
+
+def record_batches(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    batch_size: Optional[int] = None,
+) -> Iterator[List[Row]]:
+    """Attendance rows in ``[start_date, end_date]`` (date, then id order), ``batch_size`` at a time.
+
+    ``batch_size`` defaults to ``BATCH_SIZE``, read at call time.
+    """
+    stmt = (
+        select(
+            Attendance.date,
+            User.unique_id,
+            User.full_name,
+            User.department,
+            Attendance.status,
+            Attendance.time_in,
+        )
+        .join(User, User.id == Attendance.user_id)
+        .where(Attendance.date >= start_date, Attendance.date <= end_date)
+        .order_by(Attendance.date, Attendance.id)
+        .execution_options(yield_per=batch_size or BATCH_SIZE)
+    )
+    yield from db.execute(stmt).partitions()
+
+
+def csv_stream(batches: Iterator[List[Row]], compress: bool = False) -> Iterator[bytes]:
+    """CSV (optionally gzip) chunks: the header first, then one chunk per batch.
+
+    Gzip output is sync-flushed after every chunk so clients can decompress
+    it as it arrives.
+    """
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return gz.compress(data) + gz.flush(zlib.Z_SYNC_FLUSH) if gz else data
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    yield encode(buf.getvalue())
+
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(
+            (day.isoformat(), unique_id, name, department or "", status, time_in.isoformat() if time_in else "")
+            for day, unique_id, name, department, status, time_in in batch
+        )
+        yield encode(buf.getvalue())
+
+    if gz:
+        yield gz.flush(zlib.Z_FINISH)
+
+
+# ── Columnar formats ────────────────────────────────────────────────────────
+
+COLUMNAR_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "npz": ("application/octet-stream", "npz"),
+}
+
+
+def available_formats() -> List[str]:
+    return [f for f in COLUMNAR_FORMATS if pa is not None or f == "npz"]
+
+
+def best_columnar_format() -> str:
+    return "parquet" if pa is not None else "npz"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable file that hands written bytes back in chunks."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema():
+    return pa.schema([
+        ("date", pa.date32()),
+        ("unique_id", pa.string()),
+        ("full_name", pa.string()),
+        ("department", pa.string()),
+        ("status", pa.string()),
+        ("time_in", pa.time64("us")),
+    ])
+
+
+def _arrow_batch(batch: List[Row], schema):
+    columns = zip(*batch)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, field.type) for values, field in zip(columns, schema)], schema=schema
+    )
+
+
+def _numpy_batch(batch: List[Row]) -> Dict[str, np.ndarray]:
+    days, unique_ids, names, departments, statuses, times = zip(*batch)
+    micros = [
+        ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond if t else -1
+        for t in times
+    ]
+    time_in = np.array(micros, dtype="m8[us]")
+    time_in[np.array(micros) < 0] = np.timedelta64("NaT")
+    return {
+        "date": np.array(days, dtype="M8[D]"),
+        "unique_id": np.array(unique_ids, dtype=str),
+        "full_name": np.array(names, dtype=str),
+        "department": np.array([d or "" for d in departments], dtype=str),
+        "status": np.array(statuses, dtype=str),
+        "time_in": time_in,
+    }
+
+
+def columnar_stream(batches: Iterator[List[Row]], fmt: str) -> Iterator[bytes]:
+    """``fmt`` ("parquet", "arrow" or "npz") chunks, one per query batch plus the trailer."""
+    if fmt != "npz" and pa is None:
+        raise ValueError(f"{fmt} export requires pyarrow")
+    sink = _ChunkSink()
+
+    if fmt == "npz":
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            for i, batch in enumerate(batches):
+                for name, values in _numpy_batch(batch).items():
+                    with archive.open(f"{name}/{i:05d}.npy", "w") as member:
+                        np.lib.format.write_array(member, values, allow_pickle=False)
+                yield sink.drain()
+        yield sink.drain()
+        return
+
+    schema = _arrow_schema()
+    out = pa.PythonFile(sink, mode="w")
+    writer = pq.ParquetWriter(out, schema) if fmt == "parquet" else pa.ipc.new_stream(out, schema)
+    try:
+        for batch in batches:
+            record_batch = _arrow_batch(batch, schema)
+            if fmt == "parquet":
+                writer.write_table(pa.Table.from_batches([record_batch]))  # one row group per batch
+            else:
+                writer.write_batch(record_batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+_NPZ_EMPTY = {"date": "M8[D]", "time_in": "m8[us]"}
+
+
+def read_npz(file) -> Dict[str, np.ndarray]:
+    """Load an ``npz`` export back into one array per column."""
+    with np.load(file, allow_pickle=False) as archive:
+        members = sorted(archive.files)
+        out = {}
+        for column in COLUMNS:
+            parts = [archive[m] for m in members if m.startswith(column + "/")]
+            out[column] = np.concatenate(parts) if parts else np.array([], dtype=_NPZ_EMPTY.get(column, str))
+        return out
@@ -0,0 +1,293 @@
+"""
+Bookkeeping that must accompany every attendance write.
+
+Each write path (kiosk mark, admin mark-absent / edit / bulk edit / mark
+present, user deletion) describes what it changed as ``AttendanceChange``
+tuples and calls ``record_changes`` before committing, so the derived
+``attendance_daily_summary`` rows and per-user ``attendance_bitmaps`` move in
+the same transaction as the attendance rows themselves, and the analytics
+cache is invalidated when that transaction commits.
+
+Single-row marks go through ``upsert_attendance``: one ``INSERT ... ON
+CONFLICT (user_id, date)`` statement against the unique
+``ix_attendance_user_id_date`` index, so concurrent marks of the same user
+cannot both insert.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import (
+    Date,
+    DateTime,
+    bindparam,
+    case,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    null,
+    select,
+    update,
+)
+
+from app.db.sql import insert_for, time_seconds, upsert_inserted
+from app.models import Attendance, AttendanceBitmap, AttendanceDailySummary, User
+from app.services import attendance_bitmaps as bitmaps
+from app.services.analytics import WORK_START
+from app.services.analytics_cache import mark_changed
+
+_COUNTERS = ("present_count", "absent_count", "on_time_count", "late_count", "arrival_seconds")
+
+_BITMAPS = ("present", "absent", "late")
+_KEY_CHUNK = 500
+
+
+class AttendanceChange(NamedTuple):
+    """One attendance row going from (old_status, old_time) to (new_status, new_time).
+
+    A status of ``None`` means "no row" (insert when old, delete when new).
+    """
+
+    day: date
+    user_id: int
+    department: Optional[str]
+    old_status: Optional[str]
+    old_time: Optional[time]
+    new_status: Optional[str]
+    new_time: Optional[time]
+
+
+def department_label(department: Optional[str]) -> str:
+    return department or "Unassigned"
+
+
+def _contribution(status: Optional[str], time_in: Optional[time]) -> Tuple[int, int, int, int, int]:
+    """(present, absent, on_time, late, arrival_seconds) contributed by one row."""
+    if status == "present":
+        if time_in is None:
+            return 1, 0, 0, 0, 0
+        secs = time_in.hour * 3600 + time_in.minute * 60 + time_in.second
+        on_time = time_in <= WORK_START
+        return 1, 0, int(on_time), int(not on_time), secs
+    if status == "absent":
+        return 0, 1, 0, 0, 0
+    return 0, 0, 0, 0, 0
+
+
+def _is_late(status: Optional[str], time_in: Optional[time]) -> bool:
+    return status == "present" and time_in is not None and time_in > WORK_START
+
+
+def record_changes(db, changes: Iterable[AttendanceChange]) -> None:
+    """Apply the summary deltas (one upsert per touched day/department) and bitmap updates for ``changes``."""
+    mark_changed(db)
+    changes = list(changes)
+    _update_bitmaps(db, changes)
+    deltas: Dict[Tuple[date, str], list] = defaultdict(lambda: [0] * len(_COUNTERS))
+    for change in changes:
+        new = _contribution(change.new_status, change.new_time)
+        old = _contribution(change.old_status, change.old_time)
+        acc = deltas[(change.day, department_label(change.department))]
+        for i in range(len(_COUNTERS)):
+            acc[i] += new[i] - old[i]
+
+    rows = [
+        {"date": day, "department": dept, **dict(zip(_COUNTERS, acc))}
+        for (day, dept), acc in deltas.items()
+        if any(acc)
+    ]
+    if not rows:
+        return
+
+    table = AttendanceDailySummary.__table__
+    stmt = insert_for(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.date, table.c.department],
+        set_={name: table.c[name] + stmt.excluded[name] for name in _COUNTERS},
+    )
+    db.execute(stmt, rows)
+
+
+def record_change(db, user: User, day: date, old_status=None, old_time=None, new_status=None, new_time=None) -> None:
+    """Convenience wrapper for a single row of ``user``."""
+    record_changes(db, [AttendanceChange(day, user.id, user.department, old_status, old_time, new_status, new_time)])
+
+
+def _lock_bitmaps(db, keys: List[Tuple[int, int]]) -> Dict[Tuple[int, int], object]:
+    """The existing bitmap rows for ``keys`` ((user_id, year) pairs), locked FOR UPDATE."""
+    table = AttendanceBitmap.__table__
+    user_ids = sorted({user_id for user_id, _ in keys})
+    years = sorted({year for _, year in keys})
+    rows = {}
+    for i in range(0, len(user_ids), _KEY_CHUNK):
+        stmt = (
+            select(table)
+            .where(table.c.user_id.in_(user_ids[i:i + _KEY_CHUNK]), table.c.year.in_(years))
+            .with_for_update()
+        )
+        for row in db.execute(stmt):
+            rows[(row.user_id, row.year)] = row
+    return rows
+
+
+def _update_bitmaps(db, changes: List[AttendanceChange]) -> None:
+    """Set each changed day's bits to its new status (read-modify-write per user and year)."""
+    final: Dict[Tuple[int, int], Dict[int, Tuple[Optional[str], Optional[time]]]] = defaultdict(dict)
+    for change in changes:
+        final[(change.user_id, change.day.year)][bitmaps.day_bit(change.day)] = (change.new_status, change.new_time)
+    if not final:
+        return
+
+    table = AttendanceBitmap.__table__
+    existing = _lock_bitmaps(db, list(final))
+    missing = [key for key in final if key not in existing]
+    if missing:
+        # Create the missing (user, year) rows empty, tolerating a concurrent
+        # writer that creates them first, then lock and read them like the rest
+        # so neither writer's bits are lost.
+        empty = dict.fromkeys(_BITMAPS, bitmaps.to_bytes(0))
+        stmt = insert_for(db)(table).on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.year])
+        db.execute(stmt, [{"user_id": user_id, "year": year, **empty} for user_id, year in missing])
+        existing.update(_lock_bitmaps(db, missing))
+
+    updates = []
+    for (user_id, year), days in final.items():
+        row = existing[(user_id, year)]
+        present, absent, late = (bitmaps.from_bytes(getattr(row, name)) for name in _BITMAPS)
+        for bit, (status, time_in) in days.items():
+            present = bitmaps.with_bit(present, bit, status == "present")
+            absent = bitmaps.with_bit(absent, bit, status == "absent")
+            late = bitmaps.with_bit(late, bit, _is_late(status, time_in))
+        values = dict(zip(_BITMAPS, map(bitmaps.to_bytes, (present, absent, late))))
+        updates.append({"b_user_id": user_id, "b_year": year, **{f"b_{k}": v for k, v in values.items()}})
+
+    stmt = (
+        update(table)
+        .where(table.c.user_id == bindparam("b_user_id"), table.c.year == bindparam("b_year"))
+        .values({name: bindparam(f"b_{name}") for name in _BITMAPS})
+    )
+    db.execute(stmt, updates)
+
+
+def upsert_attendance(
+    db, user_id: int, day: date, status: str, time_in: Optional[time], replace_status: Optional[str] = None,
+) -> Tuple[Optional[Attendance], bool]:
+    """Insert the user's row for ``day`` or overwrite the existing one, in one statement.
+
+    With ``replace_status`` an existing row is only overwritten when it has
+    that status. Returns ``(attendance, inserted)``; ``attendance`` is None
+    when an existing row was left alone. Callers still ``record_change``.
+    """
+    table = Attendance.__table__
+    inserted = upsert_inserted(db)
+    if inserted is None:
+        # SQLite: no RETURNING flag, but writers are serialized, so whether the
+        # row existed just before the upsert decides it.
+        existed = db.execute(
+            select(table.c.id).where(table.c.user_id == user_id, table.c.date == day)
+        ).first() is not None
+    stmt = insert_for(db)(Attendance).values(
+        user_id=user_id, date=day, time_in=time_in, status=status, created_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.date],
+        set_={"status": stmt.excluded.status, "time_in": stmt.excluded.time_in},
+        where=(table.c.status == replace_status) if replace_status else None,
+    )
+    if inserted is None:
+        stmt = stmt.returning(Attendance)
+    else:
+        stmt = stmt.returning(Attendance, inserted)
+    row = db.execute(stmt.execution_options(populate_existing=True)).first()
+    if row is None:
+        return None, False
+    return row[0], (not existed) if inserted is None else row.inserted
+
+
+def mark_absent(db, day: date) -> int:
+    """Add an "absent" row for ``day`` for every active user without one; returns how many.
+
+    A single ``INSERT INTO attendance SELECT ... WHERE NOT EXISTS`` (with ``ON
+    CONFLICT DO NOTHING`` for users marked concurrently). The returned user
+    ids drive the summary and bitmap bookkeeping.
+    """
+    unmarked = (
+        select(User.id, literal(day, Date), literal("absent"), null(), literal(datetime.utcnow(), DateTime))
+        .where(
+            User.is_active == True,  # noqa: E712
+            ~exists().where(Attendance.user_id == User.id, Attendance.date == day),
+        )
+    )
+    table = Attendance.__table__
+    stmt = (
+        insert_for(db)(table)
+        .from_select(["user_id", "date", "status", "time_in", "created_at"], unmarked)
+        .on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.date])
+        .returning(table.c.user_id)
+    )
+    inserted = db.scalars(stmt).all()
+
+    departments = {}
+    for i in range(0, len(inserted), _KEY_CHUNK):
+        chunk = inserted[i:i + _KEY_CHUNK]
+        departments.update(db.execute(select(User.id, User.department).where(User.id.in_(chunk))).all())
+    record_changes(db, [
+        AttendanceChange(day, user_id, departments.get(user_id), None, None, "absent", None) for user_id in inserted
+    ])
+    return len(inserted)
+
+
+def rebuild_daily_summary(db) -> int:
+    """Recompute ``attendance_daily_summary`` from attendance; returns rows written."""
+    present = Attendance.status == "present"
+    arrived = present & Attendance.time_in.isnot(None)
+    dept = func.coalesce(func.nullif(User.department, ""), "Unassigned")
+
+    source = (
+        select(
+            Attendance.date,
+            dept,
+            func.sum(case((present, 1), else_=0)),
+            func.sum(case((Attendance.status == "absent", 1), else_=0)),
+            func.sum(case((arrived & (Attendance.time_in <= WORK_START), 1), else_=0)),
+            func.sum(case((arrived & (Attendance.time_in > WORK_START), 1), else_=0)),
+            func.coalesce(func.sum(case((arrived, time_seconds(db, Attendance.time_in)), else_=0)), 0),
+        )
+        .join(User, User.id == Attendance.user_id)
+        .group_by(Attendance.date, dept)
+    )
+
+    db.execute(delete(AttendanceDailySummary))
+    result = db.execute(
+        insert(AttendanceDailySummary).from_select(["date", "department", *_COUNTERS], source)
+    )
+    return result.rowcount
+
+
+def rebuild_attendance_bitmaps(db, batch_size: int = 5000) -> int:
+    """Recompute ``attendance_bitmaps`` from attendance; returns rows written."""
+    built: Dict[Tuple[int, int], List[int]] = defaultdict(lambda: [0, 0, 0])
+    stmt = select(Attendance.user_id, Attendance.date, Attendance.status, Attendance.time_in).execution_options(
+        yield_per=batch_size
+    )
+    for user_id, day, status, time_in in db.execute(stmt):
+        bit = 1 << bitmaps.day_bit(day)
+        acc = built[(user_id, day.year)]
+        if status == "present":
+            acc[0] |= bit
+        elif status == "absent":
+            acc[1] |= bit
+        if _is_late(status, time_in):
+            acc[2] |= bit
+
+    db.execute(delete(AttendanceBitmap))
+    rows = [
+        {"user_id": user_id, "year": year, **dict(zip(_BITMAPS, map(bitmaps.to_bytes, acc)))}
+        for (user_id, year), acc in built.items()
+    ]
+    for i in range(0, len(rows), batch_size):
+        db.execute(insert(AttendanceBitmap), rows[i:i + batch_size])
+    return len(rows)
@@ -2,27 +2,107 @@
 Advanced, DB-backed face recognition service.
 
 Uses InsightFace (SCRFD detector + ArcFace w600k_r50 512-d embeddings, ONNX /
-onnxruntime, CPU-capable) for detection and recognition.
-
-Persistence: embeddings and face images live in the database (FaceEmbedding /
-FaceImage), not on disk — so the backend is stateless and recognition data
-survives restarts and redeploys. Matching stores ALL per-image embeddings per
-user (no averaging) and uses cosine similarity with per-user best-match plus
-k-NN voting and a tuned threshold, returning a real confidence score.
+onnxruntime, CPU-capable) for detection and recognition. The models run behind
+a pluggable ``InferenceBackend`` (in-process by default, or a local pool of
+inference processes — see ``app.services.inference``).
+
+Persistence: embeddings and face image metadata live in the database
+(FaceEmbedding / FaceImage), image bytes in the configured image store (the
+database by default, see ``app.services.image_store``) — so the backend is
+stateless and recognition data survives restarts and redeploys. Matching
+stores ALL per-image embeddings per user (no averaging) and uses cosine
+similarity with per-user best-match plus k-NN voting and a tuned threshold,
+returning a real confidence score.
 """
 
 import logging
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import cv2
 import numpy as np
-from sqlalchemy import func
+from sqlalchemy import bindparam, func, select, update
 
+from app.core import metrics, timing
 from app.core.config import settings
+from app.services.inference import CHIP_SHAPE, InferenceBackend, align_chip, create_backend
 
 logger = logging.getLogger("smart_attendance.face")
 
+GALLERY_EMBEDDINGS = metrics.gauge("face_gallery_embeddings", "Embeddings held in the recognition gallery cache.")
+GALLERY_USERS = metrics.gauge("face_gallery_users", "Enrolled users held in the recognition gallery cache.")
+GALLERY_VERSION = metrics.gauge("face_gallery_version", "Number of times the gallery cache has been rebuilt.")
+GALLERY_REFRESH = metrics.histogram("face_gallery_refresh_seconds", "Time spent rebuilding the gallery cache.")
+FRAME_RESULTS = metrics.counter(
+    "face_recognition_frames_total", "Recognized frames by result.", ["result"]
+)
+
+
+class Gallery(NamedTuple):
+    """One immutable snapshot of the enrolled embeddings (row i belongs to labels[i])."""
+
+    embeddings: Optional[np.ndarray]  # (M, 512) float32, None when nobody is enrolled
+    labels: Tuple[str, ...]           # user unique_id per row
+    signature: Optional[tuple]        # (row_count, max_updated_at) it was built at
+
+
+_EMPTY_GALLERY = Gallery(None, (), None)
+
+
+# FACE_IMAGE_FORMAT -> (file extension, content type, cv2 quality flag)
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+def _bounded(img: np.ndarray, max_side: int) -> np.ndarray:
+    scale = max_side / max(img.shape[:2])
+    if scale >= 1:
+        return img
+    size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_image(img: np.ndarray, fmt: str = "jpeg", quality: int = 80) -> bytes:
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"FACE_IMAGE_FORMAT must be one of {', '.join(IMAGE_FORMATS)}, got {fmt!r}")
+    ext, _, flag = IMAGE_FORMATS[fmt]
+    ok, buf = cv2.imencode(ext, img, [flag, int(quality)])
+    if not ok:
+        raise ValueError(f"Cannot encode image as {fmt}")
+    return buf.tobytes()
+
+
+def make_thumbnail(image_bytes: bytes, max_side: Optional[int] = None) -> bytes:
+    """JPEG thumbnail of an encoded image, longest side at most ``max_side`` px."""
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Cannot decode image")
+    return encode_image(_bounded(img, max_side or settings.FACE_THUMBNAIL_SIZE))
+
+
+def face_crop(img: np.ndarray, bbox, margin: float) -> np.ndarray:
+    """Square crop centred on ``bbox``, its longer side grown by ``margin`` of it on each side
+    (clipped to the frame)."""
+    x1, y1, x2, y2 = [float(v) for v in bbox[:4]]
+    half = max(x2 - x1, y2 - y1) * (0.5 + margin)
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    h, w = img.shape[:2]
+    left, top = max(0, int(round(cx - half))), max(0, int(round(cy - half)))
+    right, bottom = min(w, int(round(cx + half))), min(h, int(round(cy + half)))
+    return img[top:bottom, left:right]
+
+
+def normalize_face_image(img: np.ndarray, bbox) -> Tuple[bytes, str]:
+    """The stored form of an enrollment image: face crop, bounded and re-encoded
+    per the FACE_IMAGE_* settings. Returns (bytes, content type)."""
+    crop = _bounded(face_crop(img, bbox, settings.FACE_IMAGE_MARGIN), settings.FACE_IMAGE_MAX_SIDE)
+    data = encode_image(crop, settings.FACE_IMAGE_FORMAT, settings.FACE_IMAGE_QUALITY)
+    return data, IMAGE_FORMATS[settings.FACE_IMAGE_FORMAT][1]
+
 
 class FaceRecognitionService:
     def __init__(self):
@@ -43,44 +123,45 @@ class FaceRecognitionService:
         self.min_liveness_confidence = 20
         self.recognition_max_dim = 1024
 
-        self._app = None  # lazily initialized FaceAnalysis
+        self.backend: InferenceBackend = create_backend(
+            settings.FACE_INFERENCE_BACKEND,
+            model_name=self.model_name,
+            det_size=self.det_size,
+            use_gpu=settings.FACE_USE_GPU,
+            workers=settings.FACE_INFERENCE_WORKERS,
+            shm_slots=settings.FACE_INFERENCE_SHM_SLOTS,
+            # _read_image bounds every frame to this, so frames always fit a slot.
+            max_frame_dim=self.recognition_max_dim,
+        )
 
         # In-memory cache of all embeddings, rebuilt when the DB signature changes.
-        self._cache_embeddings = None     # np.ndarray (M, 512) float32
-        self._cache_labels: List[str] = []  # user unique_id per row
-        self._cache_signature = None      # (row_count, max_updated_at)
+        # Recognition runs on several threads at once: the gallery is replaced
+        # whole (under the lock) and each call matches against one snapshot.
+        self._gallery: Gallery = _EMPTY_GALLERY
+        self._gallery_lock = threading.Lock()
 
     # ------------------------------------------------------------------ #
     # Model
     # ------------------------------------------------------------------ #
-    @property
-    def app(self):
-        if self._app is None:
-            from insightface.app import FaceAnalysis
-            if settings.FACE_USE_GPU:
-                providers = ["CUDAExecutionProvider", "CPUExecutionProvider"]
-                ctx_id = 0
-            else:
-                providers = ["CPUExecutionProvider"]
-                ctx_id = -1
-            logger.info(f"Loading InsightFace model pack '{self.model_name}' (GPU={settings.FACE_USE_GPU})...")
-            app = FaceAnalysis(name=self.model_name, providers=providers)
-            app.prepare(ctx_id=ctx_id, det_size=self.det_size)
-            self._app = app
-            logger.info("InsightFace model loaded.")
-        return self._app
+    def _detect_faces(self, img: np.ndarray):
+        return self.backend.detect(img)
+
+    def close(self) -> None:
+        """Release the inference backend (models / worker processes)."""
+        self.backend.close()
 
     def _read_image(self, image_path: str) -> Optional[np.ndarray]:
-        img = cv2.imread(image_path)
-        if img is None:
-            logger.warning(f"Could not read image: {image_path}")
-            return None
-        h, w = img.shape[:2]
-        longest = max(h, w)
-        if longest > self.recognition_max_dim:
-            scale = self.recognition_max_dim / longest
-            img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
-        return img
+        with timing.stage("decode"):
+            img = cv2.imread(image_path)
+            if img is None:
+                logger.warning(f"Could not read image: {image_path}")
+                return None
+            h, w = img.shape[:2]
+            longest = max(h, w)
+            if longest > self.recognition_max_dim:
+                scale = self.recognition_max_dim / longest
+                img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+            return img
 
     @staticmethod
     def _largest_face(faces):
@@ -92,7 +173,7 @@ class FaceRecognitionService:
         img = self._read_image(image_path)
         if img is None:
             return None, None
-        faces = self.app.get(img)
+        faces = self._detect_faces(img)
         return self._largest_face(faces), img
 
     def get_embedding(self, image_path: str) -> Optional[np.ndarray]:
@@ -110,7 +191,7 @@ class FaceRecognitionService:
             if img is None:
                 return self._quality_fail("Could not load image")
 
-            faces = self.app.get(img)
+            faces = self._detect_faces(img)
             if not faces:
                 return self._quality_fail("No face detected", recommendation="Face the camera with good lighting")
 
@@ -209,22 +290,29 @@ class FaceRecognitionService:
     # ------------------------------------------------------------------ #
     def enroll_user(self, db, user, image_paths: List[str]) -> Dict:
         from app.models import FaceEmbedding, FaceImage
+        from app.services import image_store
 
         logger.info(f"Enrolling {user.unique_id} from {len(image_paths)} images using {self.model_name}")
 
-        embeddings, image_blobs, qualities = [], [], []
+        # Images are stored normalized (see normalize_face_image); quality is
+        # measured on the upload, so it is kept as scored.
+        embeddings, images, qualities = [], [], []
         for path in image_paths:
             quality = self.check_image_quality(path)
             if not quality["is_acceptable"]:
                 logger.warning(f"Rejected (quality) {path}: {quality['issues']}")
                 continue
-            emb = self.get_embedding(path)
-            if emb is None:
+            face, img = self._detect_primary_face(path)
+            if face is None:
                 continue
-            with open(path, "rb") as f:
-                image_blobs.append(f.read())
-            embeddings.append(emb)
-            qualities.append(quality["overall_score"])
+            original = None
+            if settings.FACE_STORE_ORIGINAL:
+                with open(path, "rb") as f:
+                    original = f.read()
+            chip = align_chip(img, face.kps).tobytes() if face.kps is not None else None
+            images.append((*normalize_face_image(img, face.bbox), original, chip))
+            embeddings.append(np.asarray(face.normed_embedding, dtype=np.float32))
+            qualities.append(quality)
 
         acceptable = len(embeddings)
         if acceptable < self.min_required_encodings:
@@ -236,6 +324,7 @@ class FaceRecognitionService:
         arr = np.vstack(embeddings).astype(np.float32)
 
         # Replace any existing enrollment for this user.
+        replaced = image_store.referenced_keys(db, [user.id])
         db.query(FaceImage).filter(FaceImage.user_id == user.id).delete()
         db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user.id).delete()
 
@@ -246,13 +335,22 @@ class FaceRecognitionService:
             dim=int(arr.shape[1]),
             model=self.model_name,
         ))
-        for i, (blob, qs) in enumerate(zip(image_blobs, qualities), start=1):
-            db.add(FaceImage(user_id=user.id, position=i, image_data=blob, quality_score=qs))
+        store = image_store.get_store()
+        for i, ((blob, content_type, original, chip), quality) in enumerate(zip(images, qualities), start=1):
+            db.add(FaceImage(
+                user_id=user.id, position=i, sha256=store.put(db, blob), size=len(blob),
+                thumbnail_sha256=store.put(db, make_thumbnail(blob)),
+                original_sha256=store.put(db, original) if original is not None else None,
+                chip_sha256=store.put(db, chip) if chip is not None else None,
+                content_type=content_type,
+                quality_score=quality["overall_score"], quality_details=quality["metrics"],
+            ))
 
         user.face_registered = True
         db.commit()
+        image_store.discard(db, replaced)
 
-        avg_quality = float(np.mean(qualities)) if qualities else 0.0
+        avg_quality = float(np.mean([q["overall_score"] for q in qualities])) if qualities else 0.0
         logger.info(f"Enrolled {user.unique_id} with {acceptable} embeddings (avg quality {avg_quality:.1f})")
 
         return {
@@ -267,106 +365,242 @@ class FaceRecognitionService:
                 "liveness_checked": False,
                 "average_liveness_confidence": None,
                 "model": self.model_name,
+                "stored_image_bytes": sum(len(blob) for blob, _, _, _ in images),
             },
         }
 
+    # ------------------------------------------------------------------ #
+    # Re-encoding (recompute stored embeddings after a model change)
+    # ------------------------------------------------------------------ #
+    def reencode_all(self, db, batch_size: int = 64, backfill: bool = False, users_per_page: int = 100) -> Dict:
+        """Recompute every enrolled user's embeddings with the current recognition
+        model from their stored chips: batched ``backend.embed`` calls, no detection.
+
+        Users with an image that has no chip (enrolled before chips were stored)
+        are skipped; with ``backfill`` the chip is made once from the stored
+        image (one detection per such image) and saved. Commits per page of users.
+        """
+        from app.models import FaceEmbedding, FaceImage
+        from app.services import image_store
+
+        store = image_store.get_store()
+        counts = {"users": 0, "chips": 0, "skipped": 0, "backfilled": 0}
+        last = 0
+        while True:
+            user_ids = db.scalars(
+                select(FaceEmbedding.user_id)
+                .where(FaceEmbedding.user_id > last)
+                .order_by(FaceEmbedding.user_id)
+                .limit(users_per_page)
+            ).all()
+            if not user_ids:
+                return counts
+            last = user_ids[-1]
+            images = select(FaceImage.id, FaceImage.user_id, FaceImage.sha256, FaceImage.chip_sha256).where(
+                FaceImage.user_id.in_(user_ids)
+            ).order_by(FaceImage.user_id, FaceImage.position)
+            rows = db.execute(images).all()
+            if backfill and any(row.chip_sha256 is None for row in rows):
+                counts["backfilled"] += self._backfill_chips(db, store, [r for r in rows if r.chip_sha256 is None])
+                rows = db.execute(images).all()
+
+            keys_by_user: Dict[int, List[Optional[str]]] = {}
+            for row in rows:
+                keys_by_user.setdefault(row.user_id, []).append(row.chip_sha256)
+            chips = store.get_many(db, [key for keys in keys_by_user.values() for key in keys if key])
+            ready = {uid: keys for uid, keys in keys_by_user.items() if all(key in chips for key in keys)}
+            counts["skipped"] += len(user_ids) - len(ready)
+            if not ready:
+                continue
+
+            batch = np.stack([
+                np.frombuffer(chips[key], dtype=np.uint8).reshape(CHIP_SHAPE)
+                for keys in ready.values() for key in keys
+            ])
+            feats = np.concatenate([
+                self.backend.embed(batch[i:i + batch_size]) for i in range(0, len(batch), batch_size)
+            ]).astype(np.float32)
+
+            now, params, offset = datetime.utcnow(), [], 0
+            for uid, keys in ready.items():
+                arr = feats[offset:offset + len(keys)]
+                offset += len(keys)
+                params.append({
+                    "b_user_id": uid, "b_embeddings": arr.tobytes(), "b_count": int(arr.shape[0]), "b_dim": int(arr.shape[1]),
+                })
+            table = FaceEmbedding.__table__
+            db.execute(
+                update(table)
+                .where(table.c.user_id == bindparam("b_user_id"))
+                .values(
+                    embeddings=bindparam("b_embeddings"), count=bindparam("b_count"), dim=bindparam("b_dim"),
+                    model=self.model_name, updated_at=now,
+                ),
+                params,
+            )
+            db.commit()
+            counts["users"] += len(ready)
+            counts["chips"] += len(batch)
+
+    def _backfill_chips(self, db, store, rows) -> int:
+        """Detect, align and store the chip of each stored image in ``rows``; returns chips made."""
+        from app.models import FaceImage
+
+        blobs = store.get_many(db, [row.sha256 for row in rows])
+        made = []
+        for row in rows:
+            data = blobs.get(row.sha256)
+            img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+            if img is None:
+                continue
+            img = _bounded(img, self.recognition_max_dim)
+            face = self._largest_face(self._detect_faces(img))
+            if face is None or face.kps is None:
+                logger.warning(f"Face image {row.id}: no face found; cannot make its chip")
+                continue
+            made.append({"b_id": row.id, "b_chip": store.put(db, align_chip(img, face.kps).tobytes())})
+        if made:
+            table = FaceImage.__table__
+            db.execute(
+                update(table).where(table.c.id == bindparam("b_id")).values(chip_sha256=bindparam("b_chip")),
+                made,
+            )
+            db.commit()
+        return len(made)
+
     # ------------------------------------------------------------------ #
     # Embedding cache (rebuilt from DB when signature changes)
     # ------------------------------------------------------------------ #
-    def _refresh_cache(self, db) -> None:
-        from app.models import FaceEmbedding, User
+    def _gallery_signature(self, db) -> tuple:
+        from app.models import FaceEmbedding
 
-        signature = db.query(
-            func.count(FaceEmbedding.id), func.max(FaceEmbedding.updated_at)
-        ).one()
+        return tuple(db.query(func.count(FaceEmbedding.id), func.max(FaceEmbedding.updated_at)).one())
 
-        if signature == self._cache_signature and self._cache_embeddings is not None:
-            return
+    def _load_gallery(self, db) -> Tuple[Optional[np.ndarray], List[str], int]:
+        """(embeddings, labels, user count) of every enrolled user."""
+        from app.models import FaceEmbedding, User
 
         rows = (
-            db.query(FaceEmbedding, User.unique_id)
+            db.query(FaceEmbedding.embeddings, FaceEmbedding.count, FaceEmbedding.dim, User.unique_id)
             .join(User, FaceEmbedding.user_id == User.id)
             .all()
         )
         mats, labels = [], []
-        for fe, unique_id in rows:
-            arr = np.frombuffer(fe.embeddings, dtype=np.float32).reshape(fe.count, fe.dim)
+        for blob, count, dim, unique_id in rows:
+            arr = np.frombuffer(blob, dtype=np.float32).reshape(count, dim)
             mats.append(arr)
-            labels.extend([unique_id] * fe.count)
-
-        self._cache_embeddings = np.vstack(mats).astype(np.float32) if mats else None
-        self._cache_labels = labels
-        self._cache_signature = signature
+            labels.extend([unique_id] * count)
+        return (np.vstack(mats).astype(np.float32) if mats else None), labels, len(rows)
+
+    def _refresh_cache(self, db) -> Gallery:
+        """The current gallery, rebuilt first if the DB signature changed."""
+        signature = self._gallery_signature(db)
+        gallery = self._gallery
+        if gallery.signature == signature and gallery.embeddings is not None:
+            return gallery
+
+        with self._gallery_lock:
+            gallery = self._gallery  # another thread may have rebuilt it meanwhile
+            if gallery.signature == signature and gallery.embeddings is not None:
+                return gallery
+            started = time.perf_counter()
+            embeddings, labels, users = self._load_gallery(db)
+            gallery = Gallery(embeddings, tuple(labels), signature)
+            self._gallery = gallery
+
+        GALLERY_REFRESH.observe(time.perf_counter() - started)
+        GALLERY_VERSION.inc()
+        GALLERY_EMBEDDINGS.set(len(labels))
+        GALLERY_USERS.set(users)
+        return gallery
 
     def invalidate_cache(self) -> None:
-        self._cache_signature = None
-        self._cache_embeddings = None
-        self._cache_labels = []
+        with self._gallery_lock:
+            self._gallery = _EMPTY_GALLERY
 
     # ------------------------------------------------------------------ #
     # Recognition
     # ------------------------------------------------------------------ #
     def recognize(self, image_path: str, db) -> Optional[Dict]:
+        return self.recognize_frame(image_path, db)[0]
+
+    def recognize_frame(self, image_path: str, db) -> Tuple[Optional[Dict], str]:
+        """Match one frame; returns (result, reason) with reason a FRAME_RESULTS value."""
         try:
             q = self.get_embedding(image_path)
             if q is None:
                 logger.info("No face detected for recognition")
-                return None
+                FRAME_RESULTS.inc(result="no_face")
+                return None, "no_face"
 
-            self._refresh_cache(db)
-            if self._cache_embeddings is None or not self._cache_labels:
+            with timing.stage("gallery"):
+                gallery = self._refresh_cache(db)
+            if gallery.embeddings is None or not gallery.labels:
                 logger.info("No enrolled embeddings available")
-                return None
-
-            sims = self._cache_embeddings @ q
-            labels = self._cache_labels
-
-            best_per_user: Dict[str, float] = {}
-            for sim, lbl in zip(sims, labels):
-                s = float(sim)
-                if lbl not in best_per_user or s > best_per_user[lbl]:
-                    best_per_user[lbl] = s
-
-            top_user = max(best_per_user, key=best_per_user.get)
-            top_sim = best_per_user[top_user]
-
-            # k-NN vote among nearest embeddings; ties broken by best similarity
-            # (favours the highest-confidence user). This guards against a lone
-            # outlier embedding while staying correct on small datasets.
-            from collections import Counter
-
-            k = min(self.knn_k, len(labels))
-            top_idx = np.argsort(-sims)[:k]
-            knn_labels = [labels[i] for i in top_idx]
-            counts = Counter(knn_labels)
-            max_count = max(counts.values())
-            tied = [lbl for lbl, c in counts.items() if c == max_count]
-            vote_winner = max(tied, key=lambda lbl: best_per_user.get(lbl, -1.0))
+                FRAME_RESULTS.inc(result="no_match")
+                return None, "no_match"
+
+            with timing.stage("match"):
+                sims = gallery.embeddings @ q
+                labels = gallery.labels
+
+                best_per_user: Dict[str, float] = {}
+                for sim, lbl in zip(sims, labels):
+                    s = float(sim)
+                    if lbl not in best_per_user or s > best_per_user[lbl]:
+                        best_per_user[lbl] = s
+
+                top_user = max(best_per_user, key=best_per_user.get)
+                top_sim = best_per_user[top_user]
+
+                # k-NN vote among nearest embeddings; ties broken by best similarity
+                # (favours the highest-confidence user). This guards against a lone
+                # outlier embedding while staying correct on small datasets.
+                from collections import Counter
+
+                k = min(self.knn_k, len(labels))
+                top_idx = np.argsort(-sims)[:k]
+                knn_labels = [labels[i] for i in top_idx]
+                counts = Counter(knn_labels)
+                max_count = max(counts.values())
+                tied = [lbl for lbl, c in counts.items() if c == max_count]
+                vote_winner = max(tied, key=lambda lbl: best_per_user.get(lbl, -1.0))
 
             confidence = round(max(0.0, min(1.0, top_sim)) * 100, 1)
 
             if top_sim >= self.match_threshold and vote_winner == top_user:
                 logger.info(f"Recognized {top_user} (sim={top_sim:.3f}, conf={confidence}%)")
-                return {"user_id": top_user, "confidence": confidence, "similarity": round(top_sim, 4)}
+                FRAME_RESULTS.inc(result="match")
+                return {"user_id": top_user, "confidence": confidence, "similarity": round(top_sim, 4)}, "match"
 
             logger.info(f"No confident match (best={top_user} sim={top_sim:.3f})")
-            return None
+            FRAME_RESULTS.inc(result="no_match")
+            return None, "no_match"
         except Exception as e:
             logger.error(f"Recognition failed: {str(e)}")
-            return None
+            return None, "error"
 
     def recognize_face(self, image_path: str, db) -> Optional[str]:
         result = self.recognize(image_path, db)
         return result["user_id"] if result else None
 
-    def recognize_frames(self, image_paths: List[str], db) -> Optional[Dict]:
-        """Recognize across frames; require a strict majority to agree."""
+    def recognize_frames(self, image_paths: List[str], db) -> Dict:
+        """Recognize across frames; require a strict majority to agree.
+
+        On failure ``user_id`` is None and ``reason`` says why: ``no_face`` when
+        no frame contained a face, ``no_match`` otherwise.
+        """
         from collections import Counter
 
-        results = [self.recognize(p, db) for p in image_paths]
-        results = [r for r in results if r]
+        frames = [self.recognize_frame(p, db) for p in image_paths]
+        results = [r for r, _ in frames if r]
         if not results:
-            return None
+            no_face = all(reason == "no_face" for _, reason in frames)
+            return {
+                "user_id": None,
+                "reason": "no_face" if no_face else "no_match",
+                "frames_total": len(image_paths),
+            }
 
         counts = Counter(r["user_id"] for r in results)
         top_user, top_count = counts.most_common(1)[0]
@@ -374,7 +608,7 @@ class FaceRecognitionService:
         majority = len(image_paths) // 2 + 1
         if top_count < majority:
             logger.info(f"No frame agreement (top={top_user} {top_count}/{len(image_paths)})")
-            return None
+            return {"user_id": None, "reason": "no_match", "frames_total": len(image_paths)}
 
         agreeing = [r for r in results if r["user_id"] == top_user]
         best = max(agreeing, key=lambda r: r["confidence"])
@@ -382,6 +616,7 @@ class FaceRecognitionService:
             "user_id": top_user,
             "confidence": best["confidence"],
             "similarity": best["similarity"],
+            "reason": "match",
             "frames_agreed": top_count,
             "frames_total": len(image_paths),
         }
@@ -396,12 +631,12 @@ class FaceRecognitionService:
                 logger.warning("No face detected during duplicate check")
                 return None
 
-            self._refresh_cache(db)
-            if self._cache_embeddings is None or not self._cache_labels:
+            gallery = self._refresh_cache(db)
+            if gallery.embeddings is None or not gallery.labels:
                 return None
 
-            sims = self._cache_embeddings @ q
-            labels = self._cache_labels
+            sims = gallery.embeddings @ q
+            labels = gallery.labels
 
             best_per_user: Dict[str, float] = {}
             for sim, lbl in zip(sims, labels):
@@ -0,0 +1,163 @@
+"""
+Shared-memory frame transport for the process-pool inference backend.
+
+Pickling a decoded 1024x1024x3 frame per call costs more than moving it, so
+the API process keeps a ring of ``multiprocessing.shared_memory`` slots. A
+frame is copied once into a free slot and only a ``FrameDescriptor`` (segment
+name, shape, dtype, offsets) crosses the pool's queue. The worker maps the
+slot as an ndarray view, runs inference, and writes the detections back into
+the tail of the same slot; the return value is just the face count.
+
+Slot layout::
+
+    [ frame bytes (frame_capacity) | results: max_faces x RESULT_FIELDS float32 ]
+
+Each result row is ``bbox(4) | kps(10, NaN if absent) | det_score(1) | embedding(512)``.
+"""
+
+import logging
+import queue
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.services.inference import DetectedFace
+
+logger = logging.getLogger("smart_attendance.inference")
+
+EMBEDDING_DIM = 512
+RESULT_FIELDS = 4 + 10 + 1 + EMBEDDING_DIM
+_RESULT_DTYPE = np.float32
+
+
+class FrameDescriptor(NamedTuple):
+    """What actually crosses the process boundary (a few dozen bytes)."""
+
+    slot: int
+    shm_name: str
+    shape: Tuple[int, ...]
+    dtype: str
+    result_offset: int
+    max_faces: int
+
+
+class SharedFrameRing:
+    """A fixed pool of shared-memory slots handed out one frame at a time."""
+
+    def __init__(self, slots: int, frame_capacity: int, max_faces: int = 16):
+        self.frame_capacity = frame_capacity
+        self.max_faces = max_faces
+        result_bytes = max_faces * RESULT_FIELDS * np.dtype(_RESULT_DTYPE).itemsize
+        self.slot_bytes = frame_capacity + result_bytes
+
+        self._segments: List[shared_memory.SharedMemory] = [
+            shared_memory.SharedMemory(create=True, size=self.slot_bytes) for _ in range(slots)
+        ]
+        self._free: "queue.Queue[int]" = queue.Queue()
+        for i in range(slots):
+            self._free.put(i)
+
+    def fits(self, img: np.ndarray) -> bool:
+        return img.nbytes <= self.frame_capacity
+
+    @contextmanager
+    def frame(self, img: np.ndarray) -> Iterator[FrameDescriptor]:
+        """Copy ``img`` into a free slot (blocking until one is free)."""
+        slot = self._free.get()
+        try:
+            shm = self._segments[slot]
+            view = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+            np.copyto(view, img)
+            yield FrameDescriptor(
+                slot=slot,
+                shm_name=shm.name,
+                shape=tuple(img.shape),
+                dtype=img.dtype.str,
+                result_offset=self.frame_capacity,
+                max_faces=self.max_faces,
+            )
+        finally:
+            self._free.put(slot)
+
+    def read_results(self, desc: FrameDescriptor, count: int) -> List[DetectedFace]:
+        """Decode ``count`` result rows the worker wrote into the slot."""
+        rows = _result_view(self._segments[desc.slot], desc)[:count]
+        return [_row_to_face(row) for row in rows.copy()]
+
+    def close(self) -> None:
+        for shm in self._segments:
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._segments = []
+
+
+# ── Worker side ──────────────────────────────────────────────────────────────
+
+# Segments this worker has already mapped, by name (attach once, reuse).
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = _attached.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def detach_all() -> None:
+    """Close every mapped segment; the pool initializer runs this at worker exit.
+
+    Only the API process's ring unlinks segments; a worker just drops its
+    mappings so they are not left to interpreter teardown.
+    """
+    while _attached:
+        name, shm = _attached.popitem()
+        try:
+            shm.close()
+        except BufferError:
+            logger.warning(f"Shared frame segment {name} still has live views; not closed")
+
+
+def frame_view(desc: FrameDescriptor) -> np.ndarray:
+    """The frame described by ``desc``, as a view over the shared slot."""
+    shm = _attach(desc.shm_name)
+    return np.ndarray(desc.shape, dtype=np.dtype(desc.dtype), buffer=shm.buf)
+
+
+def write_results(desc: FrameDescriptor, faces: List[DetectedFace]) -> int:
+    """Write detections into the slot's result area; returns the count written."""
+    faces = faces[: desc.max_faces]
+    out = _result_view(_attach(desc.shm_name), desc)
+    for i, face in enumerate(faces):
+        out[i, 0:4] = face.bbox
+        out[i, 4:14] = face.kps.reshape(-1) if face.kps is not None else np.nan
+        out[i, 14] = face.det_score
+        out[i, 15:] = face.normed_embedding
+    return len(faces)
+
+
+def _result_view(shm: shared_memory.SharedMemory, desc: FrameDescriptor) -> np.ndarray:
+    return np.ndarray(
+        (desc.max_faces, RESULT_FIELDS),
+        dtype=_RESULT_DTYPE,
+        buffer=shm.buf,
+        offset=desc.result_offset,
+    )
+
+
+def _row_to_face(row: np.ndarray) -> DetectedFace:
+    kps: Optional[np.ndarray] = row[4:14].reshape(5, 2)
+    if np.isnan(kps).any():
+        kps = None
+    return DetectedFace(
+        bbox=row[0:4],
+        kps=kps,
+        det_score=float(row[14]),
+        normed_embedding=row[15:],
+    )
@@ -0,0 +1,299 @@
+"""
+Content-addressed storage for face image bytes (images, thumbnails,
+originals and aligned recognition chips).
+
+Images are stored once per distinct content and addressed by the hex
+SHA-256 of their bytes; ``FaceImage`` rows only hold that key (plus size
+and content type). Two backends, picked by ``settings.FACE_IMAGE_STORE``:
+
+  * ``database``   - the ``face_image_blobs`` table (one row per key).
+  * ``filesystem`` - files under ``settings.FACE_IMAGE_DIR``, sharded by the
+    first two byte pairs of the key (``ab/cd/abcd...``) so no directory
+    grows past a few thousand entries.
+
+Putting bytes that are already stored only refreshes their put time, so
+identical uploads share one copy. Blobs are removed by ``discard`` once no
+``face_images`` row references them; ``scripts/migrate_image_store.py``
+moves blobs between backends and prunes any left orphaned (e.g. by a
+rolled-back enrollment).
+
+A ``put`` returns a key before the caller's ``face_images`` row commits, so
+an unreferenced blob may be about to gain a reference. ``discard`` and
+``prune`` therefore only remove blobs last put more than ``PUT_GRACE`` ago,
+checked in the removal itself (the database store's DELETE waits for, then
+re-checks, a concurrent put's row); a later prune collects the rest if they
+stay unreferenced.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import delete, or_, select, union
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.sql import insert_for
+from app.models import FaceImage, FaceImageBlob
+
+logger = logging.getLogger("smart_attendance.image_store")
+
+STORES = ("database", "filesystem")
+_KEY_CHUNK = 500
+# Longer than any enrollment transaction takes to commit its face_images rows.
+PUT_GRACE = timedelta(minutes=10)
+# Every face_images column holding a store key.
+_KEY_COLUMNS = (FaceImage.sha256, FaceImage.thumbnail_sha256, FaceImage.original_sha256, FaceImage.chip_sha256)
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageStore:
+    """Backend interface. ``db`` is the caller's session (unused on disk)."""
+
+    name = ""
+
+    def put(self, db: Session, data: bytes) -> str:
+        """Store ``data`` (or refresh its put time if already stored) and return its key."""
+        raise NotImplementedError
+
+    def get_many(self, db: Session, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Bytes of each stored key in ``keys`` (missing keys are left out)."""
+        raise NotImplementedError
+
+    def remove(self, db: Session, keys: Iterable[str], put_before: Optional[datetime] = None) -> int:
+        """Remove ``keys`` (with ``put_before``, naive UTC: only those last put earlier); returns how many."""
+        raise NotImplementedError
+
+    def keys(self, db: Session) -> Iterator[str]:
+        """Every stored key, in ascending order."""
+        raise NotImplementedError
+
+    def get(self, db: Session, key: str) -> Optional[bytes]:
+        return self.get_many(db, [key]).get(key)
+
+
+class DatabaseImageStore(ImageStore):
+    name = "database"
+
+    def put(self, db: Session, data: bytes) -> str:
+        key = content_key(data)
+        stmt = insert_for(db)(FaceImageBlob).values(sha256=key, data=data, size=len(data), created_at=datetime.utcnow())
+        db.execute(stmt.on_conflict_do_update(index_elements=["sha256"], set_={"created_at": stmt.excluded.created_at}))
+        return key
+
+    def get_many(self, db: Session, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for i in range(0, len(keys), _KEY_CHUNK):
+            found.update(db.execute(
+                select(FaceImageBlob.sha256, FaceImageBlob.data).where(FaceImageBlob.sha256.in_(keys[i:i + _KEY_CHUNK]))
+            ).all())
+        return found
+
+    def remove(self, db: Session, keys: Iterable[str], put_before: Optional[datetime] = None) -> int:
+        keys = list(keys)
+        removed = 0
+        for i in range(0, len(keys), _KEY_CHUNK):
+            stmt = delete(FaceImageBlob).where(FaceImageBlob.sha256.in_(keys[i:i + _KEY_CHUNK]))
+            if put_before is not None:
+                stmt = stmt.where(or_(FaceImageBlob.created_at.is_(None), FaceImageBlob.created_at < put_before))
+            removed += db.execute(stmt).rowcount
+        return removed
+
+    def keys(self, db: Session) -> Iterator[str]:
+        last = ""
+        while True:
+            batch = db.scalars(
+                select(FaceImageBlob.sha256)
+                .where(FaceImageBlob.sha256 > last)
+                .order_by(FaceImageBlob.sha256)
+                .limit(_KEY_CHUNK)
+            ).all()
+            yield from batch
+            if len(batch) < _KEY_CHUNK:
+                return
+            last = batch[-1]
+
+
+class FilesystemImageStore(ImageStore):
+    name = "filesystem"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, db: Session, data: bytes) -> str:
+        key = content_key(data)
+        path = self.path(key)
+        try:
+            os.utime(path)  # already stored: the mtime is its put time
+            return key
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write a temp file and rename it into place, so a reader never sees
+        # a partial file and concurrent writers of the same key are harmless.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return key
+
+    def get_many(self, db: Session, keys: Iterable[str]) -> Dict[str, bytes]:
+        found = {}
+        for key in keys:
+            try:
+                with open(self.path(key), "rb") as f:
+                    found[key] = f.read()
+            except FileNotFoundError:
+                pass
+        return found
+
+    def remove(self, db: Session, keys: Iterable[str], put_before: Optional[datetime] = None) -> int:
+        cutoff = put_before.replace(tzinfo=timezone.utc).timestamp() if put_before else None
+        removed = 0
+        for key in keys:
+            path = self.path(key)
+            try:
+                if cutoff is None or os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def keys(self, db: Session) -> Iterator[str]:
+        if not os.path.isdir(self.root):
+            return
+        for top in sorted(os.listdir(self.root)):
+            top_dir = os.path.join(self.root, top)
+            if len(top) != 2 or not os.path.isdir(top_dir):
+                continue
+            for sub in sorted(os.listdir(top_dir)):
+                sub_dir = os.path.join(top_dir, sub)
+                if os.path.isdir(sub_dir):
+                    yield from sorted(name for name in os.listdir(sub_dir) if not name.startswith(".tmp-"))
+
+
+def get_store(name: Optional[str] = None) -> ImageStore:
+    """The store named ``name`` (default: ``settings.FACE_IMAGE_STORE``)."""
+    name = name or settings.FACE_IMAGE_STORE
+    if name == "database":
+        return DatabaseImageStore()
+    if name == "filesystem":
+        return FilesystemImageStore(settings.FACE_IMAGE_DIR)
+    raise ValueError(f"FACE_IMAGE_STORE must be one of {', '.join(STORES)}, got {name!r}")
+
+
+def referenced_keys(db: Session, user_ids) -> Set[str]:
+    """Store keys of ``user_ids``' face images (a list or a subquery of ids)."""
+    rows = db.execute(select(*_KEY_COLUMNS).where(FaceImage.user_id.in_(user_ids))).all()
+    return {key for row in rows for key in row if key}
+
+
+def unreferenced(db: Session, keys: Iterable[str]) -> List[str]:
+    """The keys in ``keys`` that no ``face_images`` row uses."""
+    keys = list(dict.fromkeys(keys))
+    used: Set[str] = set()
+    for i in range(0, len(keys), _KEY_CHUNK):
+        chunk = keys[i:i + _KEY_CHUNK]
+        used.update(db.scalars(union(*(select(column).where(column.in_(chunk)) for column in _KEY_COLUMNS))))
+    return [key for key in keys if key not in used]
+
+
+def _remove_unreferenced(db: Session, store: ImageStore, keys: Iterable[str]) -> int:
+    """Remove those of ``keys`` no ``face_images`` row uses and not put within ``PUT_GRACE``, and commit."""
+    orphans = unreferenced(db, keys)
+    if not orphans:
+        return 0
+    removed = store.remove(db, orphans, put_before=datetime.utcnow() - PUT_GRACE)
+    db.commit()
+    return removed
+
+
+def discard(db: Session, keys: Iterable[str]) -> None:
+    """Remove those of ``keys`` no longer referenced, and commit.
+
+    Call after committing the change that dropped the references, so a
+    failed transaction never leaves rows pointing at removed files. Blobs
+    put within ``PUT_GRACE`` (possibly by a concurrent enrollment of the same
+    bytes) are kept for a later ``prune``.
+    """
+    removed = _remove_unreferenced(db, get_store(), keys)
+    if removed:
+        logger.info(f"Removed {removed} unreferenced face image blob(s)")
+
+
+def _referenced_batches(db: Session, batch_size: int) -> Iterator[List[str]]:
+    """Every key some ``face_images`` row uses, ascending, ``batch_size`` at a time."""
+    used = union(*(select(column.label("key")).where(column.is_not(None)) for column in _KEY_COLUMNS)).subquery()
+    last = ""
+    while True:
+        batch = db.scalars(select(used.c.key).where(used.c.key > last).order_by(used.c.key).limit(batch_size)).all()
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]
+
+
+def migrate(
+    db: Session, source: ImageStore, target: ImageStore, batch_size: int = 100, remove_source: bool = True,
+) -> Dict[str, int]:
+    """Copy every referenced blob from ``source`` to ``target``, ``batch_size`` blobs in memory at a time.
+
+    Each blob is re-hashed before it is written, and (with ``remove_source``)
+    removed from ``source`` once its batch is committed. Keys missing from
+    ``source`` are counted, not fatal: they may already be in ``target``.
+    """
+    counts = {"copied": 0, "missing": 0, "corrupt": 0}
+    for keys in _referenced_batches(db, batch_size):
+        blobs = source.get_many(db, keys)
+        copied = []
+        for key in keys:
+            data = blobs.get(key)
+            if data is None:
+                counts["missing"] += 1
+            elif content_key(data) != key:
+                counts["corrupt"] += 1
+                logger.error(f"Blob {key} in the {source.name} store does not match its key; left in place")
+            else:
+                target.put(db, data)
+                copied.append(key)
+        db.commit()
+        if remove_source and copied:
+            source.remove(db, copied)
+            db.commit()
+        counts["copied"] += len(copied)
+    return counts
+
+
+def prune(db: Session, store: ImageStore) -> int:
+    """Remove blobs in ``store`` that no ``face_images`` row references; returns how many.
+
+    Blobs put within ``PUT_GRACE`` are left for the next run.
+    """
+    removed = 0
+    batch: List[str] = []
+    for key in store.keys(db):
+        batch.append(key)
+        if len(batch) == _KEY_CHUNK:
+            removed += _remove_unreferenced(db, store, batch)
+            batch = []
+    return removed + _remove_unreferenced(db, store, batch)
+
@@ -0,0 +1,299 @@
+"""
+Pluggable inference backends for the face pipeline.
+
+``FaceRecognitionService`` never touches ONNX sessions directly; it hands a
+decoded BGR frame to an ``InferenceBackend`` and gets back backend-neutral
+``DetectedFace`` tuples. Two backends ship:
+
+  * ``inprocess`` (default) — InsightFace runs inside the API worker.
+  * ``process`` — a local pool of inference processes owns the ONNX sessions,
+    so API workers and inference workers can be scaled independently. Frames
+    travel through a shared-memory ring (``app.services.frame_transport``),
+    or over the pool's local pipes when the ring is disabled; nothing leaves
+    the host.
+
+Selected with ``FACE_INFERENCE_BACKEND`` / ``FACE_INFERENCE_WORKERS`` /
+``FACE_INFERENCE_SHM_SLOTS``.
+
+Besides ``detect``, backends ``embed`` pre-aligned ArcFace chips (see
+``align_chip``) with the recognition model alone, which is how stored
+enrollment chips are re-embedded after a model change.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core import metrics, timing
+
+logger = logging.getLogger("smart_attendance.inference")
+
+MODEL_LOAD_SECONDS = metrics.gauge(
+    "face_model_load_seconds", "Time taken to load the face models in this process."
+)
+
+# Side of the aligned face crop ArcFace models take as input.
+CHIP_SIZE = 112
+CHIP_SHAPE = (CHIP_SIZE, CHIP_SIZE, 3)
+
+
+def align_chip(img: np.ndarray, kps: np.ndarray) -> np.ndarray:
+    """The (112, 112, 3) uint8 BGR recognition input for a face with landmarks ``kps``."""
+    from insightface.utils import face_align
+
+    return face_align.norm_crop(img, landmark=kps, image_size=CHIP_SIZE)
+
+
+class DetectedFace(NamedTuple):
+    """One detected face. Plain arrays only, so it pickles across processes."""
+
+    bbox: np.ndarray              # (4,) x1, y1, x2, y2 in frame pixels
+    kps: Optional[np.ndarray]     # (5, 2) facial landmarks
+    det_score: float
+    normed_embedding: np.ndarray  # (512,) float32, L2-normalised ArcFace embedding
+
+
+class InferenceBackend:
+    """Interface: turn a BGR frame into detected faces with embeddings."""
+
+    name = "base"
+
+    def detect(self, img: np.ndarray) -> List[DetectedFace]:
+        raise NotImplementedError
+
+    def embed(self, chips: np.ndarray) -> np.ndarray:
+        """L2-normalised embeddings (N, dim) of aligned chips (N, 112, 112, 3); no detection."""
+        raise NotImplementedError
+
+    def warmup(self) -> None:
+        """Load models ahead of the first request (optional)."""
+
+    def close(self) -> None:
+        """Release models / worker processes (optional)."""
+
+
+class InProcessBackend(InferenceBackend):
+    """
+    Runs InsightFace (SCRFD + ArcFace) in the calling process.
+
+    Only the detection and recognition models are loaded; the pack's landmark
+    and gender/age models are never used by the attendance pipeline. The two
+    stages are driven explicitly so each is timed ("detect" / "embed") and all
+    faces in a frame are embedded in one batched ArcFace pass.
+    """
+
+    name = "inprocess"
+
+    def __init__(self, model_name: str, det_size: Tuple[int, int], use_gpu: bool):
+        self.model_name = model_name
+        self.det_size = det_size
+        self.use_gpu = use_gpu
+        self._app = None  # lazily initialized FaceAnalysis
+
+    @property
+    def app(self):
+        if self._app is None:
+            from insightface.app import FaceAnalysis
+            if self.use_gpu:
+                providers = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+                ctx_id = 0
+            else:
+                providers = ["CPUExecutionProvider"]
+                ctx_id = -1
+            logger.info(f"Loading InsightFace model pack '{self.model_name}' (GPU={self.use_gpu})...")
+            started = time.perf_counter()
+            app = FaceAnalysis(
+                name=self.model_name,
+                providers=providers,
+                allowed_modules=["detection", "recognition"],
+            )
+            app.prepare(ctx_id=ctx_id, det_size=self.det_size)
+            self._app = app
+            MODEL_LOAD_SECONDS.set(time.perf_counter() - started)
+            logger.info("InsightFace model loaded.")
+        return self._app
+
+    def detect(self, img: np.ndarray) -> List[DetectedFace]:
+        from insightface.utils import face_align
+
+        app = self.app
+        with timing.stage("detect"):
+            bboxes, kpss = app.det_model.detect(img, max_num=0, metric="default")
+        if bboxes.shape[0] == 0 or kpss is None:
+            return []
+
+        rec = app.models["recognition"]
+        with timing.stage("embed"):
+            chips = [face_align.norm_crop(img, landmark=kps, image_size=rec.input_size[0]) for kps in kpss]
+            feats = self._embed(chips)
+
+        return [
+            DetectedFace(
+                bbox=np.asarray(bboxes[i, 0:4], dtype=np.float32),
+                kps=np.asarray(kpss[i], dtype=np.float32),
+                det_score=float(bboxes[i, 4]),
+                normed_embedding=feats[i],
+            )
+            for i in range(bboxes.shape[0])
+        ]
+
+    def _embed(self, chips) -> np.ndarray:
+        feats = np.asarray(self.app.models["recognition"].get_feat(chips), dtype=np.float32).reshape(len(chips), -1)
+        return feats / np.linalg.norm(feats, axis=1, keepdims=True)
+
+    def embed(self, chips: np.ndarray) -> np.ndarray:
+        with timing.stage("embed"):
+            return self._embed(list(chips))
+
+    def warmup(self) -> None:
+        self.app  # noqa: B018  trigger the lazy load
+
+    def close(self) -> None:
+        self._app = None
+
+
+# ── Out-of-process backend ──────────────────────────────────────────────────
+
+# Per-worker-process backend, created by the pool initializer.
+_worker_backend: Optional[InProcessBackend] = None
+
+
+def _init_worker(model_name: str, det_size: Tuple[int, int], use_gpu: bool) -> None:
+    global _worker_backend
+    from app.services import frame_transport
+
+    atexit.register(frame_transport.detach_all)
+    _worker_backend = InProcessBackend(model_name, det_size, use_gpu)
+    _worker_backend.warmup()
+
+
+def _worker_detect(img: np.ndarray) -> List[DetectedFace]:
+    return _worker_backend.detect(img)
+
+
+def _worker_embed(chips: np.ndarray) -> np.ndarray:
+    return _worker_backend.embed(chips)
+
+
+def _worker_detect_shared(desc) -> int:
+    from app.services import frame_transport
+
+    faces = _worker_backend.detect(frame_transport.frame_view(desc))
+    return frame_transport.write_results(desc, faces)
+
+
+class ProcessPoolBackend(InferenceBackend):
+    """
+    Delegates inference to a pool of local worker processes, each owning its
+    own ONNX sessions. Workers are spawned (not forked) so they never inherit
+    onnxruntime thread state from the API process.
+
+    With ``shm_slots > 0`` frames up to ``max_frame_dim`` on the long side go
+    through a shared-memory ring instead of being pickled per call.
+    """
+
+    name = "process"
+
+    def __init__(
+        self,
+        model_name: str,
+        det_size: Tuple[int, int],
+        use_gpu: bool,
+        workers: int = 1,
+        shm_slots: int = 0,
+        max_frame_dim: int = 1024,
+    ):
+        self.model_name = model_name
+        self.det_size = det_size
+        self.use_gpu = use_gpu
+        self.workers = max(1, workers)
+        self.shm_slots = max(0, shm_slots)
+        self.max_frame_dim = max_frame_dim
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._ring = None  # lazily created SharedFrameRing
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    logger.info(f"Starting {self.workers} inference worker process(es)")
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self.model_name, self.det_size, self.use_gpu),
+                    )
+        return self._executor
+
+    def _frame_ring(self):
+        if self._ring is None and self.shm_slots:
+            with self._lock:
+                if self._ring is None:
+                    from app.services.frame_transport import SharedFrameRing
+
+                    self._ring = SharedFrameRing(
+                        slots=self.shm_slots,
+                        frame_capacity=self.max_frame_dim * self.max_frame_dim * 3,
+                    )
+        return self._ring
+
+    def detect(self, img: np.ndarray) -> List[DetectedFace]:
+        pool = self._pool()
+        ring = self._frame_ring()
+        # Detect/embed run in the worker; time the whole round trip here.
+        with timing.stage("inference"):
+            if ring is None or not ring.fits(img):
+                return pool.submit(_worker_detect, img).result()
+            with ring.frame(img) as desc:
+                count = pool.submit(_worker_detect_shared, desc).result()
+                return ring.read_results(desc, count)
+
+    def embed(self, chips: np.ndarray) -> np.ndarray:
+        # Chips are small (37 KB each); split the batch across the workers.
+        pool = self._pool()
+        parts = [part for part in np.array_split(chips, self.workers) if len(part)]
+        with timing.stage("inference"):
+            return np.concatenate([f.result() for f in [pool.submit(_worker_embed, part) for part in parts]])
+
+    def warmup(self) -> None:
+        # One no-op round trip per worker forces every initializer to run;
+        # models load inside the workers, so report the pool start-up time.
+        started = time.perf_counter()
+        pool = self._pool()
+        blank = np.zeros((8, 8, 3), dtype=np.uint8)
+        for future in [pool.submit(_worker_detect, blank) for _ in range(self.workers)]:
+            future.result()
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - started)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
+
+
+def create_backend(
+    name: str,
+    model_name: str,
+    det_size: Tuple[int, int],
+    use_gpu: bool,
+    workers: int = 1,
+    shm_slots: int = 0,
+    max_frame_dim: int = 1024,
+) -> InferenceBackend:
+    """Build the inference backend selected by ``FACE_INFERENCE_BACKEND``."""
+    if name == "inprocess":
+        return InProcessBackend(model_name, det_size, use_gpu)
+    if name == "process":
+        return ProcessPoolBackend(model_name, det_size, use_gpu, workers, shm_slots, max_frame_dim)
+    raise ValueError(f"Unknown inference backend '{name}' (expected 'inprocess' or 'process')")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark the /admin/attendance listing.
+
+Fills a throwaway SQLite database with synthetic users and attendance, then
+times one page of the listing as served now (one joined, column-only query
+serialized from row tuples) against the previous implementation (ORM rows,
+a load of every user, UserResponse.model_validate per row), for the
+first page and a deep cursor page.
+
+Usage (from the backend directory):
+    python -m scripts.bench_admin_attendance --users 50000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from datetime import time as dtime
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.routers.admin import get_attendance_records  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import Attendance, User  # noqa: E402
+from app.schemas import UserResponse  # noqa: E402
+
+
+def populate(session_factory, n_users: int, days: int) -> date:
+    rng = random.Random(0)
+    departments = ["Engineering", "Sales", "HR", "Finance", None]
+    db = session_factory()
+    db.execute(insert(User), [
+        {
+            "id": i, "email": f"user{i}@example.com", "password": "x", "full_name": f"Employee Number {i}",
+            "unique_id": f"USR{i:08d}", "department": rng.choice(departments), "role": "user", "is_active": True,
+        }
+        for i in range(1, n_users + 1)
+    ])
+    today = date.today()
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        db.execute(insert(Attendance), [
+            {
+                "user_id": uid, "date": day, "status": "present",
+                "time_in": dtime(rng.randint(7, 10), rng.randint(0, 59), rng.randint(0, 59)),
+            }
+            for uid in range(1, n_users + 1)
+        ])
+    db.commit()
+    db.close()
+    return today
+
+
+def legacy_page(db, day: date, limit: int, offset: int):
+    """The listing before the joined query: ORM page + every user + model_validate."""
+    query = db.query(Attendance).join(User).filter(Attendance.date == day)
+    records = query.order_by(Attendance.id.desc()).offset(offset).limit(limit).all()
+    users_by_id = {u.id: u for u in db.query(User).all()}
+    return [
+        {
+            "id": record.id,
+            "user": UserResponse.model_validate(users_by_id.get(record.user_id)),
+            "date": record.date.isoformat(),
+            "time_in": record.time_in.isoformat() if record.time_in else None,
+            "status": record.status,
+            "created_at": record.created_at.isoformat(),
+        }
+        for record in records
+    ]
+
+
+def current_page(db, day: date, limit: int, cursor=None):
+    response = Response()
+    rows = asyncio.run(get_attendance_records(
+        response=response, date=day.isoformat(), user_id=None, limit=limit, cursor=cursor,
+        offset=0, count="none", db=db, current_user=None,
+    ))
+    return rows, response.headers.get("X-Next-Cursor")
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - began)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        print(f"[INFO] Populating {args.users:,} users x {args.days} days of attendance...")
+        today = populate(session_factory, args.users, args.days)
+
+        deep = args.users // 2
+        db = session_factory()
+        _, cursor = current_page(db, today, deep)  # cursor positioned `deep` rows in
+
+        cases = [
+            ("first page, legacy", lambda: legacy_page(db, today, args.limit, 0)),
+            ("first page, joined", lambda: current_page(db, today, args.limit)),
+            (f"row {deep:,}, legacy (offset)", lambda: legacy_page(db, today, args.limit, deep)),
+            (f"row {deep:,}, joined (cursor)", lambda: current_page(db, today, args.limit, cursor)),
+        ]
+        print(f"\n{'case':<32}{'median (ms)':>12}")
+        for name, fn in cases:
+            fn()  # warm up
+            print(f"{name:<32}{timed(fn, args.repeat):>12.1f}")
+            db.expunge_all()
+        db.close()
+        engine.dispose()
+
+    print("\n[DONE]")
+
+
+if __name__ == "__main__":
+    main()
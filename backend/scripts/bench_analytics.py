@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark the dashboard analytics engines on synthetic data.
+
+Times the reference implementations (``app.services.analytics``, Python loops
+over record objects) against the columnar NumPy engine
+(``app.services.analytics_columnar``), including the cost of building the
+frame, and checks that both produce identical output.
+
+Usage (from the backend directory):
+    python -m scripts.bench_analytics --rows 1000000 --users 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import time as dtime
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.time_utils import today_local  # noqa: E402
+from app.services import analytics as svc  # noqa: E402
+from app.services import analytics_columnar as columnar  # noqa: E402
+
+
+class _User:
+    __slots__ = ("id", "full_name", "department")
+
+    def __init__(self, id, full_name, department):
+        self.id, self.full_name, self.department = id, full_name, department
+
+
+class _Record:
+    __slots__ = ("user_id", "date", "time_in", "status")
+
+    def __init__(self, user_id, date, time_in, status):
+        self.user_id, self.date, self.time_in, self.status = user_id, date, time_in, status
+
+
+def synthesize(rows: int, n_users: int, seed: int = 0):
+    rng = random.Random(seed)
+    departments = ["Engineering", "Sales", "HR", "Finance", "Operations", None]
+    users = [_User(i, f"User {i}", rng.choice(departments)) for i in range(1, n_users + 1)]
+    days = max(1, rows // n_users)
+    today = today_local()
+    records = []
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        for user in users:
+            if len(records) >= rows:
+                break
+            if rng.random() < 0.2:
+                records.append(_Record(user.id, day, None, "absent"))
+            else:
+                arrival = dtime(rng.randint(7, 10), rng.randint(0, 59), rng.randint(0, 59))
+                records.append(_Record(user.id, day, arrival, "present"))
+    return users, records, today - timedelta(days=days - 1), today
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"[INFO] Generating {args.rows:,} attendance rows for {args.users:,} users...")
+    users, records, start, end = synthesize(args.rows, args.users)
+    total = len(users)
+
+    reference = {
+        "live_stats": lambda: svc.live_stats(users, records),
+        "department_breakdown": lambda: svc.department_breakdown(users, records),
+        "daily_trends": lambda: svc.daily_trends(records, start, end, total),
+        "weekly_patterns": lambda: svc.weekly_patterns(records, start, end, total),
+        "user_performance": lambda: svc.user_performance(users, records),
+        "detect_anomalies": lambda: svc.detect_anomalies(records, users),
+        "recommendations": lambda: svc.recommendations(records, users),
+    }
+
+    frame, build = _timed(lambda: columnar.AttendanceFrame.from_objects(users, records))
+    vectorized = {
+        "live_stats": lambda: columnar.live_stats(frame),
+        "department_breakdown": lambda: columnar.department_breakdown(frame),
+        "daily_trends": lambda: columnar.daily_trends(frame, start, end, total),
+        "weekly_patterns": lambda: columnar.weekly_patterns(frame, start, end, total),
+        "user_performance": lambda: columnar.user_performance(frame),
+        "detect_anomalies": lambda: columnar.detect_anomalies(frame),
+        "recommendations": lambda: columnar.recommendations(frame),
+    }
+
+    print(f"\n{'section':<22}{'python (s)':>12}{'numpy (s)':>12}{'speedup':>10}")
+    ref_total, col_total = 0.0, 0.0
+    for name in reference:
+        expected, ref_secs = _timed(reference[name])
+        actual, col_secs = _timed(vectorized[name])
+        if actual != expected:
+            print(f"[FAIL] {name}: columnar output differs from the reference")
+            sys.exit(1)
+        ref_total += ref_secs
+        col_total += col_secs
+        print(f"{name:<22}{ref_secs:>12.3f}{col_secs:>12.3f}{ref_secs / max(col_secs, 1e-9):>9.1f}x")
+
+    print(f"{'frame build':<22}{'':>12}{build:>12.3f}")
+    print(f"{'total':<22}{ref_total:>12.3f}{col_total + build:>12.3f}"
+          f"{ref_total / max(col_total + build, 1e-9):>9.1f}x")
+    print("\n[DONE] All sections identical.")
+
+
+if __name__ == "__main__":
+    main()
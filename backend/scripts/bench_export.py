@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark the raw attendance export formats.
+
+Fills a throwaway SQLite database with synthetic attendance, streams it
+through each export format exactly as /analytics/export/records does, and
+reports encode time, output size and the time to load the result back into
+typed columns (dates as datetime64, arrival times as timedelta64).
+
+Usage (from the backend directory):
+    python -m scripts.bench_export --rows 500000
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from datetime import time as dtime
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.base import Base  # noqa: E402
+from app.models import Attendance, User  # noqa: E402
+from app.services import attendance_export  # noqa: E402
+
+
+def populate(session_factory, rows: int, n_users: int) -> date:
+    rng = random.Random(0)
+    departments = ["Engineering", "Sales", "HR", "Finance", None]
+    db = session_factory()
+    db.execute(insert(User), [
+        {
+            "id": i, "email": f"user{i}@example.com", "password": "x", "full_name": f"Employee Number {i}",
+            "unique_id": f"USR{i:08d}", "department": rng.choice(departments), "role": "user", "is_active": True,
+        }
+        for i in range(1, n_users + 1)
+    ])
+    days = max(1, rows // n_users)
+    start = date.today() - timedelta(days=days - 1)
+    batch = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        for uid in range(1, n_users + 1):
+            absent = rng.random() < 0.15
+            batch.append({
+                "user_id": uid, "date": day, "status": "absent" if absent else "present",
+                "time_in": None if absent else dtime(rng.randint(7, 10), rng.randint(0, 59), rng.randint(0, 59)),
+            })
+            if len(batch) >= 50_000:
+                db.execute(insert(Attendance), batch)
+                batch.clear()
+    if batch:
+        db.execute(insert(Attendance), batch)
+    db.commit()
+    db.close()
+    return start
+
+
+def load_csv(data: bytes):
+    reader = csv.reader(io.StringIO(data.decode("utf-8")))
+    next(reader)
+    columns = list(zip(*reader))
+    micros = [
+        (int(t[0:2]) * 3600 + int(t[3:5]) * 60 + int(t[6:8])) * 1_000_000 if t else -1 for t in columns[5]
+    ]
+    time_in = np.array(micros, dtype="m8[us]")
+    time_in[np.array(micros) < 0] = np.timedelta64("NaT")
+    return {
+        "date": np.array(columns[0], dtype="M8[D]"),
+        "unique_id": np.array(columns[1]),
+        "full_name": np.array(columns[2]),
+        "department": np.array(columns[3]),
+        "status": np.array(columns[4]),
+        "time_in": time_in,
+    }
+
+
+def loader(fmt: str):
+    if fmt == "csv":
+        return load_csv
+    if fmt == "csv.gz":
+        return lambda data: load_csv(gzip.decompress(data))
+    if fmt == "npz":
+        return lambda data: attendance_export.read_npz(io.BytesIO(data))
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return lambda data: pq.read_table(io.BytesIO(data))
+    return lambda data: pa.ipc.open_stream(data).read_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        print(f"[INFO] Populating {args.rows:,} attendance rows for {args.users:,} users...")
+        start = populate(session_factory, args.rows, args.users)
+
+        formats = ["csv", "csv.gz", *attendance_export.available_formats()]
+        print(f"\n{'format':<10}{'encode (s)':>12}{'size (MB)':>12}{'load (s)':>12}")
+        for fmt in formats:
+            db = session_factory()
+            batches = attendance_export.record_batches(db, start, date.today())
+            began = time.perf_counter()
+            if fmt.startswith("csv"):
+                data = b"".join(attendance_export.csv_stream(batches, compress=fmt == "csv.gz"))
+            else:
+                data = b"".join(attendance_export.columnar_stream(batches, fmt))
+            encode = time.perf_counter() - began
+            db.close()
+
+            load = loader(fmt)
+            began = time.perf_counter()
+            load(data)
+            load_secs = time.perf_counter() - began
+            print(f"{fmt:<10}{encode:>12.2f}{len(data) / 1e6:>12.1f}{load_secs:>12.2f}")
+        engine.dispose()
+
+    print("\n[DONE]")
+
+
+if __name__ == "__main__":
+    main()
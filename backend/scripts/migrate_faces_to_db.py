@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 One-time migration: move on-disk face data (dataset/<uid>/encoding.pkl + face_*.jpg)
-into the database (FaceEmbedding / FaceImage), making the backend stateless.
+into the database (FaceEmbedding / FaceImage, image bytes in the configured
+image store), making the backend stateless.
 
 Run AFTER the schema migration has been applied (start the server once, or run
 `python -m alembic upgrade head`), then:
@@ -22,6 +23,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.core.config import settings  # noqa: E402
 from app.db.session import SessionLocal  # noqa: E402
 from app.models import FaceEmbedding, FaceImage, User  # noqa: E402
+from app.services import image_store  # noqa: E402
 
 
 def main():
@@ -31,6 +33,7 @@ def main():
         return
 
     db = SessionLocal()
+    store = image_store.get_store()
     migrated, skipped = 0, 0
     try:
         for unique_id in sorted(os.listdir(dataset_dir)):
@@ -84,7 +87,8 @@ def main():
                     db.add(FaceImage(
                         user_id=user.id,
                         position=pos,
-                        image_data=blob,
+                        sha256=store.put(db, blob),
+                        size=len(blob),
                         quality_score=quality_map.get(os.path.basename(img_path)),
                     ))
 
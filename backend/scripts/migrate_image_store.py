@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Move face image bytes between image stores, or prune orphaned blobs.
+
+Copies every blob referenced by face_images from one store to the other in
+batches (only --batch-size blobs are held in memory), verifying each one's
+SHA-256, and removes it from the source once its batch is committed. Safe
+to re-run: blobs already moved are counted as missing from the source.
+
+To move images out of the database:
+
+    python -m scripts.migrate_image_store --to filesystem
+    # then set FACE_IMAGE_STORE=filesystem and restart the API
+
+--prune removes blobs no face_images row references from the configured
+store (leftovers of failed enrollments). Blobs put in the last ten minutes
+are kept, as an enrollment in progress may not have committed its rows yet.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.services import image_store  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--to", choices=image_store.STORES, help="store to move all referenced images into")
+    action.add_argument("--prune", action="store_true", help="remove unreferenced blobs from the configured store")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--keep-source", action="store_true", help="copy without removing from the source store")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.prune:
+            store = image_store.get_store()
+            removed = image_store.prune(db, store)
+            print(f"[DONE] Removed {removed} unreferenced blob(s) from the {store.name} store.")
+            return
+
+        source_name = "database" if args.to == "filesystem" else "filesystem"
+        source, target = image_store.get_store(source_name), image_store.get_store(args.to)
+        print(f"[INFO] Moving face images: {source.name} -> {target.name} ({settings.FACE_IMAGE_DIR})")
+        counts = image_store.migrate(db, source, target, args.batch_size, remove_source=not args.keep_source)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[DONE] Copied {counts['copied']} blob(s); {counts['missing']} not in the {source.name} store; "
+          f"{counts['corrupt']} failed verification.")
+    if settings.FACE_IMAGE_STORE != args.to:
+        print(f"[INFO] Set FACE_IMAGE_STORE={args.to} and restart the API to serve from the new store.")
+
+
+if __name__ == "__main__":
+    main()
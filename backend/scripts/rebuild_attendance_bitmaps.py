@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Recompute the attendance_bitmaps table from the attendance rows.
+
+The bitmaps are maintained incrementally by every attendance write; run this
+after bulk imports or manual SQL edits to attendance:
+
+    python -m scripts.rebuild_attendance_bitmaps
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.session import SessionLocal  # noqa: E402
+from app.services.attendance_writes import rebuild_attendance_bitmaps  # noqa: E402
+
+
+def main():
+    db = SessionLocal()
+    try:
+        rows = rebuild_attendance_bitmaps(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[DONE] Rebuilt attendance_bitmaps: {rows} user-year row(s).")
+
+
+if __name__ == "__main__":
+    main()
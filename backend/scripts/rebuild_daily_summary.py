@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Recompute the attendance_daily_summary table from the attendance rows.
+
+The summary is maintained incrementally by every attendance write; run this
+after bulk imports, manual SQL edits, or department reassignments (rows are
+attributed to the department the user had when they were written):
+
+    python -m scripts.rebuild_daily_summary
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.session import SessionLocal  # noqa: E402
+from app.services.attendance_writes import rebuild_daily_summary  # noqa: E402
+
+
+def main():
+    db = SessionLocal()
+    try:
+        rows = rebuild_daily_summary(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[DONE] Rebuilt attendance_daily_summary: {rows} row(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,59 @@
 #!/usr/bin/env python3
 """
-Re-encode all enrolled users with the InsightFace/ArcFace model.
+Re-encode all enrolled users with the current InsightFace/ArcFace model.
 
-Recomputes embeddings from each user's stored ``face_*.jpg`` images so existing
-users keep working after a model change — no manual re-registration required.
+Recomputes every user's embeddings from the aligned 112x112 chips stored at
+enrollment, in batches through the recognition model only (no detection),
+so existing users keep working after a model change - no manual
+re-registration required.
+
+Users enrolled before chips were stored are skipped unless --backfill is
+given, which makes each missing chip once from the stored face image (one
+detection per image) and saves it for later runs.
 
 Usage (from the backend directory):
-    python -m scripts.reencode_faces
+    python -m scripts.reencode_faces [--batch-size 64] [--backfill]
     # or
     python scripts/reencode_faces.py
 """
 
-import glob
+import argparse
 import os
 import sys
+import time
 
 # Ensure the backend root (containing the `app` package) is importable.
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.core.config import settings  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
 from app.services.face_recognition import face_service  # noqa: E402
 
 
 def main():
-    dataset_dir = settings.DATASET_DIR
-    if not os.path.isdir(dataset_dir):
-        print(f"[ERROR] Dataset directory '{dataset_dir}' not found.")
-        return
-
-    user_dirs = [d for d in os.listdir(dataset_dir) if os.path.isdir(os.path.join(dataset_dir, d))]
-    if not user_dirs:
-        print("[INFO] No enrolled users found.")
-        return
-
-    print(f"[INFO] Re-encoding {len(user_dirs)} user(s) with model '{face_service.model_name}'...\n")
-    ok, failed = 0, 0
-
-    for user_id in user_dirs:
-        images = sorted(glob.glob(os.path.join(dataset_dir, user_id, "face_*.jpg")))
-        if not images:
-            print(f"  [SKIP] {user_id}: no face images on disk")
-            failed += 1
-            continue
-        try:
-            result = face_service.train_user_face(user_id, images, check_liveness=False)
-            stats = result["statistics"]
-            print(f"  [OK]   {user_id}: {stats['successfully_encoded']} embeddings "
-                  f"(avg quality {stats['average_quality_score']:.1f})")
-            ok += 1
-        except Exception as e:
-            print(f"  [FAIL] {user_id}: {e}")
-            failed += 1
-
-    print(f"\n[DONE] Re-encoded {ok} user(s); {failed} failed/skipped.")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=64, help="chips per recognition-model call")
+    parser.add_argument("--backfill", action="store_true", help="make missing chips from the stored images")
+    args = parser.parse_args()
+
+    print(f"[INFO] Re-encoding enrolled users with model '{face_service.model_name}'...")
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        counts = face_service.reencode_all(db, batch_size=args.batch_size, backfill=args.backfill)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        face_service.close()
+    elapsed = time.perf_counter() - started
+
+    if counts["backfilled"]:
+        print(f"[INFO] Made {counts['backfilled']} missing chip(s) from stored images.")
+    if counts["skipped"]:
+        hint = "" if args.backfill else " (no stored chips; re-run with --backfill)"
+        print(f"[INFO] Skipped {counts['skipped']} user(s){hint}.")
+    print(f"\n[DONE] Re-encoded {counts['users']} user(s) from {counts['chips']} chip(s) in {elapsed:.1f}s.")
 
 
 if __name__ == "__main__":
@@ -64,6 +64,8 @@ def create_tables():
 def clean_tables():
     """Truncate every table before each test to keep tests independent."""
     yield
+    from app.services.analytics_cache import cache
+    cache.clear()
     with engine.connect() as conn:
         for table in reversed(Base.metadata.sorted_tables):
             conn.execute(table.delete())
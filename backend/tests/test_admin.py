@@ -1,7 +1,16 @@
 """Admin authorization tests: endpoints reject non-admin tokens and accept admin tokens."""
 
+import re
+from datetime import date, time, timedelta
+
 import pytest
-from tests.conftest import register_user, login_user
+from sqlalchemy import event
+
+from app.models import Attendance, FaceEmbedding, FaceImage, FaceImageBlob, User
+from app.schemas import UserResponse
+from app.services import image_store
+from app.services.image_store import DatabaseImageStore
+from tests.conftest import engine, register_user, login_user
 
 
 @pytest.mark.asyncio
@@ -76,13 +85,13 @@ async def test_admin_delete_user(client, admin_token):
 
 @pytest.mark.asyncio
 async def test_admin_users_pagination(client, admin_token):
-    """limit/offset paginate users and X-Total-Count reports the full total."""
+    """limit/offset paginate users and count=exact reports the full total in X-Total-Count."""
     # admin_token already created 1 admin; add 3 more users
     for i in range(3):
         await register_user(client, f"p{i}@test.com", "Pass123!", f"User {i}")
 
     resp = await client.get(
-        "/admin/users?limit=2&offset=0",
+        "/admin/users?limit=2&offset=0&count=exact",
         headers={"Authorization": f"Bearer {admin_token}"},
     )
     assert resp.status_code == 200
@@ -122,3 +131,184 @@ async def test_admin_update_attendance(client, admin_token):
     )
     assert edit_resp.status_code == 200
     assert edit_resp.json()["attendance"]["status"] == "present"
+
+
+def _face_image(db, user_id: int, position: int, data: bytes) -> FaceImage:
+    return FaceImage(
+        user_id=user_id, position=position, sha256=DatabaseImageStore().put(db, data), size=len(data),
+    )
+
+
+async def _statements_during(run):
+    """Await ``run()`` and return (result, SQL statements it executed)."""
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        return await run(), statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+@pytest.mark.asyncio
+async def test_admin_bulk_update_statement_count_is_constant(client, admin_token, db_session):
+    """Bulk update issues the same attendance statements for 2 or 20 records."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(20):
+        await register_user(client, f"bulk{i}@test.com", "Pass123!", f"Bulk {i}")
+    await client.post("/admin/mark-absent", headers=headers)
+    ids = [a.id for a in db_session.query(Attendance).order_by(Attendance.id)]
+
+    counts = []
+    for chunk in (ids[:2], ids[2:]):
+        resp, statements = await _statements_during(lambda: client.post(
+            "/admin/attendance/bulk-update",
+            data={"record_ids": chunk + [999999], "status": "present", "time_in": "08:30"},
+            headers=headers,
+        ))
+        assert resp.status_code == 200
+        assert resp.json()["message"] == f"Updated {len(chunk)} attendance records"
+        counts.append(len([s for s in statements if re.search(r"\battendance\b", s)]))
+    assert counts[0] == counts[1] == 2
+
+    db_session.expire_all()
+    rows = db_session.query(Attendance).filter(Attendance.id.in_(ids)).all()
+    assert all(r.status == "present" and r.time_in == time(8, 30) for r in rows)
+
+    resp = await client.post(
+        "/admin/attendance/bulk-update",
+        data={"record_ids": ids, "status": "present", "time_in": "8.30am"},
+        headers=headers,
+    )
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Invalid time format. Use HH:MM"
+
+
+@pytest.mark.asyncio
+async def test_admin_bulk_face_delete_statement_count_is_constant(client, admin_token, db_session, monkeypatch):
+    """Bulk face deletion is a fixed set of statements, with per-id errors."""
+    monkeypatch.setattr(image_store, "PUT_GRACE", timedelta(0))  # blobs put below may go at once
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(12):
+        await register_user(client, f"face{i}@test.com", "Pass123!", f"Face {i}")
+    users = db_session.query(User).filter(User.email.like("face%@test.com")).order_by(User.id).all()
+    for user in users[:10]:
+        db_session.add(FaceEmbedding(user_id=user.id, embeddings=b"\0" * 8, count=1, dim=2, model="test"))
+        db_session.add(_face_image(db_session, user.id, 1, b"jpeg"))
+        user.face_registered = True
+    db_session.commit()
+    unique_ids = [u.unique_id for u in users]
+
+    counts = []
+    for batch in (unique_ids[:2], unique_ids[2:] + ["USR_MISSING"]):
+        resp, statements = await _statements_during(lambda: client.post(
+            "/admin/faces/bulk-delete", data={"user_ids": batch}, headers=headers,
+        ))
+        assert resp.status_code == 200
+        counts.append(len([s for s in statements if re.search(r"\bface_(embeddings|images)\b", s)]))
+    assert counts[0] == counts[1] == 5
+
+    body = resp.json()
+    assert body["deleted_count"] == 8
+    assert body["errors"] == [
+        f"No face data for user {unique_ids[10]}",
+        f"No face data for user {unique_ids[11]}",
+        "User USR_MISSING not found",
+    ]
+    db_session.expire_all()
+    assert db_session.query(FaceEmbedding).count() == 0
+    assert db_session.query(FaceImage).count() == 0
+    assert db_session.query(FaceImageBlob).count() == 0  # the shared blob went with its last reference
+    assert not any(u.face_registered for u in db_session.query(User))
+
+
+@pytest.mark.asyncio
+async def test_admin_keyset_pagination(client, admin_token, db_session):
+    """Cursor pages cover every row exactly once; counts are opt-in."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(6):
+        await register_user(client, f"k{i}@test.com", "Pass123!", f"Keyset {i}")
+    await client.post("/admin/mark-absent", headers=headers)
+    users = db_session.query(User).order_by(User.id).all()
+    for user, day in zip(users, (1, 2, 2, 3, 5)):
+        db_session.add(Attendance(user_id=user.id, date=date(2024, 1, day), status="present"))
+    db_session.commit()
+
+    for path, total in (("/admin/users", 7), ("/admin/attendance", 12)):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            resp = await client.get(path, params=params, headers=headers)
+            assert resp.status_code == 200
+            assert "X-Total-Count" not in resp.headers
+            seen.extend(resp.json())
+            cursor = resp.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+        assert len(seen) == total and len({r["id"] for r in seen}) == total
+
+        everything = (await client.get(path, params={"count": "exact"}, headers=headers))
+        assert everything.headers["X-Total-Count"] == str(total)
+        assert [r["id"] for r in everything.json()] == [r["id"] for r in seen]
+        estimated = await client.get(path, params={"count": "estimated", "limit": 1}, headers=headers)
+        assert estimated.headers["X-Total-Count"] == str(total)  # SQLite has no estimate: exact
+
+    dates = [r["date"] for r in seen]
+    assert dates == sorted(dates, reverse=True)
+    assert (await client.get("/admin/users", params={"cursor": "not-a-cursor"}, headers=headers)).status_code == 400
+    assert (await client.get("/admin/users", params={"count": "maybe"}, headers=headers)).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_admin_attendance_is_one_joined_query(client, admin_token, db_session):
+    """The listing runs one attendance query and serializes users like UserResponse."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(4):
+        await register_user(client, f"j{i}@test.com", "Pass123!", f"Joined {i}")
+    await client.post("/admin/mark-absent", headers=headers)
+    target = db_session.query(User).filter(User.email == "j2@test.com").one()
+    target.department, target.phone_number = "Ops", "555-0100"
+    db_session.commit()
+
+    resp, statements = await _statements_during(lambda: client.get(
+        "/admin/attendance", params={"user_id": target.unique_id, "limit": 20}, headers=headers,
+    ))
+    assert resp.status_code == 200
+    assert len([s for s in statements if re.search(r"\bFROM attendance\b", s)]) == 1
+    assert not [s for s in statements if re.match(r"SELECT users\.\S+ .*FROM users\s*$", s, re.S)]
+    [record] = resp.json()
+    assert record["user"] == UserResponse.model_validate(target).model_dump(mode="json")
+
+    resp = await client.get("/admin/attendance", params={"user_id": "USR_UNKNOWN"}, headers=headers)
+    assert resp.json() == []
+
+
+@pytest.mark.asyncio
+async def test_face_metadata_endpoints_skip_blobs(client, admin_token, db_session):
+    """face-status and face/details read scalar columns; image sizes come from the DB."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    await register_user(client, "meta@test.com", "Pass123!", "Meta User")
+    user = db_session.query(User).filter(User.email == "meta@test.com").one()
+    db_session.add(FaceEmbedding(user_id=user.id, embeddings=b"\0" * 4096, count=2, dim=512, model="buffalo_l"))
+    db_session.add(_face_image(db_session, user.id, 1, b"x" * 1234))
+    db_session.add(_face_image(db_session, user.id, 2, b"y" * 99))
+    user.face_registered = True
+    db_session.commit()
+
+    status, statements = await _statements_during(lambda: client.get("/admin/users/face-status", headers=headers))
+    details, more = await _statements_during(
+        lambda: client.get(f"/admin/user/{user.unique_id}/face/details", headers=headers)
+    )
+    assert status.status_code == details.status_code == 200
+    for statement in statements + more:
+        assert "face_embeddings.embeddings" not in statement
+        assert "face_image_blobs" not in statement
+
+    entry = next(u for u in status.json()["users"] if u["user"]["email"] == "meta@test.com")
+    assert entry["registration_details"]["valid_images"] == 2
+    assert entry["face_images_count"] == 2
+    assert [i["size"] for i in details.json()["face_images"]] == [1234, 99]
+    assert details.json()["registration_info"]["model"] == "buffalo_l"
@@ -0,0 +1,554 @@
+"""
+Analytics: the SQL aggregate and NumPy columnar implementations must agree
+exactly with the Python reference implementations in app.services.analytics.
+"""
+
+import csv
+import gzip
+import io
+import random
+from collections import defaultdict
+from datetime import time, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql
+
+from app.core.time_utils import today_local
+from app.db.sql import date_bucket, time_seconds, weekday
+from app.models import Attendance, AttendanceDailySummary, User
+from app.services import analytics as svc
+from app.services import analytics_columnar as columnar
+from app.services import analytics_queries as queries
+from app.services import attendance_export
+from app.services.attendance_writes import rebuild_daily_summary
+from tests.conftest import engine, register_user
+
+DEPARTMENTS = ["Engineering", "Sales", None, "", "Engineering", "HR", "Sales"]
+
+
+def _seed(db, days: int = 12, seed: int = 7):
+    rng = random.Random(seed)
+    users = []
+    for i, dept in enumerate(DEPARTMENTS):
+        user = User(
+            email=f"a{i}@test.com", password="x", full_name=f"User {i}",
+            unique_id=f"USR_AN_{i}", department=dept, role="user", is_active=True,
+        )
+        db.add(user)
+        users.append(user)
+    db.commit()
+
+    today = today_local()
+    for offset in range(days, -1, -1):
+        day = today - timedelta(days=offset)
+        for user in users:
+            roll = rng.random()
+            if roll < 0.15:
+                continue  # no record at all
+            if roll < 0.35:
+                db.add(Attendance(user_id=user.id, date=day, status="absent"))
+                continue
+            if roll < 0.40:
+                time_in = None
+            elif roll < 0.45:
+                time_in = time(9, 0)  # exactly on the boundary
+            else:
+                time_in = time(rng.randint(7, 11), rng.randint(0, 59), rng.randint(0, 59), rng.randint(0, 999999))
+            db.add(Attendance(user_id=user.id, date=day, time_in=time_in, status="present"))
+    db.commit()
+    rebuild_daily_summary(db)
+    db.commit()
+    return users
+
+
+def _reference(db, start_date):
+    records = db.query(Attendance).filter(Attendance.date >= start_date).order_by(Attendance.id).all()
+    users = db.query(User).all()
+    return users, records
+
+
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_sql_aggregates_match_python(db_session, seed):
+    _seed(db_session, seed=seed)
+    end_date = today_local()
+    start_date = end_date - timedelta(days=7)
+    users, records = _reference(db_session, start_date)
+    total_users = len(users)
+
+    assert queries.live_stats(db_session) == svc.live_stats(users, records)
+    assert queries.department_breakdown(db_session) == svc.department_breakdown(users, records)
+    assert queries.daily_trends(db_session, start_date, end_date, total_users) == \
+        svc.daily_trends(records, start_date, end_date, total_users)
+    assert queries.weekly_patterns(db_session, start_date, end_date, total_users) == \
+        svc.weekly_patterns(records, start_date, end_date, total_users)
+
+
+def test_weekly_patterns_ignore_rows_after_a_past_range(db_session):
+    _seed(db_session, days=20)
+    end_date = today_local() - timedelta(days=10)
+    start_date = end_date - timedelta(days=6)
+    total_users = db_session.query(User).count()
+    records = db_session.query(Attendance).filter(
+        Attendance.date >= start_date, Attendance.date <= end_date
+    ).order_by(Attendance.id).all()
+    assert db_session.query(Attendance).filter(Attendance.date > end_date).count() > 0
+
+    assert queries.weekly_patterns(db_session, start_date, end_date, total_users) == \
+        svc.weekly_patterns(records, start_date, end_date, total_users)
+
+
+def test_sql_aggregates_empty_database(db_session):
+    today = today_local()
+    assert queries.live_stats(db_session) == svc.live_stats([], [])
+    assert queries.department_breakdown(db_session) == []
+    assert queries.daily_trends(db_session, today, today, 0) == svc.daily_trends([], today, today, 0)
+    assert queries.weekly_patterns(db_session, today, today, 0) == svc.weekly_patterns([], today, today, 0)
+
+
+def _assert_columnar_matches(users, records, start_date, end_date):
+    frame = columnar.AttendanceFrame.from_objects(users, records)
+    total_users = len(users)
+    assert columnar.live_stats(frame) == svc.live_stats(users, records)
+    assert columnar.department_breakdown(frame) == svc.department_breakdown(users, records)
+    assert columnar.daily_trends(frame, start_date, end_date, total_users) == \
+        svc.daily_trends(records, start_date, end_date, total_users)
+    assert columnar.weekly_patterns(frame, start_date, end_date, total_users) == \
+        svc.weekly_patterns(records, start_date, end_date, total_users)
+    assert columnar.user_performance(frame) == svc.user_performance(users, records)
+    assert columnar.detect_anomalies(frame) == svc.detect_anomalies(records, users)
+    assert columnar.recommendations(frame) == svc.recommendations(records, users)
+
+
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_columnar_matches_python(db_session, seed):
+    _seed(db_session, seed=seed)
+    end_date = today_local()
+    start_date = end_date - timedelta(days=7)
+    users, records = _reference(db_session, start_date)
+    _assert_columnar_matches(users, records, start_date, end_date)
+
+    loaded = columnar.AttendanceFrame.load(db_session, start_date)
+    assert columnar.user_performance(loaded) == svc.user_performance(users, records)
+    assert columnar.detect_anomalies(loaded) == svc.detect_anomalies(records, users)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_columnar_matches_python_edge_cases(seed):
+    """Sub-second times at the cut-offs, hour ties, orphaned records, unknown statuses."""
+    rng = random.Random(seed)
+    today = today_local()
+    users = [
+        SimpleNamespace(id=i * 3 + 1, full_name=f"U{i}", department=rng.choice(DEPARTMENTS))
+        for i in range(15)
+    ]
+    user_ids = [u.id for u in users] + [999, 1000]  # the last two no longer exist
+    times = [None, time(9, 0), time(9, 0, 0, 1), time(9, 15), time(9, 15, 0, 1), time(8, 59, 59, 999999)]
+    records = []
+    for _ in range(400):
+        day = today - timedelta(days=rng.randint(0, 20))
+        status = rng.choice(["present", "present", "present", "absent", "excused"])
+        if rng.random() < 0.4:
+            time_in = rng.choice(times)
+        else:
+            time_in = time(rng.choice([8, 10]), rng.randint(0, 59), rng.randint(0, 59))
+        records.append(SimpleNamespace(user_id=rng.choice(user_ids), date=day, time_in=time_in, status=status))
+    _assert_columnar_matches(users, records, today - timedelta(days=14), today)
+
+
+def test_columnar_empty():
+    today = today_local()
+    _assert_columnar_matches([], [], today, today)
+
+
+def _python_trends(records, start_date, end_date, total_users, granularity):
+    """Reference roll-up: average the per-day figures' inputs over each bucket."""
+    present, on_time = defaultdict(set), defaultdict(int)
+    for r in records:
+        if r.status == "present" and start_date <= r.date <= end_date:
+            bucket = queries.bucket_start(r.date, granularity)
+            present[bucket].add((r.user_id, r.date))
+            if r.time_in and r.time_in <= svc.WORK_START:
+                on_time[bucket] += 1
+    days = defaultdict(int)
+    day = start_date
+    while day <= end_date:
+        days[queries.bucket_start(day, granularity)] += 1
+        day += timedelta(days=1)
+    fmt = "%b %Y" if granularity == "month" else "%b %d"
+    return [
+        {
+            "date": bucket.strftime(fmt),
+            "attendance": round(len(present[bucket]) / (total_users * n) * 100, 1) if total_users else 0,
+            "onTime": round(on_time[bucket] / len(present[bucket]) * 100, 1) if present[bucket] else 0,
+        }
+        for bucket, n in sorted(days.items())
+    ]
+
+
+@pytest.mark.parametrize("granularity", ["day", "week", "month"])
+def test_trend_buckets_match_python(db_session, granularity):
+    _seed(db_session, days=70, seed=3)
+    end_date = today_local() - timedelta(days=2)
+    start_date = end_date - timedelta(days=60)
+    users, records = _reference(db_session, start_date)
+
+    out = queries.trends(db_session, start_date, end_date, len(users), granularity)
+    assert out == _python_trends(records, start_date, end_date, len(users), granularity)
+    if granularity == "day":
+        assert out == svc.daily_trends(
+            [r for r in records if r.date <= end_date], start_date, end_date, len(users)
+        )
+
+
+def test_date_bucket_postgres_dialect():
+    pg = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=postgresql.dialect()))
+    week = str(date_bucket(pg, Attendance.date, "week").compile(dialect=postgresql.dialect()))
+    assert "date_trunc" in week and "CAST" in week
+    wd = str(weekday(pg, Attendance.date).compile(dialect=postgresql.dialect()))
+    assert "EXTRACT(isodow FROM attendance.date)" in wd
+
+
+@pytest.mark.parametrize("seed", [1, 7, 42, 99])
+def test_sql_user_rankings_match_python(db_session, seed):
+    users = _seed(db_session, days=20, seed=seed)
+    # Push two users below the 60% anomaly threshold.
+    for user in users[:2]:
+        for record in db_session.query(Attendance).filter(Attendance.user_id == user.id).all()[::2]:
+            record.status = "absent"
+    db_session.commit()
+    end_date = today_local()
+    for window in (7, 20):
+        start_date = end_date - timedelta(days=window)
+        users, records = _reference(db_session, start_date)
+        assert queries.user_performance(db_session, start_date, end_date) == svc.user_performance(users, records)
+        flagged = svc.detect_anomalies(records, users)
+        assert queries.detect_anomalies(db_session, start_date, end_date) == flagged
+    assert flagged
+
+
+def test_sql_streaks_across_gaps(db_session):
+    user = User(email="s@test.com", password="x", full_name="Streaky", unique_id="USR_STREAK", role="user")
+    db_session.add(user)
+    db_session.commit()
+    today = today_local()
+    # Present 9..7 days ago, gap, then 4..0 days ago -> streak 5.
+    for offset in [9, 8, 7, 4, 3, 2, 1, 0]:
+        db_session.add(Attendance(user_id=user.id, date=today - timedelta(days=offset), status="present"))
+    db_session.commit()
+
+    top = queries.user_performance(db_session, today - timedelta(days=30), today)
+    assert top[0]["streak"] == 5 and top[0]["presentDays"] == 8
+
+
+def test_rankings_postgres_dialect():
+    pg = postgresql.dialect()
+    fake = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=pg))
+    streaks = queries._current_streaks(fake, today_local(), today_local())
+    sql = str(select(streaks).compile(dialect=pg))
+    assert "row_number() OVER (PARTITION BY" in sql
+    assert "DATE '1970-01-01'" in sql
+
+
+def test_time_seconds_postgres_dialect():
+    pg = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=postgresql.dialect()))
+    sql = str(time_seconds(pg, Attendance.time_in).compile(dialect=postgresql.dialect()))
+    assert "floor(EXTRACT(epoch FROM attendance.time_in))" in sql
+
+
+@pytest.mark.asyncio
+async def test_dashboard_endpoint(client, admin_token):
+    resp = await client.get(
+        "/analytics/dashboard?period=week",
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["liveStats"]["totalEmployees"] == 1
+    assert len(body["dailyTrends"]) == 8
+
+
+def _summary_rows(db):
+    return sorted(
+        (r.date, r.department, r.present_count, r.absent_count, r.on_time_count, r.late_count, r.arrival_seconds)
+        for r in db.query(AttendanceDailySummary).all()
+        if any((r.present_count, r.absent_count, r.on_time_count, r.late_count, r.arrival_seconds))
+    )
+
+
+@pytest.mark.asyncio
+async def test_daily_summary_tracks_admin_writes(client, admin_token, db_session):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(3):
+        await register_user(client, f"s{i}@test.com", "UserPass1!", f"Summary {i}")
+    users = db_session.query(User).filter(User.email.like("s%@test.com")).order_by(User.id).all()
+
+    assert (await client.post("/admin/mark-absent", headers=headers)).status_code == 200
+    resp = await client.post(
+        f"/admin/attendance/mark-present/{users[0].unique_id}", data={"time_in": "08:45"}, headers=headers,
+    )
+    assert resp.status_code == 200
+
+    db_session.expire_all()
+    ids = [a.id for a in db_session.query(Attendance).filter(Attendance.user_id.in_([u.id for u in users[1:]]))]
+    resp = await client.put(f"/admin/attendance/{ids[0]}", data={"status": "present", "time_in": "09:30"}, headers=headers)
+    assert resp.status_code == 200
+    resp = await client.post(
+        "/admin/attendance/bulk-update", data={"record_ids": ids, "status": "present", "time_in": "10:05"}, headers=headers,
+    )
+    assert resp.status_code == 200
+    assert (await client.delete(f"/admin/user/{users[2].unique_id}", headers=headers)).status_code == 200
+
+    db_session.expire_all()
+    incremental = _summary_rows(db_session)
+    assert incremental  # writes above must have produced summary rows
+    rebuild_daily_summary(db_session)
+    db_session.commit()
+    assert _summary_rows(db_session) == incremental
+
+
+@pytest.mark.asyncio
+async def test_report_and_anomaly_endpoints(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    resp = await client.get("/analytics/reports/automated?report_type=weekly", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["summary"] == {"totalEmployees": 1, "totalRecords": 0, "attendanceRate": 0.0}
+
+    resp = await client.get("/analytics/anomalies?days=7", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["anomalies"] == []
+
+
+@pytest.mark.asyncio
+async def test_dashboard_cache_revalidation(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    first = await client.get("/analytics/dashboard?period=week", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+
+    again = await client.get("/analytics/dashboard?period=week", headers=headers)
+    assert again.headers["etag"] == etag
+    assert again.json() == first.json()
+
+    resp = await client.get("/analytics/dashboard?period=week", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+    resp = await client.get(
+        "/analytics/dashboard?period=week",
+        headers={**headers, "If-Modified-Since": first.headers["last-modified"]},
+    )
+    assert resp.status_code == 304
+
+    # An attendance write invalidates cached results.
+    admin = await client.get("/user/profile", headers=headers)
+    resp = await client.post(
+        f"/admin/attendance/mark-present/{admin.json()['unique_id']}", data={"time_in": "08:30"}, headers=headers,
+    )
+    assert resp.status_code == 200
+    resp = await client.get("/analytics/dashboard?period=week", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+    assert resp.json()["liveStats"]["currentlyPresent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rebuilt_results_keep_their_etag(client, admin_token):
+    """A rebuild of unchanged data (e.g. after the TTL) still answers 304, though generatedAt moved on."""
+    from app.services.analytics_cache import cache
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for url in ("/analytics/dashboard?period=week", "/analytics/export?format=csv", "/analytics/reports/automated"):
+        first = await client.get(url, headers=headers)
+        assert first.status_code == 200
+        cache.clear()
+        rebuilt = await client.get(url, headers=headers)
+        assert rebuilt.content != first.content  # a new generation timestamp
+        assert rebuilt.headers["etag"] == first.headers["etag"]
+        cache.clear()
+        resp = await client.get(url, headers={**headers, "If-None-Match": first.headers["etag"]})
+        assert resp.status_code == 304
+
+
+def test_result_cache_lru_and_ttl(monkeypatch):
+    from app.services import analytics_cache
+
+    cache = analytics_cache.ResultCache(max_entries=2, ttl_seconds=10)
+    for key in ("a", "b"):
+        cache.put(key, key.encode(), "text/plain", {})
+    assert cache.get("a").body == b"a"  # "a" is now most recently used
+    cache.put("c", b"c", "text/plain", {})
+    assert cache.get("b") is None and len(cache) == 2
+
+    now = analytics_cache.time.monotonic()
+    monkeypatch.setattr(analytics_cache.time, "monotonic", lambda: now + 11)
+    assert cache.get("a") is None and cache.get("c") is None
+
+
+def test_version_bumps_only_on_commit(db_session):
+    from app.services import analytics_cache
+
+    before = analytics_cache.data_version()
+    db_session.query(User).count()  # open a transaction
+    analytics_cache.mark_changed(db_session)
+    db_session.rollback()
+    db_session.query(User).count()
+    db_session.commit()
+    assert analytics_cache.data_version() == before
+
+    db_session.query(User).count()
+    analytics_cache.mark_changed(db_session)
+    db_session.commit()
+    assert analytics_cache.data_version() == before + 1
+
+
+@pytest.mark.asyncio
+async def test_dashboard_sections_parameter(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    resp = await client.get("/analytics/dashboard?sections=liveStats,dailyTrends", headers=headers)
+    assert resp.status_code == 200
+    assert set(resp.json()) == {"liveStats", "dailyTrends", "period", "range", "generatedAt"}
+
+    resp = await client.get("/analytics/dashboard?sections=liveStats,bogus", headers=headers)
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_csv_export_issues_one_aggregate_query(client, admin_token):
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        resp = await client.get(
+            "/analytics/export?format=csv", headers={"Authorization": f"Bearer {admin_token}"},
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert resp.status_code == 200
+    assert "total_employees,1" in resp.text
+    assert len([s for s in statements if "attendance" in s]) == 1
+
+
+@pytest.mark.asyncio
+async def test_records_export_streams_csv(client, admin_token, db_session):
+    users = _seed(db_session, days=4)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    start = today_local() - timedelta(days=2)
+    expected = (
+        db_session.query(Attendance)
+        .filter(Attendance.date >= start)
+        .order_by(Attendance.date, Attendance.id)
+        .all()
+    )
+
+    resp = await client.get(f"/analytics/export/records?start_date={start.isoformat()}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(resp.text)))
+    assert rows[0] == list(attendance_export.COLUMNS)
+    assert len(rows) - 1 == len(expected)
+    by_id = {u.id: u for u in users}
+    first = expected[0]
+    assert rows[1][:3] == [first.date.isoformat(), by_id[first.user_id].unique_id, by_id[first.user_id].full_name]
+
+    resp = await client.get(
+        f"/analytics/export/records?start_date={start.isoformat()}&compress=gzip", headers=headers,
+    )
+    assert resp.status_code == 200
+    assert list(csv.reader(io.StringIO(gzip.decompress(resp.content).decode()))) == rows
+
+    batches = list(attendance_export.record_batches(db_session, start, today_local(), batch_size=4))
+    assert all(len(b) <= 4 for b in batches)
+    assert sum(len(b) for b in batches) == len(expected)
+
+    resp = await client.get("/analytics/export/records?start_date=2024-13-01", headers=headers)
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_records_export_reads_every_batch(client, admin_token, db_session, monkeypatch):
+    """The stream reads the request's session to the end, many batches after the endpoint returned."""
+    _seed(db_session, days=6)
+    start = today_local() - timedelta(days=6)
+    expected = db_session.query(Attendance).filter(Attendance.date >= start).count()
+    monkeypatch.setattr(attendance_export, "BATCH_SIZE", 3)
+    assert expected > 3 * 3
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for fmt in ("csv", "npz"):
+        resp = await client.get(f"/analytics/export/records?start_date={start.isoformat()}&format={fmt}", headers=headers)
+        assert resp.status_code == 200
+        if fmt == "csv":
+            assert len(list(csv.reader(io.StringIO(resp.text)))) - 1 == expected
+        else:
+            assert len(attendance_export.read_npz(io.BytesIO(resp.content))["date"]) == expected
+
+
+@pytest.mark.asyncio
+async def test_records_export_npz(client, admin_token, db_session):
+    _seed(db_session, days=3)
+    start = today_local() - timedelta(days=3)
+    expected = (
+        db_session.query(Attendance)
+        .filter(Attendance.date >= start)
+        .order_by(Attendance.date, Attendance.id)
+        .all()
+    )
+
+    resp = await client.get(
+        f"/analytics/export/records?start_date={start.isoformat()}&format=npz",
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert resp.status_code == 200
+    columns = attendance_export.read_npz(io.BytesIO(resp.content))
+    assert len(columns["date"]) == len(expected)
+    assert columns["date"].tolist() == [r.date for r in expected]
+    assert columns["status"].tolist() == [r.status for r in expected]
+    time_in = columns["time_in"]
+    assert np.isnat(time_in).tolist() == [r.time_in is None for r in expected]
+    assert [t.item() for t in time_in[~np.isnat(time_in)]] == [
+        timedelta(hours=t.hour, minutes=t.minute, seconds=t.second, microseconds=t.microsecond)
+        for t in (r.time_in for r in expected) if t is not None
+    ]
+
+
+def test_arrow_formats_round_trip():
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    rows = [
+        (today_local(), "U1", "Ann", None, "absent", None),
+        (today_local(), "U2", "Bob", "Sales", "present", time(8, 59, 1, 5)),
+    ]
+    for fmt in ("parquet", "arrow"):
+        data = b"".join(attendance_export.columnar_stream(iter([rows[:1], rows[1:]]), fmt))
+        if fmt == "parquet":
+            table = pq.read_table(io.BytesIO(data))
+        else:
+            table = pa.ipc.open_stream(data).read_all()
+        assert table.column_names == list(attendance_export.COLUMNS)
+        assert [tuple(r.values()) for r in table.to_pylist()] == rows
+
+
+@pytest.mark.asyncio
+async def test_dashboard_custom_range(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    resp = await client.get(
+        "/analytics/dashboard?start=2024-01-01&end=2024-12-31&granularity=month&sections=dailyTrends",
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [p["date"] for p in body["dailyTrends"]][:2] == ["Jan 2024", "Feb 2024"]
+    assert len(body["dailyTrends"]) == 12
+    assert body["range"] == {"start": "2024-01-01", "end": "2024-12-31", "granularity": "month"}
+
+    resp = await client.get("/analytics/dashboard?granularity=year", headers=headers)
+    assert resp.status_code == 400
+    resp = await client.get("/analytics/dashboard?start=2024-02-01&end=2024-01-01", headers=headers)
+    assert resp.status_code == 400
@@ -1,20 +1,37 @@
 """
 Attendance marking rules:
   - Rejects frame without liveness_verified=true (403)
-  - Rejects unrecognized face (404)
+  - Rejects unrecognized face (404), reporting no-face frames as their own outcome
   - Marks a recognized user as present (200)
   - Blocks duplicate marking of the same user on the same day (400)
   - Allows the system to override an admin-set 'absent' to 'present' via face scan
+  - Marks with a single attendance upsert; (user_id, date) is unique
+  - The upsert reports insert vs update explicitly (xmax on PostgreSQL)
+  - Scheduled mark-absent: one INSERT ... SELECT, next-run arithmetic, bad config
+  - Sheds recognition with 503 + Retry-After when admission control is saturated
+  - Reports per-stage timings in the Server-Timing header and stage histograms
+  - Exposes recognition outcomes and route latency on /metrics
 """
 
 import io
 import os
+import re
 from datetime import date, time
 from unittest.mock import patch, MagicMock
 
 import pytest
 
-from tests.conftest import register_user
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+from app.core import timing
+from app.core.time_utils import seconds_until, today_local
+from app.models import Attendance, User
+from app.services import absence_job
+from app.services.admission import AdmissionController, Overloaded, admission
+from app.services.attendance_writes import upsert_attendance
+from tests.conftest import TestingSessionLocal, engine, register_user
 
 # A minimal valid JPEG in bytes (1x1 white pixel).
 _TINY_JPEG = (
@@ -57,8 +74,8 @@ async def test_attendance_rejects_without_liveness(client):
 async def test_attendance_rejects_unrecognized_face(client):
     """With liveness verified but face not in any enrolled encoding → 404."""
     with patch(
-        "app.services.face_recognition.face_service.recognize",
-        return_value=None,
+        "app.services.face_recognition.face_service.recognize_frame",
+        return_value=(None, "no_match"),
     ):
         data = {"liveness_verified": "true"}
         files = [_jpeg_file()]
@@ -75,8 +92,8 @@ async def test_attendance_marks_present(client):
     uid = user_data["unique_id"]
 
     with patch(
-        "app.services.face_recognition.face_service.recognize",
-        return_value={"user_id": uid, "confidence": 88.0, "similarity": 0.88},
+        "app.services.face_recognition.face_service.recognize_frame",
+        return_value=({"user_id": uid, "confidence": 88.0, "similarity": 0.88}, "match"),
     ):
         data = {"liveness_verified": "true"}
         files = [_jpeg_file()]
@@ -97,8 +114,8 @@ async def test_attendance_blocks_duplicate(client):
     mock_result = {"user_id": uid, "confidence": 85.0, "similarity": 0.85}
 
     with patch(
-        "app.services.face_recognition.face_service.recognize",
-        return_value=mock_result,
+        "app.services.face_recognition.face_service.recognize_frame",
+        return_value=(mock_result, "match"),
     ):
         data = {"liveness_verified": "true"}
         # First mark — succeeds
@@ -117,8 +134,8 @@ async def test_attendance_low_confidence_retry(client):
     reg = await register_user(client, "lowconf@test.com", "Pass123!", "Low Conf")
     uid = reg["user"]["unique_id"]
     with patch(
-        "app.services.face_recognition.face_service.recognize",
-        return_value={"user_id": uid, "confidence": 45.0, "similarity": 0.45},
+        "app.services.face_recognition.face_service.recognize_frame",
+        return_value=({"user_id": uid, "confidence": 45.0, "similarity": 0.45}, "match"),
     ):
         data = {"liveness_verified": "true"}
         resp = await client.post("/attendance/mark", data=data, files=[_jpeg_file()])
@@ -144,8 +161,8 @@ async def test_attendance_overrides_absent_to_present(client, admin_token):
     # Check they're now absent
     mock_result = {"user_id": uid, "confidence": 90.0, "similarity": 0.90}
     with patch(
-        "app.services.face_recognition.face_service.recognize",
-        return_value=mock_result,
+        "app.services.face_recognition.face_service.recognize_frame",
+        return_value=(mock_result, "match"),
     ):
         data = {"liveness_verified": "true"}
         resp = await client.post("/attendance/mark", data=data, files=[_jpeg_file()])
@@ -153,3 +170,170 @@ async def test_attendance_overrides_absent_to_present(client, admin_token):
     assert resp.status_code == 200
     assert resp.json()["attendance"]["status"] == "present"
     assert "absent to present" in resp.json()["message"].lower()
+
+
+@pytest.mark.asyncio
+async def test_attendance_mark_is_one_upsert(client, admin_token, db_session):
+    """Marking writes the attendance table once; mark-absent only fills gaps."""
+    reg = await register_user(client, "upsert@test.com", "Pass123!", "Upsert User")
+    uid = reg["user"]["unique_id"]
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with patch(
+            "app.services.face_recognition.face_service.recognize_frame",
+            return_value=({"user_id": uid, "confidence": 90.0, "similarity": 0.90}, "match"),
+        ):
+            resp = await client.post("/attendance/mark", data={"liveness_verified": "true"}, files=[_jpeg_file()])
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert resp.status_code == 200
+    writes = [s for s in statements if re.search(r"\battendance\b", s) and not s.lstrip().startswith("SELECT")]
+    assert len(writes) == 1 and "ON CONFLICT" in writes[0]
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    resp = await client.post("/admin/mark-absent", headers=headers)
+    assert resp.json()["message"].startswith("Marked 1 users")  # only the admin was unmarked
+    resp = await client.post("/admin/mark-absent", headers=headers)
+    assert resp.json()["message"].startswith("Marked 0 users")
+
+    user = db_session.query(User).filter(User.unique_id == uid).one()
+    existing = db_session.query(Attendance).filter(Attendance.user_id == user.id).one()
+    db_session.add(Attendance(user_id=user.id, date=existing.date, status="absent"))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+
+def test_upsert_attendance_reports_inserts(db_session, user_token):
+    user_id = db_session.query(User.id).filter(User.email == "user@test.com").scalar()
+    day = date(2024, 3, 4)
+    attendance, inserted = upsert_attendance(db_session, user_id, day, "absent", None)
+    assert inserted and attendance.status == "absent"
+    attendance, inserted = upsert_attendance(db_session, user_id, day, "present", time(9, 5), replace_status="absent")
+    assert not inserted and attendance.status == "present" and attendance.time_in == time(9, 5)
+    assert upsert_attendance(db_session, user_id, day, "present", time(9, 30), replace_status="absent") == (None, False)
+    db_session.rollback()
+
+    # PostgreSQL takes the flag from the upsert itself, with no prior read.
+    statements = []
+    pg = postgresql.dialect()
+
+    def execute(stmt, *args, **kwargs):
+        statements.append(str(stmt.compile(dialect=pg)))
+        return MagicMock(first=MagicMock(return_value=None))
+
+    with patch("app.db.sql.dialect_name", return_value="postgresql"), patch.object(db_session, "execute", execute):
+        upsert_attendance(db_session, user_id, day, "present", time(9, 5))
+    assert len(statements) == 1 and "RETURNING" in statements[0] and "xmax = 0 AS inserted" in statements[0]
+
+
+@pytest.mark.asyncio
+async def test_scheduled_mark_absent_is_one_statement(client, db_session):
+    for i in range(3):
+        await register_user(client, f"job{i}@test.com", "Pass123!", f"Job {i}")
+    inactive = db_session.query(User).filter(User.email == "job2@test.com").one()
+    inactive.is_active = False
+    db_session.commit()
+
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        assert absence_job.run_once(today_local(), TestingSessionLocal) == 2
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    touching = [s for s in statements if re.search(r"\battendance\b", s)]
+    assert len(touching) == 1 and "INSERT INTO attendance" in touching[0] and "NOT (EXISTS" in touching[0]
+    assert absence_job.run_once(today_local(), TestingSessionLocal) == 0
+
+
+def test_mark_absent_schedule_parsing():
+    assert absence_job.start("") is None
+    with pytest.raises(ValueError):
+        absence_job.parse_time("25:99")
+    assert absence_job.parse_time(" 23:30") == time(23, 30)
+    assert 0 < seconds_until(time(0, 0)) <= 25 * 3600
+
+
+@pytest.mark.asyncio
+async def test_attendance_shed_when_over_deadline(client):
+    """If the estimated wait exceeds the deadline, reject fast with 503 + Retry-After."""
+    with patch.object(admission, "deadline_seconds", 0.0), patch(
+        "app.services.face_recognition.face_service.recognize_frame",
+    ) as recognize:
+        data = {"liveness_verified": "true"}
+        resp = await client.post("/attendance/mark", data=data, files=[_jpeg_file()])
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+    recognize.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_admission_queue_bound_and_service_estimate():
+    controller = AdmissionController(concurrency=1, max_queue=0, deadline_seconds=60.0)
+    controller._admit(cost=1)  # occupies the only slot
+    with pytest.raises(Overloaded) as exc:
+        controller._admit(cost=1)
+    assert exc.value.reason == "queue_full"
+
+    controller = AdmissionController(concurrency=1, max_queue=4, deadline_seconds=60.0,
+                                     initial_cost_seconds=1.0, ewma_alpha=1.0)
+    assert await controller.run(lambda a, b: a + b, 2, 3, cost=2) == 5
+    assert controller.cost_per_unit < 0.1  # learned from the measured (fast) service time
+    assert controller.estimated_wait() == 0
+
+
+@pytest.mark.asyncio
+async def test_attendance_server_timing_stages(client):
+    reg = await register_user(client, "timed@test.com", "Pass123!", "Timed User")
+    uid = reg["user"]["unique_id"]
+    before = timing.STAGE_SECONDS.count(route="/attendance/mark", stage="db")
+    with patch(
+        "app.services.face_recognition.face_service.recognize_frame",
+        return_value=({"user_id": uid, "confidence": 90.0, "similarity": 0.90}, "match"),
+    ):
+        data = {"liveness_verified": "true"}
+        resp = await client.post("/attendance/mark", data=data, files=[_jpeg_file()])
+    assert resp.status_code == 200
+    stages = {part.split(";")[0] for part in resp.headers["Server-Timing"].split(", ")}
+    assert {"parse", "write", "queue", "db", "total"} <= stages
+    assert timing.STAGE_SECONDS.count(route="/attendance/mark", stage="db") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_counts_outcomes(client):
+    reg = await register_user(client, "metrics@test.com", "Pass123!", "Metrics User")
+    uid = reg["user"]["unique_id"]
+    with patch(
+        "app.services.face_recognition.face_service.recognize_frame",
+        return_value=({"user_id": uid, "confidence": 90.0, "similarity": 0.90}, "match"),
+    ):
+        data = {"liveness_verified": "true"}
+        await client.post("/attendance/mark", data=data, files=[_jpeg_file()])
+        await client.post("/attendance/mark", data=data, files=[_jpeg_file()])
+    with patch(
+        "app.services.face_recognition.face_service.get_embedding",
+        return_value=None,
+    ):
+        resp = await client.post("/attendance/mark", data=data, files=[_jpeg_file()])
+    assert resp.status_code == 404
+    assert "no face" in resp.json()["detail"].lower()
+
+    resp = await client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert 'attendance_recognition_outcomes_total{outcome="already_marked"}' in body
+    assert 'attendance_recognition_outcomes_total{outcome="no_face"}' in body
+    assert 'http_requests_total{method="POST",route="/attendance/mark",status="400"}' in body
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/attendance/mark",le="+Inf"}' in body
+    assert "db_pool_checkouts_total" in body
+    assert "inference_queue_depth 0" in body
@@ -0,0 +1,166 @@
+"""
+Per-user attendance bitmaps:
+  - Bit helpers: month masks, streaks within and across years
+  - Incremental maintenance through the admin write paths matches a rebuild
+  - A (user, year) row created concurrently keeps the other writer's bits
+  - /user/attendance/stats counts (from bitmaps) match the attendance rows
+"""
+
+import random
+from datetime import date, time, timedelta
+
+import pytest
+
+from app.models import Attendance, AttendanceBitmap, User
+from app.services import attendance_bitmaps as bitmaps
+from app.services.analytics import WORK_START
+from app.services import attendance_writes
+from app.services.attendance_writes import AttendanceChange, rebuild_attendance_bitmaps
+from tests.conftest import register_user
+
+
+def _bits(*days: date) -> int:
+    out = 0
+    for day in days:
+        out |= 1 << bitmaps.day_bit(day)
+    return out
+
+
+def test_month_mask_covers_exactly_the_month():
+    for year in (2023, 2024):
+        for month in range(1, 13):
+            mask = bitmaps.month_mask(year, month)
+            first = date(year, month, 1)
+            days = [first + timedelta(days=i) for i in range(40)]
+            assert mask == _bits(*[d for d in days if d.month == month])
+    assert bitmaps.month_mask(2024, 12).bit_length() == 366
+    assert bitmaps.month_mask(2023, 12).bit_length() == 365
+
+
+def test_current_streak_scans_back_across_years():
+    assert bitmaps.current_streak({}) == 0
+    assert bitmaps.current_streak({2024: 0}) == 0
+
+    run = [date(2024, 3, 10) - timedelta(days=i) for i in range(4)]
+    assert bitmaps.current_streak({2024: _bits(*run, date(2024, 3, 1))}) == 4
+
+    # Dec 30-31 2023 + Jan 1-3 2024, with an older break on Dec 28.
+    present = {
+        2023: _bits(date(2023, 12, 30), date(2023, 12, 31), date(2023, 12, 28)),
+        2024: _bits(date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)),
+    }
+    assert bitmaps.current_streak(present) == 5
+    # A whole leap year present continues into the year before.
+    present = {2024: (1 << 366) - 1, 2023: _bits(date(2023, 12, 31))}
+    assert bitmaps.current_streak(present) == 367
+
+
+def _bitmap_rows(db):
+    return sorted(
+        (r.user_id, r.year, bitmaps.from_bytes(r.present), bitmaps.from_bytes(r.absent), bitmaps.from_bytes(r.late))
+        for r in db.query(AttendanceBitmap).all()
+    )
+
+
+@pytest.mark.asyncio
+async def test_bitmaps_track_admin_writes(client, admin_token, db_session):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(3):
+        await register_user(client, f"b{i}@test.com", "UserPass1!", f"Bitmap {i}")
+    users = db_session.query(User).filter(User.email.like("b%@test.com")).order_by(User.id).all()
+    user_ids = [u.id for u in users]
+
+    assert (await client.post("/admin/mark-absent", headers=headers)).status_code == 200
+    resp = await client.post(
+        f"/admin/attendance/mark-present/{users[0].unique_id}", data={"time_in": "09:45"}, headers=headers,
+    )
+    assert resp.status_code == 200
+
+    db_session.expire_all()
+    ids = [a.id for a in db_session.query(Attendance).filter(Attendance.user_id == users[1].id)]
+    resp = await client.post(
+        "/admin/attendance/bulk-update", data={"record_ids": ids, "status": "present", "time_in": "08:05"}, headers=headers,
+    )
+    assert resp.status_code == 200
+    assert (await client.delete(f"/admin/user/{users[2].unique_id}", headers=headers)).status_code == 200
+
+    db_session.expire_all()
+    incremental = _bitmap_rows(db_session)
+    assert {row[0] for row in incremental} >= set(user_ids[:2])
+    assert user_ids[2] not in {row[0] for row in incremental}
+    rebuild_attendance_bitmaps(db_session)
+    db_session.commit()
+    assert _bitmap_rows(db_session) == incremental
+
+
+def test_bitmap_row_created_concurrently(db_session, user_token, monkeypatch):
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    theirs, ours = date(2024, 5, 6), date(2024, 5, 7)
+    lock = attendance_writes._lock_bitmaps
+
+    def racing_lock(db, keys):
+        # The first read finds no row; another writer inserts it before ours.
+        monkeypatch.setattr(attendance_writes, "_lock_bitmaps", lock)
+        db.add(AttendanceBitmap(
+            user_id=user.id, year=2024, present=bitmaps.to_bytes(_bits(theirs)),
+            absent=bitmaps.to_bytes(0), late=bitmaps.to_bytes(0),
+        ))
+        db.flush()
+        return {}
+
+    monkeypatch.setattr(attendance_writes, "_lock_bitmaps", racing_lock)
+    attendance_writes.record_changes(db_session, [
+        AttendanceChange(ours, user.id, None, None, None, "present", time(8, 30)),
+    ])
+    db_session.commit()
+    assert _bitmap_rows(db_session) == [(user.id, 2024, _bits(theirs, ours), 0, 0)]
+
+
+@pytest.mark.asyncio
+async def test_user_stats_come_from_bitmaps(client, user_token, db_session):
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    rng = random.Random(5)
+    start = date(2023, 11, 1)
+    for offset in range(120):
+        day = start + timedelta(days=offset)
+        roll = rng.random()
+        if roll < 0.2:
+            continue
+        if roll < 0.4:
+            db_session.add(Attendance(user_id=user.id, date=day, status="absent"))
+        else:
+            db_session.add(Attendance(
+                user_id=user.id, date=day, status="present", time_in=time(rng.randint(7, 10), rng.randint(0, 59)),
+            ))
+    db_session.commit()
+    rebuild_attendance_bitmaps(db_session)
+    db_session.commit()
+
+    rows = db_session.query(Attendance).filter(Attendance.user_id == user.id).all()
+    headers = {"Authorization": f"Bearer {user_token}"}
+    for params in ({}, {"year": 2024}, {"year": 2023, "month": 12}, {"month": 1}, {"year": 2022}):
+        expected = [
+            r for r in rows
+            if r.date.year == params.get("year", r.date.year) and r.date.month == params.get("month", r.date.month)
+        ]
+        present = sum(r.status == "present" for r in expected)
+        resp = await client.get("/user/attendance/stats", params=params, headers=headers)
+        assert resp.status_code == 200
+        stats = resp.json()["stats"]
+        assert stats["total_days"] == len(expected)
+        assert stats["present_days"] == present
+        assert stats["absent_days"] == sum(r.status == "absent" for r in expected)
+        assert stats["late_days"] == sum(r.status == "present" and r.time_in > WORK_START for r in expected)
+        assert stats["attendance_percentage"] == (round(present / len(expected) * 100, 2) if expected else 0)
+
+    present_days = {r.date for r in rows if r.status == "present"}
+    streak, day = 0, max(present_days)
+    while day in present_days:
+        streak, day = streak + 1, day - timedelta(days=1)
+    assert stats["current_streak"] == streak
+
+    monthly = (await client.get("/user/attendance/stats", params={"year": 2024}, headers=headers)).json()["stats"]["monthly"]
+    assert [m["total_days"] for m in monthly[:3]] == [
+        sum(r.date.year == 2024 and r.date.month == m for r in rows) for m in (1, 2, 3)
+    ]
+    assert (await client.get("/user/attendance/stats", params={"month": 13}, headers=headers)).status_code == 400
@@ -0,0 +1,239 @@
+"""
+Face image endpoint:
+  - /face/images/{id} serves full images and thumbnails with ETag / Cache-Control
+  - Responses must be revalidated, as SQLite reuses the ids of deleted images
+  - Thumbnails missing from older enrollments are generated once and stored
+  - Access is limited to the owner and admins
+  - Gallery listings carry URLs, not inlined payloads
+  - Enrollment stores normalized face crops; re-embedding them matches the
+    uploads (marked ``model``: needs the recognition model pack, skipped
+    without it; CI's model-tests job downloads it and runs ``-m model``)
+"""
+
+import os
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models import FaceImage, User
+from app.services.face_recognition import face_crop, face_service, make_thumbnail, normalize_face_image
+from app.services.image_store import get_store
+from app.services.inference import DetectedFace, align_chip
+from tests.conftest import login_user, register_user
+
+
+def _jpeg(width: int, height: int) -> bytes:
+    img = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def test_make_thumbnail_bounds_longest_side():
+    thumb = cv2.imdecode(np.frombuffer(make_thumbnail(_jpeg(640, 480), 160), np.uint8), cv2.IMREAD_COLOR)
+    assert thumb.shape[:2] == (120, 160)
+    small = cv2.imdecode(np.frombuffer(make_thumbnail(_jpeg(100, 80), 160), np.uint8), cv2.IMREAD_COLOR)
+    assert small.shape[:2] == (80, 100)
+    with pytest.raises(ValueError):
+        make_thumbnail(b"not an image")
+
+
+@pytest.mark.asyncio
+async def test_face_image_endpoint(client, user_token, admin_token, db_session):
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    full = _jpeg(640, 480)
+    store = get_store()
+    image = FaceImage(user_id=user.id, position=1, sha256=store.put(db_session, full), size=len(full))  # no thumbnail yet
+    db_session.add(image)
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    resp = await client.get(f"/face/images/{image.id}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.content == full
+    assert resp.headers["content-type"] == "image/jpeg"
+    assert resp.headers["cache-control"] == "private, no-cache"
+    etag = resp.headers["etag"]
+    assert etag == f'"{image.sha256}"'
+
+    resp = await client.get(f"/face/images/{image.id}", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == etag
+
+    thumb = await client.get(f"/face/images/{image.id}", params={"size": "thumb"}, headers=headers)
+    assert thumb.status_code == 200
+    assert len(thumb.content) < len(full)
+    assert thumb.headers["etag"] != etag
+    db_session.expire_all()
+    assert store.get(db_session, db_session.get(FaceImage, image.id).thumbnail_sha256) == thumb.content
+    again = await client.get(f"/face/images/{image.id}", params={"size": "thumb"}, headers=headers)
+    assert again.content == thumb.content
+
+    assert (await client.get(f"/face/images/{image.id}", params={"size": "huge"}, headers=headers)).status_code == 422
+    assert (await client.get("/face/images/999999", headers=headers)).status_code == 404
+
+    admin = await client.get(f"/face/images/{image.id}", headers={"Authorization": f"Bearer {admin_token}"})
+    assert admin.status_code == 200
+
+    await register_user(client, "other@test.com", "OtherPass1!", "Other User")
+    other_token = await login_user(client, "other@test.com", "OtherPass1!")
+    other = await client.get(f"/face/images/{image.id}", headers={"Authorization": f"Bearer {other_token}"})
+    assert other.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_face_image_reused_id_is_revalidated(client, user_token, db_session):
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    store = get_store()
+    first, second = _jpeg(32, 32), _jpeg(48, 48)
+    image = FaceImage(user_id=user.id, position=1, sha256=store.put(db_session, first), size=len(first))
+    db_session.add(image)
+    db_session.commit()
+    image_id, old_etag = image.id, f'"{image.sha256}"'
+    db_session.delete(image)
+    db_session.commit()
+    reused = FaceImage(user_id=user.id, position=1, sha256=store.put(db_session, second), size=len(second))
+    db_session.add(reused)
+    db_session.commit()
+    assert reused.id == image_id  # SQLite reuses the freed id
+
+    headers = {"Authorization": f"Bearer {user_token}", "If-None-Match": old_etag}
+    resp = await client.get(f"/face/images/{image_id}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.content == second
+
+
+@pytest.mark.asyncio
+async def test_galleries_list_urls(client, user_token, admin_token, db_session):
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    full = _jpeg(64, 64)
+    store = get_store()
+    image = FaceImage(
+        user_id=user.id, position=1, sha256=store.put(db_session, full), size=len(full),
+        thumbnail_sha256=store.put(db_session, make_thumbnail(full)),
+    )
+    db_session.add(image)
+    user.face_registered = True
+    db_session.commit()
+
+    resp = await client.get("/user/face/images", headers={"Authorization": f"Bearer {user_token}"})
+    assert resp.status_code == 200
+    [face] = resp.json()["faces"]
+    assert "image_data" not in face
+    assert face["id"] == image.id
+    assert face["image_url"] == f"/face/images/{image.id}?size=full"
+    assert face["thumbnail_url"] == f"/face/images/{image.id}?size=thumb"
+
+    resp = await client.get(
+        f"/admin/user/{user.unique_id}/face/images", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert resp.status_code == 200
+    [entry] = resp.json()["images"]
+    assert "data" not in entry
+    assert entry["thumbnail_url"] == face["thumbnail_url"]
+
+
+def _photo(width: int, height: int) -> np.ndarray:
+    """A camera-like frame: smooth gradients plus mild sensor noise."""
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 127 // (width + height)], axis=-1)
+    noise = np.random.default_rng(1).normal(0, 6, base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def test_normalize_face_image(monkeypatch):
+    img = _photo(1000, 800)
+    crop = face_crop(img, (450, 300, 550, 420), margin=0.5)
+    assert crop.shape[:2] == (240, 240)  # the longer (120 px) side doubled, centred on the box
+    assert np.array_equal(crop, img[240:480, 380:620])
+    assert face_crop(img, (0, 0, 100, 100), margin=0.5).shape[:2] == (150, 150)  # clipped at the corner
+
+    monkeypatch.setattr(settings, "FACE_IMAGE_MAX_SIDE", 128)
+    data, content_type = normalize_face_image(img, (300, 200, 700, 600))
+    assert content_type == "image/jpeg"
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape[:2] == (128, 128)
+
+    monkeypatch.setattr(settings, "FACE_IMAGE_FORMAT", "webp")
+    webp, content_type = normalize_face_image(img, (300, 200, 700, 600))
+    assert content_type == "image/webp"
+    assert cv2.imdecode(np.frombuffer(webp, np.uint8), cv2.IMREAD_COLOR).shape[:2] == (128, 128)
+
+    monkeypatch.setattr(settings, "FACE_IMAGE_FORMAT", "png")
+    with pytest.raises(ValueError):
+        normalize_face_image(img, (300, 200, 700, 600))
+
+
+@pytest.mark.parametrize("store_original", [False, True])
+def test_enroll_stores_normalized_images(db_session, user_token, tmp_path, monkeypatch, store_original):
+    monkeypatch.setattr(settings, "FACE_STORE_ORIGINAL", store_original)
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    frame = _photo(1280, 960)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"upload_{i}.jpg"
+        path.write_bytes(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 98])[1].tobytes())
+        paths.append(str(path))
+    emb = np.zeros(512, dtype=np.float32)
+    emb[0] = 1.0
+    kps = np.array([[600, 470], [680, 470], [640, 510], [610, 550], [670, 550]], dtype=np.float32)
+    face = DetectedFace(np.array([560, 400, 720, 600], dtype=np.float32), kps, 0.9, emb)
+    metrics = {"det_score": 0.9, "face_size_px": 160, "sharpness": 250.0, "brightness": 120.0}
+    quality = {"is_acceptable": True, "overall_score": 88.5, "metrics": metrics, "issues": [], "recommendations": []}
+
+    with patch.object(face_service, "check_image_quality", return_value=quality), \
+            patch.object(face_service, "_detect_primary_face", return_value=(face, frame)):
+        result = face_service.enroll_user(db_session, user, paths)
+
+    images = db_session.query(FaceImage).filter(FaceImage.user_id == user.id).order_by(FaceImage.position).all()
+    assert len(images) == 3
+    upload_bytes = sum(os.path.getsize(p) for p in paths)
+    assert result["statistics"]["stored_image_bytes"] == sum(i.size for i in images) < upload_bytes / 4
+    store = get_store()
+    for image in images:
+        assert image.quality_score == 88.5
+        assert image.quality_details == metrics
+        stored = cv2.imdecode(np.frombuffer(store.get(db_session, image.sha256), np.uint8), cv2.IMREAD_COLOR)
+        assert stored.shape[:2] == (400, 400)
+        assert len(store.get(db_session, image.chip_sha256)) == 112 * 112 * 3
+        if store_original:
+            assert store.get(db_session, image.original_sha256) == open(paths[0], "rb").read()
+        else:
+            assert image.original_sha256 is None
+
+
+def _model_available() -> bool:
+    root = os.path.join(os.path.expanduser("~"), ".insightface", "models", settings.FACE_MODEL_PACK)
+    return os.path.isdir(root) and any(name.endswith(".onnx") for name in os.listdir(root))
+
+
+@pytest.mark.model
+@pytest.mark.skipif(not _model_available(), reason="recognition model pack not downloaded")
+@pytest.mark.parametrize("fmt", ["jpeg", "webp"])
+def test_normalized_images_reembed_like_originals(monkeypatch, fmt):
+    """Embeddings of the stored (normalized) images match those of the uploads."""
+    from insightface.data import get_image
+
+    monkeypatch.setattr(settings, "FACE_IMAGE_FORMAT", fmt)
+    backend = face_service.backend
+    similarities, stored, uploaded = [], 0, 0
+    for name in ("t1", "Tom_Hanks_54745"):
+        img = get_image(name)
+        uploaded += len(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 95])[1])
+        for face in backend.detect(img):
+            # The stored chip re-embeds exactly like detection + alignment did.
+            assert float(np.dot(backend.embed(align_chip(img, face.kps)[None])[0], face.normed_embedding)) > 0.999
+            data, _ = normalize_face_image(img, face.bbox)
+            stored += len(data)
+            crop = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            centre = np.array(crop.shape[1::-1]) / 2
+            again = min(backend.detect(crop), key=lambda f: np.linalg.norm((f.bbox[:2] + f.bbox[2:]) / 2 - centre))
+            similarities.append(float(np.dot(face.normed_embedding, again.normed_embedding)))
+
+    assert len(similarities) >= 3
+    print(f"{settings.FACE_MODEL_PACK} {fmt}: {len(similarities)} faces, similarity min {min(similarities):.4f} "
+          f"mean {np.mean(similarities):.4f}; {stored} stored vs {uploaded} uploaded bytes")
+    assert min(similarities) > 0.8
+    assert np.mean(similarities) > 0.9
+    assert stored < uploaded
@@ -0,0 +1,148 @@
+"""
+Content-addressed image store:
+  - Both backends dedupe by SHA-256; the filesystem one shards by key prefix
+  - migrate() moves referenced blobs between backends in batches
+  - prune() / discard() remove only unreferenced blobs, sparing ones just put
+  - /face/images serves from the filesystem store when configured
+"""
+
+import os
+from datetime import timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models import FaceImage, FaceImageBlob, User
+from app.services import image_store
+from app.services.image_store import DatabaseImageStore, FilesystemImageStore, content_key
+
+
+@pytest.fixture
+def no_grace(monkeypatch):
+    """Blobs put during the test count as old enough to remove."""
+    monkeypatch.setattr(image_store, "PUT_GRACE", timedelta(0))
+
+
+@pytest.fixture
+def fs_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FACE_IMAGE_DIR", str(tmp_path / "faces"))
+    return image_store.get_store("filesystem")
+
+
+def _add_images(db, store, user_id: int, blobs):
+    for position, data in enumerate(blobs, start=1):
+        db.add(FaceImage(user_id=user_id, position=position, sha256=store.put(db, data), size=len(data)))
+    db.commit()
+
+
+def test_backends_dedupe_by_content(db_session, fs_store):
+    for store in (DatabaseImageStore(), fs_store):
+        key = store.put(db_session, b"face one")
+        assert key == content_key(b"face one")
+        assert store.put(db_session, b"face one") == key
+        other = store.put(db_session, b"face two")
+        db_session.commit()
+        assert store.get_many(db_session, [key, other, "0" * 64]) == {key: b"face one", other: b"face two"}
+        assert list(store.keys(db_session)) == sorted([key, other])
+        store.remove(db_session, [key, "0" * 64])
+        db_session.commit()
+        assert store.get(db_session, key) is None
+
+    key = content_key(b"face two")
+    assert fs_store.path(key) == os.path.join(settings.FACE_IMAGE_DIR, key[:2], key[2:4], key)
+    assert db_session.query(FaceImageBlob).count() == 1
+    with pytest.raises(ValueError):
+        image_store.get_store("s3")
+
+
+def test_migrate_between_backends_and_prune(db_session, user_token, fs_store, no_grace):
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    database = DatabaseImageStore()
+    blobs = [f"image {i}".encode() for i in range(7)] + [b"image 0"]  # one duplicate
+    _add_images(db_session, database, user.id, blobs)
+    orphan = database.put(db_session, b"left by a failed enrollment")
+    db_session.commit()
+
+    counts = image_store.migrate(db_session, database, fs_store, batch_size=3)
+    assert counts == {"copied": 7, "missing": 0, "corrupt": 0}
+    assert list(database.keys(db_session)) == [orphan]  # unreferenced blobs are not moved
+    for image in db_session.query(FaceImage):
+        assert fs_store.get(db_session, image.sha256) == blobs[image.position - 1]
+
+    # Re-running finds nothing left to move.
+    assert image_store.migrate(db_session, database, fs_store)["missing"] == 7
+
+    assert image_store.prune(db_session, database) == 1
+    assert list(database.keys(db_session)) == []
+
+    counts = image_store.migrate(db_session, fs_store, database, remove_source=False)
+    assert counts["copied"] == 7
+    assert len(list(fs_store.keys(db_session))) == 7
+    assert image_store.prune(db_session, fs_store) == 0
+
+
+def test_discard_keeps_shared_blobs(db_session, user_token, admin_token, no_grace):
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    admin = db_session.query(User).filter(User.email == "admin@test.com").one()
+    store = image_store.get_store()
+    _add_images(db_session, store, user.id, [b"shared", b"mine"])
+    _add_images(db_session, store, admin.id, [b"shared"])
+
+    keys = image_store.referenced_keys(db_session, [user.id])
+    db_session.query(FaceImage).filter(FaceImage.user_id == user.id).delete()
+    db_session.commit()
+    image_store.discard(db_session, keys)
+    assert list(store.keys(db_session)) == [content_key(b"shared")]
+
+
+def _age(db, store, key: str, by: timedelta) -> None:
+    """Backdate ``key``'s put time."""
+    if store.name == "database":
+        blob = db.get(FaceImageBlob, key)
+        blob.created_at -= by
+        db.commit()
+    else:
+        stamp = os.stat(store.path(key)).st_mtime - by.total_seconds()
+        os.utime(store.path(key), (stamp, stamp))
+
+
+def test_discard_spares_blobs_put_by_a_pending_enrollment(db_session, user_token, fs_store, monkeypatch):
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    key = content_key(b"same face")
+    for store in (DatabaseImageStore(), fs_store):
+        monkeypatch.setattr(settings, "FACE_IMAGE_STORE", store.name)
+        _add_images(db_session, store, user.id, [b"same face"])
+        _age(db_session, store, key, timedelta(hours=1))
+        db_session.query(FaceImage).delete()
+        db_session.commit()
+
+        # Another enrollment puts the same bytes but has not committed its row yet.
+        assert store.put(db_session, b"same face") == key
+        db_session.commit()
+        image_store.discard(db_session, [key])
+        assert image_store.prune(db_session, store) == 0
+        assert store.get(db_session, key) == b"same face"
+
+        # Still unreferenced once the grace period is over: pruned.
+        _age(db_session, store, key, image_store.PUT_GRACE)
+        assert image_store.prune(db_session, store) == 1
+        assert store.get(db_session, key) is None
+
+
+@pytest.mark.asyncio
+async def test_face_image_served_from_filesystem_store(client, user_token, db_session, fs_store, monkeypatch):
+    monkeypatch.setattr(settings, "FACE_IMAGE_STORE", "filesystem")
+    user = db_session.query(User).filter(User.email == "user@test.com").one()
+    _add_images(db_session, fs_store, user.id, [b"jpeg bytes"])
+    image = db_session.query(FaceImage).one()
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    resp = await client.get(f"/face/images/{image.id}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.content == b"jpeg bytes"
+    assert db_session.query(FaceImageBlob).count() == 0
+
+    os.remove(fs_store.path(image.sha256))
+    resp = await client.get(f"/face/images/{image.id}", headers={**headers, "If-None-Match": f'"{image.sha256}"'})
+    assert resp.status_code == 304  # revalidation never reads the bytes
+    assert (await client.get(f"/face/images/{image.id}", headers=headers)).status_code == 404
@@ -3,17 +3,34 @@ Face recognition service unit tests (DB-backed) — model calls are stubbed.
 
 Covers:
   - embedding cache builds from DB and refreshes on change
+  - concurrent recognition during gallery rebuilds never mixes snapshots
   - cosine k-NN matching returns the correct user
   - threshold enforcement (low-similarity → no match)
   - duplicate detection across users (and skipping self)
+  - pluggable inference backends and the shared-memory frame ring
+  - model warm-up at startup (failures only logged)
+  - re-encoding from stored chips (recognition model only, no detection)
 """
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
+import cv2
 import numpy as np
+import pytest
 
-from app.models import FaceEmbedding, User
+from app.models import FaceEmbedding, FaceImage, User
 from app.services.face_recognition import face_service
+from app.services import frame_transport, image_store
+from app.services.inference import (
+    CHIP_SHAPE,
+    DetectedFace,
+    InferenceBackend,
+    InProcessBackend,
+    ProcessPoolBackend,
+    create_backend,
+)
 
 
 def _unit_vector(dim_index: int, size: int = 512) -> np.ndarray:
@@ -60,16 +77,51 @@ def _two_users(db):
 def test_cache_builds_from_db(db_session):
     _add_user_with_embedding(db_session, "USR_X", "x@test.com", _unit_vector(0))
     face_service.invalidate_cache()
-    face_service._refresh_cache(db_session)
-    assert face_service._cache_embeddings is not None
-    assert face_service._cache_labels == ["USR_X"]
+    gallery = face_service._refresh_cache(db_session)
+    assert gallery.embeddings is not None
+    assert gallery.labels == ("USR_X",)
+    assert face_service._refresh_cache(db_session) is gallery  # unchanged signature: no rebuild
 
 
 def test_cache_empty_when_no_enrollments(db_session):
     face_service.invalidate_cache()
-    face_service._refresh_cache(db_session)
-    assert face_service._cache_embeddings is None
-    assert face_service._cache_labels == []
+    gallery = face_service._refresh_cache(db_session)
+    assert gallery.embeddings is None
+    assert gallery.labels == ()
+
+
+def test_recognition_uses_one_gallery_snapshot_during_refreshes():
+    """Rebuilds (which reorder the rows) racing recognition never pair rows with the wrong labels."""
+    rng = np.random.default_rng(0)
+    padding = rng.normal(size=(4000, 512)).astype(np.float32)
+    vectors = np.vstack([_unit_vector(7), padding / np.linalg.norm(padding, axis=1, keepdims=True)])
+    labels = np.array(["USR_7"] + [f"USR_PAD{i}" for i in range(len(padding))])
+    version = [0]
+
+    def load_gallery(db):
+        order = np.random.default_rng(version[0]).permutation(len(labels))
+        return vectors[order], list(labels[order]), len(labels)
+
+    def refresh_until(done):
+        while not done.is_set():
+            version[0] += 1
+            face_service._refresh_cache(None)
+
+    face_service.invalidate_cache()
+    done = threading.Event()
+    with patch.object(face_service, "_gallery_signature", side_effect=lambda db: (version[0],)), \
+            patch.object(face_service, "_load_gallery", side_effect=load_gallery), \
+            patch.object(face_service, "get_embedding", return_value=_unit_vector(7)), \
+            ThreadPoolExecutor(max_workers=4) as pool:
+        refresher = threading.Thread(target=refresh_until, args=(done,))
+        refresher.start()
+        try:
+            results = list(pool.map(lambda _: face_service.recognize("dummy.jpg", None), range(200)))
+        finally:
+            done.set()
+            refresher.join()
+            face_service.invalidate_cache()
+    assert [r and r["user_id"] for r in results] == ["USR_7"] * len(results)
 
 
 # ── Recognition ─────────────────────────────────────────────────────────────
@@ -128,3 +180,161 @@ def test_find_duplicate_no_match(db_session):
     with patch.object(face_service, "get_embedding", return_value=probe):
         result = face_service.find_duplicate_face("dummy.jpg", db_session, current_user_id="USR_C")
     assert result is None
+
+
+# ── Inference backends ────────────────────────────────────────────────────────
+
+class _FakeBackend(InferenceBackend):
+    def __init__(self, faces):
+        self.faces = faces
+
+    def detect(self, img):
+        return self.faces
+
+
+def _detected(size: int, dim_index: int) -> DetectedFace:
+    return DetectedFace(
+        bbox=np.array([0, 0, size, size], dtype=np.float32),
+        kps=None,
+        det_score=0.9,
+        normed_embedding=_unit_vector(dim_index),
+    )
+
+
+def test_create_backend_selects_implementation():
+    assert isinstance(create_backend("inprocess", "buffalo_l", (640, 640), False), InProcessBackend)
+    pool = create_backend("process", "buffalo_l", (640, 640), False, workers=2)
+    assert isinstance(pool, ProcessPoolBackend)
+    assert pool.workers == 2
+    with pytest.raises(ValueError):
+        create_backend("remote", "buffalo_l", (640, 640), False)
+
+
+def test_get_embedding_uses_backend_largest_face():
+    backend = _FakeBackend([_detected(40, 3), _detected(120, 7)])
+    frame = np.zeros((200, 200, 3), dtype=np.uint8)
+    with patch.object(face_service, "backend", backend), \
+            patch.object(face_service, "_read_image", return_value=frame):
+        emb = face_service.get_embedding("dummy.jpg")
+    assert int(np.argmax(emb)) == 7
+
+
+@pytest.mark.asyncio
+async def test_startup_warms_up_backend():
+    from app.main import warm_up_inference
+
+    backend = _FakeBackend([])
+    with patch.object(backend, "warmup") as warmup, patch.object(face_service, "backend", backend):
+        await warm_up_inference()
+        warmup.assert_called_once_with()
+        warmup.side_effect = RuntimeError("model pack missing")
+        await warm_up_inference()  # logged, not raised: models load on first use
+
+
+def test_shared_frame_ring_round_trip():
+    ring = frame_transport.SharedFrameRing(slots=1, frame_capacity=32 * 32 * 3, max_faces=2)
+    try:
+        img = np.arange(32 * 32 * 3, dtype=np.uint8).reshape(32, 32, 3)
+        with ring.frame(img) as desc:
+            # Worker side: map the frame, write detections back into the slot.
+            assert np.array_equal(frame_transport.frame_view(desc), img)
+            count = frame_transport.write_results(desc, [_detected(20, 4), _detected(10, 9)])
+            faces = ring.read_results(desc, count)
+        assert len(faces) == 2
+        assert faces[0].kps is None
+        assert faces[0].det_score == pytest.approx(0.9)
+        assert int(np.argmax(faces[1].normed_embedding)) == 9
+        assert not ring.fits(np.zeros((64, 64, 3), dtype=np.uint8))
+        assert desc.shm_name in frame_transport._attached
+    finally:
+        frame_transport.detach_all()
+        ring.close()
+    assert frame_transport._attached == {}
+
+
+def test_pool_worker_detaches_frames_at_exit():
+    from app.services import inference
+
+    with patch.object(InProcessBackend, "warmup"), patch("atexit.register") as register, \
+            patch.object(inference, "_worker_backend", None):
+        inference._init_worker("buffalo_l", (640, 640), False)
+    register.assert_called_once_with(frame_transport.detach_all)
+
+
+# ── Re-encoding ───────────────────────────────────────────────────────────────
+
+class _ChipBackend(InferenceBackend):
+    """Embeds a chip as the unit vector at its first pixel value; counts detections."""
+
+    def __init__(self, faces=()):
+        self.faces = list(faces)
+        self.detections = 0
+        self.batches = []
+
+    def detect(self, img):
+        self.detections += 1
+        return self.faces
+
+    def embed(self, chips):
+        self.batches.append(len(chips))
+        return np.stack([_unit_vector(int(chip[0, 0, 0])) for chip in chips])
+
+
+def _enroll_with_chips(db, unique_id: str, chip_values):
+    user = _add_user_with_embedding(db, unique_id, f"{unique_id.lower()}@test.com", _unit_vector(0))
+    store = image_store.get_store()
+    for position, value in enumerate(chip_values, start=1):
+        image = f"{unique_id} image {position}".encode()
+        chip = np.full(CHIP_SHAPE, value, dtype=np.uint8).tobytes() if value is not None else None
+        db.add(FaceImage(
+            user_id=user.id, position=position, sha256=store.put(db, image), size=len(image),
+            chip_sha256=store.put(db, chip) if chip is not None else None,
+        ))
+    db.commit()
+    return user
+
+
+def _embeddings_of(db, user) -> np.ndarray:
+    fe = db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user.id).one()
+    return np.frombuffer(fe.embeddings, dtype=np.float32).reshape(fe.count, fe.dim)
+
+
+def test_reencode_all_embeds_stored_chips_without_detection(db_session):
+    a = _enroll_with_chips(db_session, "USR_A", [3, 4, 5])
+    b = _enroll_with_chips(db_session, "USR_B", [6, 7])
+    legacy = _enroll_with_chips(db_session, "USR_C", [8, None])  # one image predates chips
+    backend = _ChipBackend()
+
+    with patch.object(face_service, "backend", backend), patch.object(face_service, "model_name", "new_model"):
+        counts = face_service.reencode_all(db_session, batch_size=2, users_per_page=2)
+
+    assert counts == {"users": 2, "chips": 5, "skipped": 1, "backfilled": 0}
+    assert backend.detections == 0
+    assert max(backend.batches) <= 2
+    db_session.expire_all()
+    assert [int(np.argmax(e)) for e in _embeddings_of(db_session, a)] == [3, 4, 5]
+    assert [int(np.argmax(e)) for e in _embeddings_of(db_session, b)] == [6, 7]
+    assert [int(np.argmax(e)) for e in _embeddings_of(db_session, legacy)] == [0]
+    assert {fe.model for fe in db_session.query(FaceEmbedding)} == {"new_model", "buffalo_l"}
+
+
+def test_reencode_all_backfills_missing_chips(db_session):
+    legacy = _enroll_with_chips(db_session, "USR_C", [8, None])
+    missing = db_session.query(FaceImage).filter(FaceImage.chip_sha256.is_(None)).one()
+    # The stored image must decode for a chip to be made from it.
+    frame = np.full((200, 200, 3), 9, dtype=np.uint8)
+    data = cv2.imencode(".png", frame)[1].tobytes()
+    missing.sha256, missing.size = image_store.get_store().put(db_session, data), len(data)
+    db_session.commit()
+    kps = np.array([[70, 90], [130, 90], [100, 120], [75, 150], [125, 150]], dtype=np.float32)
+    face = DetectedFace(np.array([40, 40, 160, 180], dtype=np.float32), kps, 0.9, _unit_vector(0))
+    backend = _ChipBackend([face])
+
+    with patch.object(face_service, "backend", backend):
+        counts = face_service.reencode_all(db_session, backfill=True)
+
+    assert counts == {"users": 1, "chips": 2, "skipped": 0, "backfilled": 1}
+    assert backend.detections == 1
+    db_session.expire_all()
+    assert [int(np.argmax(e)) for e in _embeddings_of(db_session, legacy)] == [8, 9]
+    assert db_session.get(FaceImage, missing.id).chip_sha256 is not None
@@ -0,0 +1,39 @@
+import React, { useState, useEffect } from 'react';
+import { Box, CardMedia, CircularProgress } from '@mui/material';
+import { faceAPI } from '../services/api';
+
+// An <img> for an authenticated image URL: fetched with the API client (so the
+// bearer token is sent) and shown through an object URL.
+const AuthImage = ({ src, alt, sx }) => {
+  const [objectUrl, setObjectUrl] = useState(null);
+
+  useEffect(() => {
+    let url = null;
+    let cancelled = false;
+    setObjectUrl(null);
+    if (src) {
+      faceAPI.getImage(src)
+        .then((response) => {
+          if (cancelled) return;
+          url = URL.createObjectURL(response.data);
+          setObjectUrl(url);
+        })
+        .catch((error) => console.error('Error loading image:', error));
+    }
+    return () => {
+      cancelled = true;
+      if (url) URL.revokeObjectURL(url);
+    };
+  }, [src]);
+
+  if (!objectUrl) {
+    return (
+      <Box sx={{ ...sx, display: 'flex', alignItems: 'center', justifyContent: 'center' }}>
+        <CircularProgress size={24} />
+      </Box>
+    );
+  }
+  return <CardMedia component="img" image={objectUrl} alt={alt} sx={sx} />;
+};
+
+export default AuthImage;
@@ -17,7 +17,6 @@ import {
   IconButton,
   Fade,
   CircularProgress,
-  CardMedia,
   Stack,
   Paper,
 } from '@mui/material';
@@ -25,6 +24,7 @@ import {
   Close as CloseIcon,
 } from '@mui/icons-material';
 import { userAPI } from '../services/api';
+import AuthImage from './AuthImage';
 
 const UserProfile = () => {
   const [user, setUser] = useState(null);
@@ -884,9 +884,8 @@ const UserProfile = () => {
                         }}
                       >
                         {/* Image */}
-                        <CardMedia
-                          component="img"
-                          image={face.image_data}
+                        <AuthImage
+                          src={face.thumbnail_url}
                           alt={face.filename}
                           sx={{
                             width: '100%',
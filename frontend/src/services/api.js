@@ -66,6 +66,9 @@ export const faceAPI = {
       },
     });
   },
+  // Face image URLs from the gallery endpoints need the auth header, so they
+  // are fetched as blobs rather than used directly as <img src>.
+  getImage: (url) => api.get(url, { responseType: 'blob' }),
 };
 
 // Attendance APIs